@@ -0,0 +1,122 @@
+"""
+Сравнение пропускной способности способов извлечения результата запроса:
+построчная выборка DBBroker.run_query, поток через курсор на стороне сервера с записью CSV
+и COPY ... TO STDOUT в форматах csv и binary (только PostgreSQL).
+
+Пример:
+	python benchmarks/copy_extraction.py "postgresql:///warehouse?user=reader" "SELECT * FROM events" --repeat 3
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+if not settings.configured:
+	settings.configure(
+		TABLE_BUILDER_ENGINE_POOL={},
+		CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+	)
+	django.setup()
+
+from table_builder.src.entity.db_broker import DBBroker  # noqa: E402
+from table_builder.src.services.stream_writers import CSVStreamWriter  # noqa: E402
+
+
+def run_fetch(db_broker: DBBroker, query: str) -> tuple:
+	rows = db_broker.run_query(query)
+	return len(rows), sum(len(str(value)) for row in rows for value in row)
+
+
+def run_stream_csv(db_broker: DBBroker, query: str) -> tuple:
+	stream = db_broker.stream_query(query)
+	rows = 0
+	size = 0
+
+	def counted(partitions):
+		nonlocal rows
+		for partition in partitions:
+			rows += len(partition)
+			yield partition
+
+	for chunk in CSVStreamWriter().write(stream.keys, counted(stream)):
+		size += len(chunk.encode())
+	return rows, size
+
+
+def make_copy_runner(copy_format: str):
+	def run_copy(db_broker: DBBroker, query: str) -> tuple:
+		stream = db_broker.copy_query(query, copy_format=copy_format)
+		sink = io.BytesIO()
+		for chunk in stream:
+			sink.write(chunk)
+		return stream.rowcount, sink.tell()
+	return run_copy
+
+
+def get_modes(db_broker: DBBroker) -> dict:
+	modes = {
+		'fetch': run_fetch,
+		'stream_csv': run_stream_csv,
+	}
+	if db_broker.supports_copy():
+		modes['copy_csv'] = make_copy_runner('csv')
+		modes['copy_binary'] = make_copy_runner('binary')
+	return modes
+
+
+def measure(runner, db_broker: DBBroker, query: str, repeat: int) -> dict:
+	timings = []
+	rows = size = 0
+	for _ in range(repeat):
+		started = time.perf_counter()
+		rows, size = runner(db_broker, query)
+		timings.append(time.perf_counter() - started)
+	best = min(timings)
+	return {
+		'rows': rows,
+		'bytes': size,
+		'best_s': round(best, 4),
+		'median_s': round(statistics.median(timings), 4),
+		'rows_per_s': round(rows / best) if rows and best else None,
+		'mb_per_s': round(size / best / 1024 / 1024, 2) if best else None,
+	}
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('url', help='Строка подключения в формате Database.get_connection_url()')
+	parser.add_argument('query', help='Запрос SELECT, например скомпилированный SQLQueryBuilder')
+	parser.add_argument('--repeat', type=int, default=3)
+	parser.add_argument('--modes', nargs='*', help='Ограничить набор режимов')
+	parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+	args = parser.parse_args()
+
+	engine_kwargs = {} if args.url.startswith('postgresql') else {'connect_args': {}}
+	db_broker = DBBroker(args.url, **engine_kwargs)
+	modes = get_modes(db_broker)
+	results = {
+		name: measure(runner, db_broker, args.query, args.repeat)
+		for name, runner in modes.items()
+		if not args.modes or name in args.modes
+	}
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f'{"mode":<12} {"rows":>10} {"bytes":>12} {"best, s":>9} {"rows/s":>11} {"MB/s":>8}')
+	for name, result in results.items():
+		print(
+			f'{name:<12} {result["rows"] or 0:>10} {result["bytes"]:>12} {result["best_s"]:>9} '
+			f'{result["rows_per_s"] or 0:>11} {result["mb_per_s"] or 0:>8}'
+		)
+
+
+if __name__ == '__main__':
+	main()
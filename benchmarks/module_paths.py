@@ -0,0 +1,49 @@
+"""
+Часть модулей проекта импортирует сущности по прежним путям (table_builder.src.owns,
+table_builder.src.services.constants и т.п.), которых в дереве уже нет. Чтобы замеры запускались
+на дереве как есть, alias_moved_modules подставляет по прежним путям текущие модули.
+Код модулей не подменяется: по прежнему имени импортируется тот же объект модуля
+"""
+import importlib
+import importlib.abc
+import importlib.util
+import sys
+
+MOVED_MODULES = {
+	'table_builder.src.owns': 'table_builder.src.entity',
+	'table_builder.src.owns.constants': 'table_builder.src.entity.constants',
+	'table_builder.src.owns.schema': 'table_builder.src.entity.schema',
+	'table_builder.src.services.constants': 'table_builder.src.entity.constants',
+	'table_builder.src.services.form_builders': 'table_builder.src.interface.form_builders',
+	'table_builder.src.services.mixins': 'table_builder.mixins',
+	'table_builder.src.services.schema_builder': 'table_builder.src.interface.schema_builder',
+}
+
+
+class MovedModuleFinder(importlib.abc.MetaPathFinder, importlib.abc.Loader):
+	"""Находит модуль по прежнему пути и отдаёт текущий. Текущий модуль импортируется только при обращении"""
+
+	def __init__(self, moved_modules: dict):
+		self.moved_modules = moved_modules
+		self.original_specs = {}
+
+	def find_spec(self, fullname, path=None, target=None):
+		if fullname not in self.moved_modules:
+			return None
+		is_package = any(name.startswith(fullname + '.') for name in self.moved_modules)
+		return importlib.util.spec_from_loader(fullname, self, is_package=is_package)
+
+	def create_module(self, spec):
+		module = importlib.import_module(self.moved_modules[spec.name])
+		self.original_specs[spec.name] = module.__spec__
+		return module
+
+	def exec_module(self, module):
+		# импорт записывает в модуль спецификацию прежнего пути: возвращаем собственную
+		module.__spec__ = self.original_specs.pop(module.__spec__.name)
+
+
+def alias_moved_modules(moved_modules: dict = None):
+	# перед стандартными поисковиками: иначе подмодуль прежнего пакета загрузился бы повторно под прежним именем
+	if not any(isinstance(finder, MovedModuleFinder) for finder in sys.meta_path):
+		sys.meta_path.insert(0, MovedModuleFinder(MOVED_MODULES if moved_modules is None else moved_modules))
@@ -0,0 +1,421 @@
+"""
+Замеры пути обработки запроса данных на синтетических схемах разной ширины (от 10 до 2000 столбцов
+всех типов ColumnType по кругу): построение SQL в SQLQueryBuilder, генераторы форм FieldFormsWith*Builder,
+проверка SQLFormSet.full_clean, круговой проход схемы через скрытое поле TableSchemaField
+и полный запрос к DataRequestAPIView.
+
+Служебная БД Django создаётся как тестовая и удаляется по завершении. Внешней БД по умолчанию служит
+временный файл SQLite, вместо него можно передать строку подключения к PostgreSQL: таблицы bench_<ширина>
+создаются в ней на время замеров. Результат сохраняется в JSON для сравнения между коммитами.
+
+Настройки берутся из main/.env, а без него из значений по умолчанию ниже. Модули, которые ещё импортируются
+по прежним путям, подставляет benchmarks.module_paths. Замеры форм, SQLFormSet и DataRequestAPIView требуют
+TableSchemaForm и форм столбцов в table_builder/forms.py: если их нет, эти замеры пропускаются с сообщением
+в stderr и отметкой skipped_forms в meta, а SQLQueryBuilder (cold/warm) и TableSchemaField замеряются всегда.
+
+Пример:
+	python benchmarks/request_pipeline.py --widths 10 100 1000 2000 --output before.json
+	python benchmarks/request_pipeline.py --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'main.settings')
+# без main/.env настройки берутся отсюда, служебная БД всё равно создаётся как тестовая
+for name, value in {
+	'DJANGO_SECRET_KEY': 'benchmark',
+	'FERNET_SECRET_KEY': 'benchmark',
+	'DJANGO_DEBUG': 'False',
+	'DJANGO_DEBUG_SQL': 'False',
+	'DJANGO_ALLOWED_HOSTS': '*',
+	'DJANGO_DATABASE_URL': 'sqlite:///benchmark.sqlite3',
+}.items():
+	os.environ.setdefault(name, value)
+
+import django  # noqa: E402
+
+from benchmarks.module_paths import alias_moved_modules  # noqa: E402
+
+alias_moved_modules()
+django.setup()
+
+import sqlalchemy  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from sqlalchemy.pool import QueuePool  # noqa: E402
+
+from table_builder import models  # noqa: E402
+from table_builder.src.entity.constants import ColumnType, NumberWhereChoice, OrderChoice, StringWhereChoice  # noqa: E402
+from table_builder.src.entity.db_broker import DBBroker  # noqa: E402
+from table_builder.src.entity.schema import ColumnSchema, TableSchema  # noqa: E402
+from table_builder.src.generics.form_fields import TableSchemaField  # noqa: E402
+from table_builder.src.services.query_constructor import SQLQueryBuilder  # noqa: E402
+from table_builder.src.services.sql_formset import SQLFormSet  # noqa: E402
+
+try:
+	from table_builder.src.interface.form_builders import (
+		FieldFormsWithFillTemplateBuilder,
+		FieldFormsWithInstanceBuilder,
+		FieldFormsWithoutInstanceBuilder,
+		PartialFieldFormsWithoutInstanceBuilder,
+	)
+	from table_builder.src.interface.schema_builder import SchemaBuilder
+	from table_builder.views import DataRequestAPIView
+except (ImportError, AttributeError) as e:
+	# построители форм и представления опираются на формы из table_builder/forms.py;
+	# без них замеряются только SQLQueryBuilder и TableSchemaField
+	FORMS_UNAVAILABLE = f'{type(e).__name__}: {e}'
+else:
+	FORMS_UNAVAILABLE = None
+
+COLUMN_TYPES = [column_type.value for column_type in ColumnType]
+
+COLUMN_MODELS = {
+	ColumnType.INTEGER.value: models.IntegerColumn,
+	ColumnType.FLOAT.value: models.FloatColumn,
+	ColumnType.CHAR.value: models.CharColumn,
+	ColumnType.DATE.value: models.DateColumn,
+	ColumnType.DATETIME.value: models.DateTimeColumn,
+	ColumnType.DURATION.value: models.DurationColumn,
+}
+
+SQLALCHEMY_TYPES = {
+	ColumnType.INTEGER.value: sqlalchemy.Integer,
+	ColumnType.FLOAT.value: sqlalchemy.Float,
+	ColumnType.CHAR.value: sqlalchemy.String(255),
+	ColumnType.DATE.value: sqlalchemy.Date,
+	ColumnType.DATETIME.value: sqlalchemy.DateTime,
+	ColumnType.DURATION.value: sqlalchemy.Interval,
+}
+
+# Условия подобраны так, чтобы им удовлетворяли все сгенерированные строки
+FILTERS = {
+	ColumnType.INTEGER.value: {'where_predicate': NumberWhereChoice.GT.value, 'where_value': -1},
+	ColumnType.FLOAT.value: {'where_predicate': NumberWhereChoice.GT.value, 'where_value': -1.0},
+	ColumnType.CHAR.value: {'where_predicate': StringWhereChoice.CONTAINS.value, 'where_value': 'a'},
+	ColumnType.DATE.value: {'where_from_value': date(2000, 1, 1)},
+	ColumnType.DATETIME.value: {'where_from_value': datetime(2000, 1, 1)},
+	ColumnType.DURATION.value: {'where_from_value': timedelta(seconds=1)},
+}
+
+
+def make_value(data_type: str, row: int):
+	if data_type == ColumnType.INTEGER.value:
+		return row
+	if data_type == ColumnType.FLOAT.value:
+		return row / 3
+	if data_type == ColumnType.CHAR.value:
+		return f'value {row}'
+	if data_type == ColumnType.DATE.value:
+		return date(2020, 1, 1) + timedelta(days=row % 365)
+	if data_type == ColumnType.DATETIME.value:
+		return datetime(2020, 1, 1) + timedelta(minutes=row)
+	return timedelta(seconds=row + 1)
+
+
+class SyntheticTable:
+	"""
+	Синтетическая таблица ширины width. Каждый filter_every-й столбец фильтруется,
+	каждый order_every-й участвует в сортировке, первый столбец - первичный ключ
+	"""
+
+	def __init__(self, width: int, filter_every: int, order_every: int, filtered_types=None):
+		self.width = width
+		self.name = f'bench_{width}'
+		self.filter_every = filter_every
+		self.order_every = order_every
+		self.filtered_types = set(COLUMN_TYPES if filtered_types is None else filtered_types)
+		self.columns = [
+			(f'{COLUMN_TYPES[i % len(COLUMN_TYPES)]}_{i}', COLUMN_TYPES[i % len(COLUMN_TYPES)])
+			for i in range(width)
+		]
+
+	def make_schema(self, with_instances: bool = False, db_instance=None) -> TableSchema:
+		column_schemes = []
+		for position, (name, data_type) in enumerate(self.columns, start=1):
+			instance = self.make_instance(position, name, data_type) if with_instances else None
+			column_schemes.append(ColumnSchema(
+				name=name, data_type=data_type, primary_key=position == 1, instance=instance
+			))
+		table_instance = models.Table(name=self.name, alias=self.name) if with_instances else None
+		return TableSchema(
+			name=self.name, column_schemes=column_schemes, instance=table_instance, db_instance=db_instance
+		)
+
+	def make_instance(self, position: int, name: str, data_type: str):
+		instance = COLUMN_MODELS[data_type](name=name, position=position, show=True, where_not=False)
+		if position % self.filter_every == 0 and data_type in self.filtered_types:
+			for attr, value in FILTERS[data_type].items():
+				setattr(instance, attr, value)
+		if position % self.order_every == 0:
+			instance.order_predicate = OrderChoice.ASC.value
+		return instance
+
+	def create(self, engine, rows: int):
+		meta = sqlalchemy.MetaData()
+		table = sqlalchemy.Table(self.name, meta, *[
+			sqlalchemy.Column(name, SQLALCHEMY_TYPES[data_type], primary_key=i == 0)
+			for i, (name, data_type) in enumerate(self.columns)
+		])
+		meta.drop_all(engine)
+		meta.create_all(engine)
+		with engine.begin() as c:
+			c.execute(table.insert(), [
+				{name: make_value(data_type, row) for name, data_type in self.columns}
+				for row in range(rows)
+			])
+		return table
+
+
+def get_form_data(field_forms) -> dict:
+	"""Данные, которые браузер отправил бы для несвязанных форм: начальные значения всех полей"""
+	data = {}
+	for form in field_forms:
+		for name in form.fields:
+			value = form[name].value()
+			data[form.add_prefix(name)] = '' if value is None else str(value)
+	return data
+
+
+def make_view(synthetic_table: SyntheticTable, url: str):
+	"""DataRequestAPIView со схемой из SyntheticTable вместо POST и без кэша результатов"""
+
+	class SyntheticSchemaBuilder(SchemaBuilder):
+		def get_schema(self):
+			return self.view.synthetic_table.make_schema(db_instance=self.view.get_object())
+
+	class BenchmarkDataRequestAPIView(DataRequestAPIView):
+		schema_build_strategy = SyntheticSchemaBuilder
+		synthetic_table = None
+		connection_url = None
+
+		def get_db_broker(self):
+			return DBBroker(self.connection_url, **get_engine_kwargs(self.connection_url))
+
+		def get_result_cache_ttl(self):
+			return 0
+
+	return BenchmarkDataRequestAPIView.as_view(synthetic_table=synthetic_table, connection_url=url)
+
+
+def get_engine_kwargs(url: str) -> dict:
+	# параметры пула из TABLE_BUILDER_ENGINE_POOL применимы только к QueuePool, SQLite по умолчанию использует NullPool
+	return {} if url.startswith('postgresql') else {'connect_args': {}, 'poolclass': QueuePool}
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+	"""Лучшее и медианное время в мс. setup выполняется перед каждым повтором и не замеряется"""
+	timings = []
+	for i in range(repeat + 1):
+		args = setup() if setup is not None else ()
+		started = time.perf_counter()
+		func(*args)
+		elapsed = time.perf_counter() - started
+		if i:
+			timings.append(elapsed)
+	return {
+		'best_ms': round(min(timings) * 1000, 3),
+		'median_ms': round(statistics.median(timings) * 1000, 3),
+		'repeat': repeat,
+	}
+
+
+def bench_width(synthetic_table: SyntheticTable, database, url: str, repeat: int) -> dict:
+	results = {}
+	instance_schema = synthetic_table.make_schema(with_instances=True, db_instance=database)
+
+	def build_cold():
+		SQLQueryBuilder.template_cache.clear()
+		SQLQueryBuilder(instance_schema).build_sql_query()
+
+	results['build_sql_query.cold'] = measure(build_cold, repeat)
+	results['build_sql_query.warm'] = measure(lambda: SQLQueryBuilder(instance_schema).build_sql_query(), repeat)
+
+	schema_field = TableSchemaField()
+	schema_value = schema_field.prepare_value(synthetic_table.make_schema(db_instance=database))
+	results['schema_field.render'] = measure(
+		lambda: schema_field.prepare_value(synthetic_table.make_schema(db_instance=database)), repeat
+	)
+	results['schema_field.parse'] = measure(lambda: schema_field.clean(schema_value), repeat)
+	results['schema_field.render']['payload_bytes'] = len(schema_value)
+
+	if FORMS_UNAVAILABLE is None:
+		results.update(bench_forms(synthetic_table, instance_schema, database, url, repeat))
+	return results
+
+
+def bench_forms(synthetic_table: SyntheticTable, instance_schema: TableSchema, database, url: str, repeat: int) -> dict:
+	"""Построители форм, SQLFormSet и полный запрос к DataRequestAPIView"""
+	results = {}
+	results['get_form.with_instance'] = measure(
+		lambda: list(FieldFormsWithInstanceBuilder(instance_schema).get_form()), repeat
+	)
+	data = get_form_data(FieldFormsWithInstanceBuilder(instance_schema).get_form())
+	results['get_form.without_instance'] = measure(
+		lambda: list(FieldFormsWithoutInstanceBuilder(synthetic_table.make_schema()).get_form(data=data)), repeat
+	)
+	results['get_form.partial'] = measure(
+		lambda: list(PartialFieldFormsWithoutInstanceBuilder(synthetic_table.make_schema()).get_form(data=data)), repeat
+	)
+	results['get_form.fill_template'] = measure(
+		lambda: list(FieldFormsWithFillTemplateBuilder(
+			synthetic_table.make_schema(db_instance=database)
+		).get_form(data=data)),
+		repeat
+	)
+
+	def formset_setup():
+		table_schema = synthetic_table.make_schema()
+		return SQLFormSet(table_schema, FieldFormsWithoutInstanceBuilder(table_schema).get_form(data=data)),
+
+	def partial_formset_setup():
+		table_schema = synthetic_table.make_schema()
+		forms = PartialFieldFormsWithoutInstanceBuilder(table_schema).get_form(data=data)
+		return SQLFormSet(table_schema, forms),
+
+	results['formset.full_clean'] = measure(lambda formset: formset.full_clean(), repeat, setup=formset_setup)
+	results['formset.full_clean.partial'] = measure(
+		lambda formset: formset.full_clean(), repeat, setup=partial_formset_setup
+	)
+	for setup in (formset_setup, partial_formset_setup):
+		formset = setup()[0]
+		if not formset.is_valid():
+			raise RuntimeError(f'Синтетические формы не прошли проверку: {formset.errors}')
+
+	view = make_view(synthetic_table, url)
+	body = urlencode(data)
+	factory = APIRequestFactory()
+
+	def request():
+		return view(
+			factory.post('/', body, content_type='application/x-www-form-urlencoded'),
+			pk=database.pk
+		)
+
+	response = request()
+	expected = {name for name, _ in synthetic_table.columns}
+	if response.status_code != 200 or (response.data and set(response.data[0]) != expected):
+		raise RuntimeError(f'Запрос к DataRequestAPIView завершился ошибкой: {response.content[:500]!r}')
+	results['view.data_request'] = measure(request, repeat)
+	results['view.data_request'].update({'rows': len(response.data), 'payload_bytes': len(body)})
+	return results
+
+
+def get_meta(args) -> dict:
+	try:
+		commit = subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR, capture_output=True, text=True
+		).stdout.strip()
+	except OSError:
+		commit = ''
+	return {
+		'commit': commit,
+		'created_at': datetime.now().isoformat(timespec='seconds'),
+		'python': platform.python_version(),
+		'django': django.get_version(),
+		'sqlalchemy': sqlalchemy.__version__,
+		'dialect': args.url.split(':', 1)[0],
+		'rows': args.rows,
+		'repeat': args.repeat,
+		'filter_every': args.filter_every,
+		'order_every': args.order_every,
+		'skipped_forms': FORMS_UNAVAILABLE,
+	}
+
+
+def run(args) -> dict:
+	setup_test_environment()
+	# широкие таблицы отправляют больше полей формы, чем допускает значение по умолчанию
+	settings.DATA_UPLOAD_MAX_NUMBER_FIELDS = None
+	old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+	engine = sqlalchemy.create_engine(args.url)
+	results = {}
+	try:
+		database = models.Database.objects.create(
+			dialect=args.url.split(':', 1)[0], dbname='benchmark', alias='benchmark'
+		)
+		# SQLite не связывает timedelta в параметрах запроса, поэтому DURATION на нём не фильтруется
+		filtered_types = None if args.url.startswith('postgresql') else [
+			column_type for column_type in COLUMN_TYPES if column_type != ColumnType.DURATION.value
+		]
+		for width in args.widths:
+			synthetic_table = SyntheticTable(width, args.filter_every, args.order_every, filtered_types)
+			table = synthetic_table.create(engine, args.rows)
+			try:
+				results[str(width)] = bench_width(synthetic_table, database, args.url, args.repeat)
+			finally:
+				table.drop(engine)
+			print_results({str(width): results[str(width)]}, file=sys.stderr)
+	finally:
+		engine.dispose()
+		connection.creation.destroy_test_db(old_name, verbosity=0)
+	return {'meta': get_meta(args), 'results': results}
+
+
+def print_results(results: dict, file=sys.stdout):
+	for width, cases in results.items():
+		print(f'width={width}', file=file)
+		for name, result in cases.items():
+			print(f'  {name:<28} {result["best_ms"]:>11.3f} {result["median_ms"]:>11.3f} ms', file=file)
+
+
+def compare(old_path: str, new_path: str):
+	with open(old_path) as file:
+		old = json.load(file)
+	with open(new_path) as file:
+		new = json.load(file)
+	print(f'{old["meta"]["commit"] or old_path} -> {new["meta"]["commit"] or new_path}, медиана, мс')
+	for width, cases in new['results'].items():
+		print(f'width={width}')
+		for name, result in cases.items():
+			before = old['results'].get(width, {}).get(name)
+			if before is None:
+				print(f'  {name:<28} {"":>11} {result["median_ms"]:>11.3f}')
+				continue
+			ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('nan')
+			print(f'  {name:<28} {before["median_ms"]:>11.3f} {result["median_ms"]:>11.3f} {ratio:>7.2f}x')
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--url', help='Внешняя БД, по умолчанию временный файл SQLite')
+	parser.add_argument('--widths', type=int, nargs='*', default=[10, 100, 500, 1000, 2000])
+	parser.add_argument('--rows', type=int, default=200, help='Число строк в синтетических таблицах')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--filter-every', type=int, default=20, help='Фильтровать каждый N-й столбец')
+	parser.add_argument('--order-every', type=int, default=50, help='Сортировать по каждому N-му столбцу')
+	parser.add_argument('--output', help='Файл для результата в JSON, по умолчанию стандартный вывод')
+	parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='Сравнить два файла результатов')
+	args = parser.parse_args()
+
+	if args.compare:
+		compare(*args.compare)
+		return
+	if FORMS_UNAVAILABLE is not None:
+		print(f'Формы недоступны ({FORMS_UNAVAILABLE}), замеры форм и DataRequestAPIView пропущены', file=sys.stderr)
+	with tempfile.TemporaryDirectory() as tmp:
+		if args.url is None:
+			args.url = f'sqlite:///{os.path.join(tmp, "benchmark.sqlite3")}'
+		report = run(args)
+	if args.output:
+		with open(args.output, 'w') as file:
+			json.dump(report, file, indent=2)
+	else:
+		print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,125 @@
+"""
+Сравнение способов передачи схемы таблицы между запросами: JSON через TableSchemaSerializer
+и компактный формат TableSchemaCodec. Для каждой ширины схемы замеряются сериализация, разбор
+с построением TableSchema, размер текста для формы и память, занимаемая разобранной схемой.
+
+Запускается на дереве как есть: модули, которые ещё импортируются по прежним путям,
+подставляет benchmarks.module_paths, настройки Django не требуются.
+
+Пример:
+	python benchmarks/schema_serialization.py --widths 10 100 1000 2000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import django  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from benchmarks.module_paths import alias_moved_modules  # noqa: E402
+
+if not settings.configured:
+	settings.configure()
+	django.setup()
+alias_moved_modules()
+
+from table_builder.src.entity.constants import ColumnType  # noqa: E402
+from table_builder.src.entity.schema import ColumnSchema, TableSchema  # noqa: E402
+from table_builder.src.services.schema_codec import TableSchemaCodec  # noqa: E402
+from table_builder.src.services.schema_serializers import TableSchemaSerializer  # noqa: E402
+
+COLUMN_TYPES = [column_type.value for column_type in ColumnType]
+
+
+def make_table_schema(width: int) -> TableSchema:
+	return TableSchema(name=f'bench_{width}', pk=1, db_pk=1, column_schemes=[
+		ColumnSchema(
+			name=f'{COLUMN_TYPES[i % len(COLUMN_TYPES)]}_column_{i}',
+			data_type=COLUMN_TYPES[i % len(COLUMN_TYPES)],
+			primary_key=i == 0
+		)
+		for i in range(width)
+	])
+
+
+def serializer_dumps(table_schema: TableSchema) -> str:
+	return json.dumps(TableSchemaSerializer(table_schema).data)
+
+
+def serializer_loads(value: str) -> TableSchema:
+	serializer = TableSchemaSerializer(data=json.loads(value))
+	serializer.is_valid(raise_exception=True)
+	return serializer.save()
+
+
+METHODS = {
+	'serializer_json': (serializer_dumps, serializer_loads),
+	'codec': (TableSchemaCodec.dumps, TableSchemaCodec.loads),
+}
+
+
+def timeit(func, repeat: int) -> float:
+	timings = []
+	for _ in range(repeat):
+		started = time.perf_counter()
+		func()
+		timings.append(time.perf_counter() - started)
+	return round(statistics.median(timings) * 1000, 3)
+
+
+def measure_memory(loads, value: str) -> int:
+	tracemalloc.start()
+	table_schema = loads(value)
+	size, _ = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	del table_schema
+	return size
+
+
+def measure(width: int, repeat: int) -> dict:
+	table_schema = make_table_schema(width)
+	results = {}
+	for name, (dumps, loads) in METHODS.items():
+		value = dumps(table_schema)
+		loaded = loads(value)
+		if [(c.name, c.data_type, c.primary_key) for c in loaded] != [
+			(c.name, c.data_type, c.primary_key) for c in table_schema
+		]:
+			raise RuntimeError(f'{name}: схема после разбора не совпадает с исходной')
+		results[name] = {
+			'dumps_ms': timeit(lambda: dumps(table_schema), repeat),
+			'loads_ms': timeit(lambda: loads(value), repeat),
+			'payload_bytes': len(value.encode()),
+			'loaded_bytes': measure_memory(loads, value),
+		}
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--widths', type=int, nargs='*', default=[10, 100, 500, 1000, 2000])
+	parser.add_argument('--repeat', type=int, default=20)
+	parser.add_argument('--json', action='store_true', help='Вывести результат в JSON')
+	args = parser.parse_args()
+
+	results = {str(width): measure(width, args.repeat) for width in args.widths}
+	if args.json:
+		print(json.dumps(results, indent=2))
+		return
+	print(f'{"width":>6} {"method":<16} {"dumps, ms":>10} {"loads, ms":>10} {"payload, B":>11} {"memory, B":>10}')
+	for width, methods in results.items():
+		for name, result in methods.items():
+			print(
+				f'{width:>6} {name:<16} {result["dumps_ms"]:>10} {result["loads_ms"]:>10} '
+				f'{result["payload_bytes"]:>11} {result["loaded_bytes"]:>10}'
+			)
+
+
+if __name__ == '__main__':
+	main()
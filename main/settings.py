@@ -175,6 +175,53 @@ if env('DJANGO_DEBUG_SQL'):
 # }
 
 
+# Table builder
+
+TABLE_BUILDER_ENGINE_POOL = {
+	'pool_size': env.int('TABLE_BUILDER_POOL_SIZE', default=5),
+	'max_overflow': env.int('TABLE_BUILDER_POOL_MAX_OVERFLOW', default=10),
+	'pool_timeout': env.int('TABLE_BUILDER_POOL_TIMEOUT', default=30),
+	'pool_recycle': env.int('TABLE_BUILDER_POOL_RECYCLE', default=1800),
+	'pool_pre_ping': env.bool('TABLE_BUILDER_POOL_PRE_PING', default=True),
+}
+TABLE_BUILDER_ASYNC_QUERY_LIMIT = env.int('TABLE_BUILDER_ASYNC_QUERY_LIMIT', default=10)
+TABLE_BUILDER_PREPARED_STATEMENTS = {
+	'enabled': env.bool('TABLE_BUILDER_PREPARED_STATEMENTS', default=False),
+	'max_statements': env.int('TABLE_BUILDER_PREPARED_STATEMENTS_MAX', default=100),
+}
+TABLE_BUILDER_RESULT_CACHE = {
+	'default_ttl': env.int('TABLE_BUILDER_RESULT_CACHE_TTL', default=0),
+	'max_bytes': env.int('TABLE_BUILDER_RESULT_CACHE_MAX_BYTES', default=64 * 1024 * 1024),
+}
+TABLE_BUILDER_SCHEMA_CACHE = {
+	'ttl': env.int('TABLE_BUILDER_SCHEMA_CACHE_TTL', default=300),
+	'timeout': env.int('TABLE_BUILDER_SCHEMA_CACHE_TIMEOUT', default=86400),
+	'local_max_entries': env.int('TABLE_BUILDER_SCHEMA_CACHE_LOCAL_MAX_ENTRIES', default=128),
+}
+TABLE_BUILDER_SCHEMA_STORE = {
+	'timeout': env.int('TABLE_BUILDER_SCHEMA_STORE_TIMEOUT', default=86400),
+	'local_max_entries': env.int('TABLE_BUILDER_SCHEMA_STORE_LOCAL_MAX_ENTRIES', default=256),
+}
+TABLE_BUILDER_EXPORT = {
+	'root': env('TABLE_BUILDER_EXPORT_ROOT', default=os.path.join(BASE_DIR, 'exports')),
+	'workers': env.int('TABLE_BUILDER_EXPORT_WORKERS', default=2),
+	'poll_interval': env.float('TABLE_BUILDER_EXPORT_POLL_INTERVAL', default=2.0),
+	'chunk_size': env.int('TABLE_BUILDER_EXPORT_CHUNK_SIZE', default=10000),
+	'stale_timeout': env.int('TABLE_BUILDER_EXPORT_STALE_TIMEOUT', default=600),
+	'requeue_interval': env.int('TABLE_BUILDER_EXPORT_REQUEUE_INTERVAL', default=60),
+}
+TABLE_BUILDER_TRACE_HOOKS = env.list('TABLE_BUILDER_TRACE_HOOKS', default=[
+	'table_builder.src.services.instrumentation.LoggingTraceHook',
+	'table_builder.src.services.instrumentation.ServerTimingTraceHook',
+	'table_builder.src.services.instrumentation.MetricsTraceHook',
+])
+TABLE_BUILDER_QUERY_LIMITS = {
+	'statement_timeout': env.int('TABLE_BUILDER_STATEMENT_TIMEOUT', default=60000),
+	'max_rows': env.int('TABLE_BUILDER_MAX_ROWS', default=None),
+	'max_bytes': env.int('TABLE_BUILDER_MAX_BYTES', default=None),
+}
+
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 
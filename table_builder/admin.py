@@ -6,7 +6,7 @@ from django.contrib.contenttypes.admin import GenericTabularInline
 class SingleValueColumnMeta:
 	fields = (
 		'name', 'visible', 'position', 'show', 'alias', 'where_not', 'where_predicate', 'where_value',
-		'order_predicate', 'order_priority'
+		'order_predicate', 'order_priority', 'group_by', 'aggregate_function'
 	)
 	extra = 0
 
@@ -14,7 +14,7 @@ class SingleValueColumnMeta:
 class MultiValueColumnMeta:
 	fields = (
 		'name', 'visible', 'position', 'show', 'alias', 'where_not', 'where_from_value', 'where_to_value',
-		'order_predicate', 'order_priority'
+		'order_predicate', 'order_priority', 'group_by', 'aggregate_function'
 	)
 	extra = 0
 
@@ -48,7 +48,13 @@ class DatabaseAdminModel(admin.ModelAdmin):
 	list_display = ('dbname', 'dialect', 'alias')
 	fieldsets = (
 		('Основные настройки', {'fields': ('dbname', 'dialect', 'user', 'password', 'host', 'port')}),
-		('Дополнительные настройки', {'fields': ('alias', 'auto_fill_template'), 'classes': ('wide',)})
+		('Дополнительные настройки', {'fields': ('alias', 'auto_fill_template'), 'classes': ('wide',)}),
+		('Ограничения запросов', {
+			'fields': (
+				'statement_timeout', 'max_rows', 'max_bytes', 'plan_guard_mode', 'max_plan_cost', 'max_plan_rows'
+			),
+			'classes': ('collapse',)
+		}),
 	)
 
 
@@ -68,3 +74,13 @@ class AutoFillTemplateAdminModel(admin.ModelAdmin):
 		IntegerColumnInline, FloatColumnInline, CharColumnInline, DateColumnInline,
 		DateTimeColumnInline, DurationColumnInline
 	)
+
+
+@admin.register(models.ExportJob)
+class ExportJobAdminModel(admin.ModelAdmin):
+	list_display = ('pk', 'table_name', 'database', 'output_format', 'status', 'rows_written', 'created_at')
+	list_filter = ('status', 'output_format')
+	readonly_fields = (
+		'rows_written', 'bytes_written', 'file_path', 'worker', 'created_at', 'started_at', 'heartbeat_at',
+		'finished_at'
+	)
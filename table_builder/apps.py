@@ -5,3 +5,6 @@ class TableBuilderConfig(AppConfig):
 	default_auto_field = 'django.db.models.BigAutoField'
 	name = 'table_builder'
 	verbose_name = "SQL запросы"
+
+	def ready(self):
+		from table_builder import signals  # noqa: F401
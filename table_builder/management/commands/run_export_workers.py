@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from table_builder.src.services.export_jobs import ExportWorkerPool
+
+
+class Command(BaseCommand):
+	help = 'Запускает обработчики фоновых выгрузок, забирающие задания из таблицы ExportJob'
+
+	def add_arguments(self, parser):
+		parser.add_argument('--workers', type=int, help='Число потоков-обработчиков')
+		parser.add_argument('--poll-interval', type=float, help='Интервал опроса очереди, с')
+
+	def handle(self, *args, **options):
+		pool_options = {
+			key: options[key] for key in ('workers', 'poll_interval') if options[key] is not None
+		}
+		pool = ExportWorkerPool(**pool_options)
+		pool.start()
+		self.stdout.write(f'Запущено обработчиков выгрузки: {pool.options["workers"]}')
+		try:
+			while True:
+				time.sleep(1)
+		except KeyboardInterrupt:
+			self.stdout.write('Остановка обработчиков...')
+			pool.stop()
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 10:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='table',
+            name='result_cache_ttl',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию, 0 - не кэшировать', null=True, verbose_name='время хранения результатов в кэше, с'),
+        ),
+    ]
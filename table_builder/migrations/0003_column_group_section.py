@@ -0,0 +1,73 @@
+# Generated by Django 3.2 on 2026-10-18 10:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0002_table_result_cache_ttl'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='charcolumn',
+            name='aggregate_function',
+            field=models.CharField(blank=True, choices=[('', '---'), ('COUNT', 'Количество'), ('COUNT DISTINCT', 'Количество уникальных'), ('SUM', 'Сумма'), ('AVG', 'Среднее'), ('MIN', 'Минимум'), ('MAX', 'Максимум')], max_length=255, verbose_name='агрегатная функция'),
+        ),
+        migrations.AddField(
+            model_name='charcolumn',
+            name='group_by',
+            field=models.BooleanField(default=False, verbose_name='группировать'),
+        ),
+        migrations.AddField(
+            model_name='datecolumn',
+            name='aggregate_function',
+            field=models.CharField(blank=True, choices=[('', '---'), ('COUNT', 'Количество'), ('COUNT DISTINCT', 'Количество уникальных'), ('SUM', 'Сумма'), ('AVG', 'Среднее'), ('MIN', 'Минимум'), ('MAX', 'Максимум')], max_length=255, verbose_name='агрегатная функция'),
+        ),
+        migrations.AddField(
+            model_name='datecolumn',
+            name='group_by',
+            field=models.BooleanField(default=False, verbose_name='группировать'),
+        ),
+        migrations.AddField(
+            model_name='datetimecolumn',
+            name='aggregate_function',
+            field=models.CharField(blank=True, choices=[('', '---'), ('COUNT', 'Количество'), ('COUNT DISTINCT', 'Количество уникальных'), ('SUM', 'Сумма'), ('AVG', 'Среднее'), ('MIN', 'Минимум'), ('MAX', 'Максимум')], max_length=255, verbose_name='агрегатная функция'),
+        ),
+        migrations.AddField(
+            model_name='datetimecolumn',
+            name='group_by',
+            field=models.BooleanField(default=False, verbose_name='группировать'),
+        ),
+        migrations.AddField(
+            model_name='durationcolumn',
+            name='aggregate_function',
+            field=models.CharField(blank=True, choices=[('', '---'), ('COUNT', 'Количество'), ('COUNT DISTINCT', 'Количество уникальных'), ('SUM', 'Сумма'), ('AVG', 'Среднее'), ('MIN', 'Минимум'), ('MAX', 'Максимум')], max_length=255, verbose_name='агрегатная функция'),
+        ),
+        migrations.AddField(
+            model_name='durationcolumn',
+            name='group_by',
+            field=models.BooleanField(default=False, verbose_name='группировать'),
+        ),
+        migrations.AddField(
+            model_name='floatcolumn',
+            name='aggregate_function',
+            field=models.CharField(blank=True, choices=[('', '---'), ('COUNT', 'Количество'), ('COUNT DISTINCT', 'Количество уникальных'), ('SUM', 'Сумма'), ('AVG', 'Среднее'), ('MIN', 'Минимум'), ('MAX', 'Максимум')], max_length=255, verbose_name='агрегатная функция'),
+        ),
+        migrations.AddField(
+            model_name='floatcolumn',
+            name='group_by',
+            field=models.BooleanField(default=False, verbose_name='группировать'),
+        ),
+        migrations.AddField(
+            model_name='integercolumn',
+            name='aggregate_function',
+            field=models.CharField(blank=True, choices=[('', '---'), ('COUNT', 'Количество'), ('COUNT DISTINCT', 'Количество уникальных'), ('SUM', 'Сумма'), ('AVG', 'Среднее'), ('MIN', 'Минимум'), ('MAX', 'Максимум')], max_length=255, verbose_name='агрегатная функция'),
+        ),
+        migrations.AddField(
+            model_name='integercolumn',
+            name='group_by',
+            field=models.BooleanField(default=False, verbose_name='группировать'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 3.2 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0003_column_group_section'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='database',
+            name='max_bytes',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию', null=True, verbose_name='максимальный объём результата, байт'),
+        ),
+        migrations.AddField(
+            model_name='database',
+            name='max_rows',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию', null=True, verbose_name='максимальное число строк результата'),
+        ),
+        migrations.AddField(
+            model_name='database',
+            name='statement_timeout',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию', null=True, verbose_name='таймаут выполнения запроса, мс'),
+        ),
+        migrations.AddField(
+            model_name='table',
+            name='max_bytes',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию', null=True, verbose_name='максимальный объём результата, байт'),
+        ),
+        migrations.AddField(
+            model_name='table',
+            name='max_rows',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию', null=True, verbose_name='максимальное число строк результата'),
+        ),
+        migrations.AddField(
+            model_name='table',
+            name='statement_timeout',
+            field=models.PositiveIntegerField(blank=True, help_text='Пусто - значение по умолчанию', null=True, verbose_name='таймаут выполнения запроса, мс'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0004_query_limits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='database',
+            name='max_plan_cost',
+            field=models.FloatField(blank=True, null=True, verbose_name='максимальная оценка стоимости запроса'),
+        ),
+        migrations.AddField(
+            model_name='database',
+            name='max_plan_rows',
+            field=models.PositiveBigIntegerField(blank=True, null=True, verbose_name='максимальная оценка числа строк запроса'),
+        ),
+        migrations.AddField(
+            model_name='database',
+            name='plan_guard_mode',
+            field=models.CharField(choices=[('off', 'Не проверять'), ('warn', 'Предупреждать'), ('reject', 'Отклонять')], default='off', help_text='Перед выполнением запроса оценивается его план через EXPLAIN', max_length=16, verbose_name='проверка плана запроса'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2 on 2026-10-18 10:39
+
+import django.core.serializers.json
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0005_plan_guard'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('table_name', models.CharField(max_length=255, verbose_name='название таблицы')),
+                ('query', models.TextField(verbose_name='текст запроса')),
+                ('params', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='параметры запроса')),
+                ('output_format', models.CharField(choices=[('csv.gz', 'CSV (gzip)'), ('parquet', 'Parquet')], default='csv.gz', max_length=16, verbose_name='формат')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Завершено'), ('failed', 'Ошибка'), ('canceled', 'Отменено')], db_index=True, default='pending', max_length=16, verbose_name='статус')),
+                ('rows_written', models.PositiveBigIntegerField(default=0, verbose_name='записано строк')),
+                ('bytes_written', models.PositiveBigIntegerField(default=0, verbose_name='записано байт')),
+                ('file_path', models.CharField(blank=True, max_length=1024, verbose_name='путь к файлу')),
+                ('error', models.TextField(blank=True, verbose_name='ошибка')),
+                ('worker', models.CharField(blank=True, max_length=255, verbose_name='обработчик')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='начато')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='последняя активность')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='завершено')),
+                ('database', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='export_jobs', to='table_builder.database', verbose_name='база данных')),
+            ],
+            options={
+                'verbose_name': 'выгрузка',
+                'verbose_name_plural': 'выгрузки',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
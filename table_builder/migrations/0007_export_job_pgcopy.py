@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0006_export_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='output_format',
+            field=models.CharField(choices=[('csv.gz', 'CSV (gzip)'), ('parquet', 'Parquet'), ('pgcopy', 'PostgreSQL COPY (binary)')], default='csv.gz', max_length=16, verbose_name='формат'),
+        ),
+    ]
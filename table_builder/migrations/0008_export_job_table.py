@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 15:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0007_export_job_pgcopy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='table',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to='table_builder.table', verbose_name='таблица'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('table_builder', '0008_export_job_table'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='output_columns',
+            field=models.JSONField(blank=True, default=list, help_text='Пары (имя, тип столбца) для построения схемы Parquet', verbose_name='столбцы результата'),
+        ),
+    ]
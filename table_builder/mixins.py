@@ -1,20 +1,44 @@
 from typing import Type
 
+from django.http import StreamingHttpResponse
+from django.template.response import SimpleTemplateResponse
 from django.utils.functional import cached_property
 
 from table_builder.src.entity.constants import TemplateName
 from table_builder.src.interface.form_builders import SQLFormBuilder
 from table_builder.src.interface.schema_builder import SchemaBuilder
+from table_builder.src.services.column_params import PartialColumnData
+from table_builder.src.services.instrumentation import QueryTrace, TracedStream, TraceHookRegistry
+from table_builder.src.services.schema_store import schema_store
 
 
 class SQLParamsMixin:
 	schema_form_builder: Type[SQLFormBuilder]
 	field_forms_builder: Type[SQLFormBuilder]
 	schema_build_strategy: Type[SchemaBuilder]
+	schema_store = schema_store
 
 	def get_field_forms_kwargs(self) -> dict:
 		return dict()
 
+	def is_schema_stored(self) -> bool:
+		"""Клиент передал ключ схемы из SchemaStore вместо полной схемы"""
+		key_param = getattr(self.schema_build_strategy, 'key_param', None)
+		return key_param is not None and bool(self.request.POST.get(key_param))
+
+	def get_column_data(self, data):
+		"""
+		Вместе с ключом схемы клиент отправляет только изменённые параметры столбцов,
+		остальные заполняются значениями по умолчанию
+		"""
+		if self.is_schema_stored():
+			return PartialColumnData(self.schema, data, self.field_forms_builder.match)
+		return data
+
+	@cached_property
+	def schema_key(self) -> str:
+		return self.schema_store.put(self.schema)
+
 	def get_schema_forms_kwargs(self) -> dict:
 		return dict()
 
@@ -42,7 +66,38 @@ class TableDetailMixin(SQLParamsMixin):
 		ctx[TemplateName.SCHEMA_FORM.value] = self.schema_form
 		ctx[TemplateName.DB.value] = self.schema.db_pk
 		ctx[TemplateName.TABLE_FORM.value] = self.get_table_form()
+		ctx[TemplateName.SCHEMA_KEY.value] = self.schema_key
 		return ctx
 
 	def get_table_form(self):
 		raise NotImplementedError()
+
+
+class QueryTraceMixin:
+	"""
+	Замеры этапов обработки запроса для DRF-представлений.
+	Этапы отмечаются через self.trace.span, отрисовка ответа замеряется здесь же,
+	после чего замеры передаются получателям из TraceHookRegistry.
+	Для потокового ответа замеры передаются после его отдачи и без ответа:
+	заголовки к этому моменту уже отправлены, поэтому Server-Timing не выставляется
+	"""
+	trace_hooks = TraceHookRegistry
+
+	def initial(self, request, *args, **kwargs):
+		self.trace = QueryTrace(database=kwargs.get('pk'), table=None)
+		super().initial(request, *args, **kwargs)
+
+	def finalize_response(self, request, response, *args, **kwargs):
+		response = super().finalize_response(request, response, *args, **kwargs)
+		trace = getattr(self, 'trace', None)
+		if trace is None:
+			return response
+		if isinstance(response, StreamingHttpResponse):
+			response.streaming_content = TracedStream(response.streaming_content, trace, self.trace_hooks.emit)
+			return response
+		if isinstance(response, SimpleTemplateResponse) and not response.is_rendered:
+			with trace.span('render'):
+				response.render()
+			trace.bytes = len(response.content)
+		self.trace_hooks.emit(trace, response)
+		return response
@@ -1,22 +1,27 @@
 from typing import Generator
 
 from django.contrib.contenttypes.models import ContentType
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
+from django.db.models import F, IntegerField, Value
+from django.db.models.functions import Cast
 from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
-from table_builder.src.entity.constants import DialectDB
+from table_builder.src.entity.constants import DialectDB, ExportFormat, ExportStatus, PlanGuardMode
 from table_builder.src.entity.abstract_models import (
 	Column,
 	AliasSection,
 	ShowSection,
 	OrderSection,
+	GroupSection,
 	CharStringWhereSection,
 	DateTimeWhereSection,
 	DateWhereSection,
 	DurationWhereSection,
 	IntegerNumberWhereSection,
 	FloatNumberWhereSection, ColumnRelation,
+	QueryLimitsSection,
 )
 
 
@@ -36,20 +41,98 @@ class FieldRegistry:
 		return field_class
 
 
+class ColumnLoader:
+	"""
+	Загружает столбцы всех зарегистрированных типов одним запросом UNION ALL.
+	Общие для всех типов поля выбираются как есть, собственные поля каждого типа - отдельными
+	столбцами выборки, которые в остальных ветках объединения заполняются NULL
+	"""
+	INDEX_ALIAS = 'registry_index'
+
+	def __init__(self, registry=None):
+		self.registry = list(FieldRegistry.fields if registry is None else registry)
+		self.common_fields = self._get_common_fields()
+		self.own_fields = self._get_own_fields()
+
+	@staticmethod
+	def _concrete_fields(model):
+		return {field.attname: field for field in model._meta.concrete_fields}
+
+	def _get_common_fields(self):
+		if not self.registry:
+			return []
+		fields = self._concrete_fields(self.registry[0])
+		for model in self.registry[1:]:
+			other = self._concrete_fields(model)
+			fields = {
+				attname: field
+				for attname, field in fields.items()
+				if attname in other and type(other[attname]) is type(field)
+			}
+		return list(fields)
+
+	def _get_own_fields(self):
+		own_fields = {}
+		for model in self.registry:
+			for attname, field in self._concrete_fields(model).items():
+				if attname not in self.common_fields:
+					own_fields[f'{model._meta.model_name}__{attname}'] = (model, field)
+		return own_fields
+
+	def _get_queryset(self, index, model, content_type, object_id):
+		annotations = {self.INDEX_ALIAS: Value(index, output_field=IntegerField())}
+		for alias, (owner, field) in self.own_fields.items():
+			if owner is model:
+				annotations[alias] = F(field.attname)
+			else:
+				# PostgreSQL сводит типы UNION по веткам, и NULL без типа в них считается text
+				annotations[alias] = Cast(Value(None), output_field=type(field)())
+		return (
+			model.objects
+			.filter(content_type=content_type, object_id=object_id)
+			.annotate(**annotations)
+			.values_list(*self.common_fields, *annotations)
+		)
+
+	def get_queryset(self, model, object_id):
+		content_type = ContentType.objects.get_for_model(model)
+		querysets = [
+			self._get_queryset(index, column_model, content_type, object_id)
+			for index, column_model in enumerate(self.registry)
+		]
+		return querysets[0].union(*querysets[1:], all=True).order_by('position', 'name')
+
+	def load(self, model, object_id) -> list:
+		if not self.registry:
+			return []
+		return [self._make_instance(row) for row in self.get_queryset(model, object_id)]
+
+	def _make_instance(self, row):
+		values = dict(zip([*self.common_fields, self.INDEX_ALIAS, *self.own_fields], row))
+		model = self.registry[values[self.INDEX_ALIAS]]
+		prefix = f'{model._meta.model_name}__'
+		field_names = list(self._concrete_fields(model))
+		return model.from_db(
+			model.objects.db,
+			field_names,
+			[values[name] if name in self.common_fields else values[prefix + name] for name in field_names]
+		)
+
+
 class ColumnRelationMixin:
 	def _get_registry(self):
 		return FieldRegistry.fields
 
 	def get_columns(self) -> Generator:
-		instances = []
-		content_type = ContentType.objects.get_for_model(self)
-		for field in self._get_registry():
-			columns = field.objects.filter(content_type=content_type, object_id=self.pk)
-			instances.extend(list(columns)),
-		sorted_instances = sorted(instances, key=lambda x: (x.position, x.name))
-		for instance in sorted_instances:
+		"""Столбцы загружаются одним запросом и кэшируются на экземпляре до clear_columns_cache"""
+		if getattr(self, '_columns_cache', None) is None:
+			self._columns_cache = ColumnLoader(self._get_registry()).load(type(self), self.pk)
+		for instance in self._columns_cache:
 			yield instance
 
+	def clear_columns_cache(self):
+		self._columns_cache = None
+
 
 class AutoFillTemplate(ColumnRelationMixin, models.Model):
 	name = models.CharField(
@@ -70,7 +153,7 @@ class AutoFillTemplate(ColumnRelationMixin, models.Model):
 		return self.name
 
 
-class Database(models.Model):
+class Database(QueryLimitsSection, models.Model):
 	dialect = models.CharField(
 		verbose_name=_('диалект'),
 		choices=DialectDB.choices,
@@ -111,6 +194,23 @@ class Database(models.Model):
 		null=True,
 		blank=True,
 	)
+	plan_guard_mode = models.CharField(
+		verbose_name=_('проверка плана запроса'),
+		help_text=_('Перед выполнением запроса оценивается его план через EXPLAIN'),
+		choices=PlanGuardMode.choices,
+		default=PlanGuardMode.OFF,
+		max_length=16,
+	)
+	max_plan_cost = models.FloatField(
+		verbose_name=_('максимальная оценка стоимости запроса'),
+		null=True,
+		blank=True,
+	)
+	max_plan_rows = models.PositiveBigIntegerField(
+		verbose_name=_('максимальная оценка числа строк запроса'),
+		null=True,
+		blank=True,
+	)
 
 	class Meta:
 		verbose_name = _('база данных')
@@ -130,7 +230,7 @@ class Database(models.Model):
 		return self.alias
 
 
-class Table(ColumnRelationMixin, models.Model):
+class Table(ColumnRelationMixin, QueryLimitsSection, models.Model):
 	name = models.CharField(
 		verbose_name=_('название таблицы'),
 		max_length=255
@@ -146,6 +246,12 @@ class Table(ColumnRelationMixin, models.Model):
 		on_delete=models.CASCADE,
 		related_name='tables'
 	)
+	result_cache_ttl = models.PositiveIntegerField(
+		verbose_name=_('время хранения результатов в кэше, с'),
+		help_text=_('Пусто - значение по умолчанию, 0 - не кэшировать'),
+		null=True,
+		blank=True,
+	)
 
 	class Meta:
 		verbose_name = _('таблица')
@@ -159,42 +265,144 @@ class Table(ColumnRelationMixin, models.Model):
 
 
 @FieldRegistry.register
-class IntegerColumn(Column, ColumnRelation, ShowSection, AliasSection, IntegerNumberWhereSection, OrderSection):
+class IntegerColumn(Column, ColumnRelation, ShowSection, AliasSection, IntegerNumberWhereSection, OrderSection, GroupSection):
 
 	class Meta:
 		verbose_name = _('integer')
 
 
 @FieldRegistry.register
-class FloatColumn(Column, ColumnRelation, ShowSection, AliasSection, FloatNumberWhereSection, OrderSection):
+class FloatColumn(Column, ColumnRelation, ShowSection, AliasSection, FloatNumberWhereSection, OrderSection, GroupSection):
 
 	class Meta:
 		verbose_name = _('float')
 
 
 @FieldRegistry.register
-class CharColumn(Column, ColumnRelation, ShowSection, AliasSection, CharStringWhereSection, OrderSection):
+class CharColumn(Column, ColumnRelation, ShowSection, AliasSection, CharStringWhereSection, OrderSection, GroupSection):
 
 	class Meta:
 		verbose_name = _('char')
 
 
 @FieldRegistry.register
-class DateColumn(Column, ColumnRelation, ShowSection, AliasSection, DateWhereSection, OrderSection):
+class DateColumn(Column, ColumnRelation, ShowSection, AliasSection, DateWhereSection, OrderSection, GroupSection):
 
 	class Meta:
 		verbose_name = _('date')
 
 
 @FieldRegistry.register
-class DateTimeColumn(Column, ColumnRelation, ShowSection, AliasSection, DateTimeWhereSection, OrderSection):
+class DateTimeColumn(Column, ColumnRelation, ShowSection, AliasSection, DateTimeWhereSection, OrderSection, GroupSection):
 
 	class Meta:
 		verbose_name = _('datetime')
 
 
 @FieldRegistry.register
-class DurationColumn(Column, ColumnRelation, ShowSection, AliasSection, DurationWhereSection, OrderSection):
+class DurationColumn(Column, ColumnRelation, ShowSection, AliasSection, DurationWhereSection, OrderSection, GroupSection):
 
 	class Meta:
 		verbose_name = _('duration')
+
+
+class ExportJob(models.Model):
+	"""Задание фоновой выгрузки результата запроса в файл. Очередь заданий хранится в этой же таблице"""
+	database = models.ForeignKey(
+		verbose_name=_('база данных'),
+		to=Database,
+		on_delete=models.CASCADE,
+		related_name='export_jobs'
+	)
+	table = models.ForeignKey(
+		verbose_name=_('таблица'),
+		to=Table,
+		on_delete=models.SET_NULL,
+		related_name='export_jobs',
+		null=True,
+		blank=True
+	)
+	table_name = models.CharField(
+		verbose_name=_('название таблицы'),
+		max_length=255
+	)
+	query = models.TextField(
+		verbose_name=_('текст запроса'),
+	)
+	params = models.JSONField(
+		verbose_name=_('параметры запроса'),
+		encoder=DjangoJSONEncoder,
+		default=dict,
+	)
+	output_columns = models.JSONField(
+		verbose_name=_('столбцы результата'),
+		help_text=_('Пары (имя, тип столбца) для построения схемы Parquet'),
+		default=list,
+		blank=True,
+	)
+	output_format = models.CharField(
+		verbose_name=_('формат'),
+		choices=ExportFormat.choices,
+		default=ExportFormat.CSV_GZ,
+		max_length=16
+	)
+	status = models.CharField(
+		verbose_name=_('статус'),
+		choices=ExportStatus.choices,
+		default=ExportStatus.PENDING,
+		max_length=16,
+		db_index=True
+	)
+	rows_written = models.PositiveBigIntegerField(
+		verbose_name=_('записано строк'),
+		default=0
+	)
+	bytes_written = models.PositiveBigIntegerField(
+		verbose_name=_('записано байт'),
+		default=0
+	)
+	file_path = models.CharField(
+		verbose_name=_('путь к файлу'),
+		max_length=1024,
+		blank=True
+	)
+	error = models.TextField(
+		verbose_name=_('ошибка'),
+		blank=True
+	)
+	worker = models.CharField(
+		verbose_name=_('обработчик'),
+		max_length=255,
+		blank=True
+	)
+	created_at = models.DateTimeField(
+		verbose_name=_('создано'),
+		auto_now_add=True
+	)
+	started_at = models.DateTimeField(
+		verbose_name=_('начато'),
+		null=True,
+		blank=True
+	)
+	heartbeat_at = models.DateTimeField(
+		verbose_name=_('последняя активность'),
+		null=True,
+		blank=True
+	)
+	finished_at = models.DateTimeField(
+		verbose_name=_('завершено'),
+		null=True,
+		blank=True
+	)
+
+	class Meta:
+		verbose_name = _('выгрузка')
+		verbose_name_plural = _('выгрузки')
+		ordering = ['created_at']
+
+	def __str__(self):
+		return f'ExportJob(pk={self.pk}, status={self.status})'
+
+	@property
+	def filename(self) -> str:
+		return f'{self.table_name}.{self.output_format}'
@@ -0,0 +1,26 @@
+from django.db.models.signals import pre_save, post_delete
+from django.dispatch import receiver
+
+from table_builder import models
+from table_builder.src.entity.async_db_broker import AsyncEngineRegistry
+from table_builder.src.entity.db_broker import EngineRegistry
+from table_builder.src.services.schema_cache import schema_cache
+
+
+@receiver(pre_save, sender=models.Database)
+def dispose_engine_on_database_update(sender, instance, **kwargs):
+	"""Закрывает пул соединений, открытый по прежним параметрам подключения"""
+	if instance.pk is None:
+		return
+	previous = sender.objects.filter(pk=instance.pk).first()
+	if previous is not None:
+		EngineRegistry.dispose(previous.get_connection_url())
+		AsyncEngineRegistry.dispose(previous.get_connection_url())
+	schema_cache.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=models.Database)
+def dispose_engine_on_database_delete(sender, instance, **kwargs):
+	EngineRegistry.dispose(instance.get_connection_url())
+	AsyncEngineRegistry.dispose(instance.get_connection_url())
+	schema_cache.invalidate(instance.pk)
@@ -3,7 +3,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
-from table_builder.src.services.constants import OrderChoice, NumberWhereChoice, StringWhereChoice
+from table_builder.src.services.constants import OrderChoice, NumberWhereChoice, StringWhereChoice, AggregateChoice
 
 
 class ShowSection(models.Model):
@@ -43,6 +43,22 @@ class OrderSection(models.Model):
 		abstract = True
 
 
+class GroupSection(models.Model):
+	group_by = models.BooleanField(
+		verbose_name=_('группировать'),
+		default=False
+	)
+	aggregate_function = models.CharField(
+		verbose_name=_('агрегатная функция'),
+		choices=AggregateChoice.choices,
+		max_length=255,
+		blank=True
+	)
+
+	class Meta:
+		abstract = True
+
+
 class WhereSection(models.Model):
 	where_not = models.BooleanField(
 		verbose_name=_('не'),
@@ -157,6 +173,30 @@ class DurationWhereSection(WhereSection):
 		abstract = True
 
 
+class QueryLimitsSection(models.Model):
+	statement_timeout = models.PositiveIntegerField(
+		verbose_name=_('таймаут выполнения запроса, мс'),
+		help_text=_('Пусто - значение по умолчанию'),
+		null=True,
+		blank=True,
+	)
+	max_rows = models.PositiveIntegerField(
+		verbose_name=_('максимальное число строк результата'),
+		help_text=_('Пусто - значение по умолчанию'),
+		null=True,
+		blank=True,
+	)
+	max_bytes = models.PositiveIntegerField(
+		verbose_name=_('максимальный объём результата, байт'),
+		help_text=_('Пусто - значение по умолчанию'),
+		null=True,
+		blank=True,
+	)
+
+	class Meta:
+		abstract = True
+
+
 class ColumnRelation(models.Model):
 	content_type = models.ForeignKey(
 		to=ContentType,
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from table_builder.src.entity.db_broker import (
+	DBBroker,
+	EngineRegistry,
+	QueryLimitError,
+	QueryLimits,
+	ResultLimiter,
+	RunningQueryRegistry,
+)
+
+
+class AsyncEngineRegistry(EngineRegistry):
+	"""
+	Реестр асинхронных движков SQLAlchemy уровня процесса.
+	Ключом, как и в EngineRegistry, служит строка Database.get_connection_url().
+	Помимо движка для каждой внешней БД хранится семафор, ограничивающий число одновременных запросов,
+	и цикл событий, в котором движок создан: соединения asyncpg привязаны к своему циклу
+	"""
+	_engines = {}
+	_semaphores = {}
+	_loops = {}
+	_lock = threading.Lock()
+	drivers_matching = {
+		'postgresql': 'postgresql+asyncpg',
+	}
+	missing_driver_message = 'Для асинхронных запросов требуется пакет asyncpg: poetry install -E async'
+
+	@classmethod
+	def get_async_url(cls, connection_url: str) -> str:
+		"""
+		Database.get_connection_url передаёт параметры подключения в строке запроса,
+		asyncpg ожидает их в составе URL
+		"""
+		url = make_url(connection_url)
+		try:
+			drivername = cls.drivers_matching[url.get_backend_name()]
+		except KeyError:
+			raise NotImplementedError('Данный диалект не поддерживается')
+		query = dict(url.query)
+		port = query.pop('port', None)
+		url = url.set(
+			drivername=drivername,
+			username=query.pop('user', url.username),
+			password=query.pop('password', url.password),
+			host=query.pop('host', url.host),
+			port=int(port) if port else url.port,
+			query=query,
+		)
+		return url.render_as_string(hide_password=False)
+
+	@classmethod
+	def get_engine(cls, connection_url: str, **engine_kwargs):
+		engine = cls._engines.get(connection_url)
+		if engine is not None:
+			return engine
+		with cls._lock:
+			engine = cls._engines.get(connection_url)
+			if engine is None:
+				kwargs = cls.get_pool_kwargs()
+				kwargs.update(engine_kwargs)
+				try:
+					engine = create_async_engine(cls.get_async_url(connection_url), **kwargs)
+				except ImportError:
+					raise ImproperlyConfigured(cls.missing_driver_message)
+				cls._engines[connection_url] = engine
+				cls._loops[connection_url] = cls.get_running_loop()
+		return engine
+
+	@staticmethod
+	def get_running_loop():
+		try:
+			return asyncio.get_running_loop()
+		except RuntimeError:
+			return None
+
+	@classmethod
+	def get_semaphore(cls, connection_url: str) -> asyncio.Semaphore:
+		semaphore = cls._semaphores.get(connection_url)
+		if semaphore is None:
+			semaphore = asyncio.Semaphore(getattr(settings, 'TABLE_BUILDER_ASYNC_QUERY_LIMIT', 10))
+			cls._semaphores[connection_url] = semaphore
+		return semaphore
+
+	@classmethod
+	def dispose(cls, connection_url: str):
+		with cls._lock:
+			engine = cls._engines.pop(connection_url, None)
+			cls._semaphores.pop(connection_url, None)
+			loop = cls._loops.pop(connection_url, None)
+		if engine is not None:
+			cls.schedule_dispose(engine, loop)
+
+	@classmethod
+	def dispose_all(cls):
+		with cls._lock:
+			engines = [(engine, cls._loops.get(connection_url)) for connection_url, engine in cls._engines.items()]
+			cls._engines.clear()
+			cls._semaphores.clear()
+			cls._loops.clear()
+		for engine, loop in engines:
+			cls.schedule_dispose(engine, loop)
+
+	@classmethod
+	def schedule_dispose(cls, engine, loop=None):
+		"""
+		Закрывает пул движка в цикле событий, в котором он создан, а если тот уже остановлен -
+		в текущем цикле. Вне цикла событий пул закрывается во временном цикле
+		"""
+		if loop is None or not loop.is_running():
+			loop = cls.get_running_loop()
+		if loop is None:
+			asyncio.run(engine.dispose())
+		else:
+			asyncio.run_coroutine_threadsafe(engine.dispose(), loop)
+
+
+class AsyncDBBroker:
+	"""Отвечает за асинхронное общение с базой данных через asyncio-движок SQLAlchemy"""
+
+	errors = DBBroker.errors
+	engine_kwargs = {
+		'connect_args': {'timeout': 5}
+	}
+
+	def __init__(self, connection_url: str, **kwargs):
+		self.connection_url = connection_url
+		self.engine_kwargs = {**self.engine_kwargs, **kwargs}
+		self.engine = AsyncEngineRegistry.get_engine(self.connection_url, **self.engine_kwargs)
+		self.semaphore = AsyncEngineRegistry.get_semaphore(self.connection_url)
+
+	async def run_query(self, query: str, params: dict = None, limits: QueryLimits = None, query_id: str = None):
+		"""
+		Как и в DBBroker.run_query, при ограничении числа строк или объёма результат читается
+		курсором на стороне сервера. query_id позволяет отменить запрос через DBBroker.cancel_query
+		"""
+		if params is None:
+			params = {}
+		async with self.semaphore:
+			try:
+				async with self.engine.connect() as c:
+					if limits is not None and limits.statement_timeout:
+						await c.exec_driver_sql(f'SET LOCAL statement_timeout = {int(limits.statement_timeout)}')
+					if query_id is not None:
+						pid = (await c.exec_driver_sql('SELECT pg_backend_pid()')).scalar()
+						await sync_to_async(RunningQueryRegistry.register)(query_id, self.connection_url, pid)
+					if limits is not None and limits.limits_result():
+						result = await self.fetch_limited(c, query, params, limits)
+					else:
+						result = (await c.execute(text(query), params)).all()
+			except QueryLimitError:
+				raise
+			except Exception as e:
+				if getattr(getattr(e, 'orig', None), 'sqlstate', None) == DBBroker.canceled_sqlstate:
+					raise QueryLimitError(self.errors['canceled'])
+				raise AttributeError(self.errors['connection'])
+			finally:
+				if query_id is not None:
+					await sync_to_async(RunningQueryRegistry.unregister)(query_id)
+		return result
+
+	@staticmethod
+	async def fetch_limited(connection, query: str, params: dict, limits: QueryLimits) -> list:
+		limiter = ResultLimiter(limits)
+		rows = []
+		result = await connection.stream(text(query), params)
+		async for partition in result.partitions(DBBroker.stream_chunk_size):
+			limiter.add(partition)
+			rows.extend(partition)
+		return rows
@@ -7,6 +7,16 @@ class OrderChoice(TextChoices):
 	DESC = 'DESC', 'По убыванию'
 
 
+class AggregateChoice(TextChoices):
+	NOT = '', '---'
+	COUNT = 'COUNT', 'Количество'
+	COUNT_DISTINCT = 'COUNT DISTINCT', 'Количество уникальных'
+	SUM = 'SUM', 'Сумма'
+	AVG = 'AVG', 'Среднее'
+	MIN = 'MIN', 'Минимум'
+	MAX = 'MAX', 'Максимум'
+
+
 class NumberWhereChoice(TextChoices):
 	NOT = '', '---'
 	EQ = '=', 'Равно'
@@ -35,6 +45,35 @@ class DialectDB(TextChoices):
 	POSTGRES = 'postgresql', 'PostgreSQL'
 
 
+class PlanGuardMode(TextChoices):
+	OFF = 'off', 'Не проверять'
+	WARN = 'warn', 'Предупреждать'
+	REJECT = 'reject', 'Отклонять'
+
+
+class StreamFormat(TextChoices):
+	NDJSON = 'ndjson', 'NDJSON'
+	JSON = 'json', 'JSON'
+	CSV = 'csv', 'CSV'
+	ARROW = 'arrow', 'Arrow IPC'
+	PARQUET = 'parquet', 'Parquet'
+	PGCOPY = 'pgcopy', 'PostgreSQL COPY (binary)'
+
+
+class ExportFormat(TextChoices):
+	CSV_GZ = 'csv.gz', 'CSV (gzip)'
+	PARQUET = 'parquet', 'Parquet'
+	PGCOPY = 'pgcopy', 'PostgreSQL COPY (binary)'
+
+
+class ExportStatus(TextChoices):
+	PENDING = 'pending', 'В очереди'
+	RUNNING = 'running', 'Выполняется'
+	DONE = 'done', 'Завершено'
+	FAILED = 'failed', 'Ошибка'
+	CANCELED = 'canceled', 'Отменено'
+
+
 class SQLParam(TextChoices):
 	SHOW = 'show', 'Показать'
 	ALIAS = 'alias', 'Псевдоним'
@@ -73,6 +112,27 @@ class Message(TextChoices):
 	NO_FIELDS_SELECTED = 'Не выбраны поля для отображения'
 	SUCCESS_UPDATE_SCHEMA = 'Схема успешна обновлена'
 	SUCCESS_CREATE_SCHEMA = 'Схема успешна сохранена'
+	UNSUPPORTED_FORMAT = 'Неподдерживаемый формат выгрузки'
+	INVALID_PAGINATION = 'Некорректные параметры постраничной выборки'
+	PAGINATION_KEY_REQUIRED = 'Для постраничной выборки у таблицы должен быть первичный ключ'
+	INVALID_AGGREGATE_FILTER = 'Условие фильтрации не подходит для результата агрегатной функции'
+	UNGROUPED_COLUMN = 'При группировке столбец должен быть сгруппирован или агрегирован'
+	PLAN_COST_EXCEEDED = 'Оценка стоимости запроса превышает допустимую'
+	PLAN_ROWS_EXCEEDED = 'Оценка числа строк запроса превышает допустимую'
+	PLAN_UNAVAILABLE = 'План запроса недоступен для данного диалекта'
+	EXPORT_NOT_READY = 'Выгрузка ещё не завершена'
+	EXPORT_CANCELED = 'Выгрузка отменена'
+	EXPORT_WORKER_LOST = 'Обработчик выгрузки перестал отвечать'
+	INVALID_SCHEMA = 'Некорректная схема таблицы'
+	SCHEMA_NOT_FOUND = 'Схема не найдена или устарела, отправьте её полностью'
+	SCHEMA_DATABASE_MISMATCH = 'База данных схемы не найдена или не совпадает с запрошенной'
+	TABLE_NOT_FOUND = 'Таблица не найдена'
+	UNKNOWN_COLUMN = 'Столбец отсутствует в таблице'
+	DUPLICATE_COLUMN = 'Параметр столбца задан несколько раз'
+	INVALID_FILTER = 'Условие фильтрации не подходит для типа столбца'
+	INVALID_ALIAS = 'Псевдоним не может содержать двойные кавычки'
+	PAGE_SIZE_EXCEEDED = 'Размер страницы превышает допустимый'
+	CURSOR_WITHOUT_LIMIT = 'Курсор передаётся вместе с размером страницы limit'
 
 
 class TemplateName(TextChoices):
@@ -82,3 +142,4 @@ class TemplateName(TextChoices):
 	DB = 'db'
 	LOCAL_TABLES = 'local_schemes'
 	AUTO_TABLES = 'auto_schemes'
+	SCHEMA_KEY = 'schema_key'
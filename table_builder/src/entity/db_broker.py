@@ -1,21 +1,367 @@
-from sqlalchemy import create_engine, text, MetaData
+import hashlib
+import json
+import queue
+import re
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
+
+from django.conf import settings
+from django.core.cache import cache
+from sqlalchemy import create_engine, text, inspect, MetaData
+from sqlalchemy.exc import DBAPIError
+
+
+class EngineRegistry:
+	"""
+	Реестр движков SQLAlchemy уровня процесса.
+	Для каждой внешней БД хранится один движок с пулом соединений, ключом служит строка подключения
+	"""
+	_engines = {}
+	_lock = threading.Lock()
+
+	def __new__(cls, *args, **kwargs):
+		raise PermissionError('Запрещено создавать экземпляры данного класса')
+
+	@classmethod
+	def get_pool_kwargs(cls) -> dict:
+		return dict(getattr(settings, 'TABLE_BUILDER_ENGINE_POOL', {}))
+
+	@classmethod
+	def get_engine(cls, connection_url: str, **engine_kwargs):
+		engine = cls._engines.get(connection_url)
+		if engine is not None:
+			return engine
+		with cls._lock:
+			engine = cls._engines.get(connection_url)
+			if engine is None:
+				kwargs = cls.get_pool_kwargs()
+				kwargs.update(engine_kwargs)
+				engine = create_engine(connection_url, **kwargs)
+				cls._engines[connection_url] = engine
+		return engine
+
+	@classmethod
+	def dispose(cls, connection_url: str):
+		with cls._lock:
+			engine = cls._engines.pop(connection_url, None)
+		if engine is not None:
+			engine.dispose()
+
+	@classmethod
+	def dispose_all(cls):
+		with cls._lock:
+			engines = list(cls._engines.values())
+			cls._engines.clear()
+		for engine in engines:
+			engine.dispose()
+
+
+class QueryLimitError(Exception):
+	"""Запрос прерван из-за превышения ограничений или отменён"""
+
+
+class QueryLimits:
+	"""
+	Ограничения выполнения запроса: таймаут выполнения на сервере (мс), число строк и объём результата (байт).
+	None означает отсутствие ограничения
+	"""
+	attrs = ('statement_timeout', 'max_rows', 'max_bytes')
+
+	def __init__(self, statement_timeout: int = None, max_rows: int = None, max_bytes: int = None):
+		self.statement_timeout = statement_timeout
+		self.max_rows = max_rows
+		self.max_bytes = max_bytes
+
+	@classmethod
+	def from_instance(cls, instance):
+		return cls(**{attr: getattr(instance, attr, None) for attr in cls.attrs})
+
+	@classmethod
+	def from_settings(cls):
+		return cls(**getattr(settings, 'TABLE_BUILDER_QUERY_LIMITS', {}))
+
+	@classmethod
+	def merge(cls, *limits):
+		"""Для каждого ограничения берётся первое заданное значение: более частные настройки передаются первыми"""
+		return cls(**{
+			attr: next((getattr(item, attr) for item in limits if getattr(item, attr) is not None), None)
+			for attr in cls.attrs
+		})
+
+	def limits_result(self) -> bool:
+		return self.max_rows is not None or self.max_bytes is not None
+
+
+class ResultLimiter:
+	"""
+	Считает прочитанные строки и объём результата, прерывая чтение при превышении max_rows или max_bytes.
+	Объём строк оценивается по длине строкового представления значений
+	"""
+
+	def __init__(self, limits: QueryLimits = None):
+		self.max_rows = limits.max_rows if limits is not None else None
+		self.max_bytes = limits.max_bytes if limits is not None else None
+		self.rows = 0
+		self.size = 0
+
+	def add(self, partition):
+		self.rows += len(partition)
+		if self.max_rows is not None and self.rows > self.max_rows:
+			raise QueryLimitError(DBBroker.errors['max_rows'])
+		if self.max_bytes is not None:
+			self.add_bytes(sum(len(str(value)) for row in partition for value in row))
+
+	def add_bytes(self, size: int):
+		self.size += size
+		if self.max_bytes is not None and self.size > self.max_bytes:
+			raise QueryLimitError(DBBroker.errors['max_bytes'])
+
+
+class QueryPlan:
+	"""Корневой узел плана запроса PostgreSQL в формате EXPLAIN (FORMAT JSON)"""
+
+	def __init__(self, plan: dict):
+		self.plan = plan
+		self.total_cost = plan.get('Total Cost')
+		self.plan_rows = plan.get('Plan Rows')
+
+
+class RunningQueryRegistry:
+	"""
+	Реестр выполняющихся запросов в кэше Django: идентификатор запроса клиента -> PID серверного процесса.
+	Общий для всех процессов, если кэш общий, и позволяет отменить запрос из другого запроса
+	"""
+	key_prefix = 'table_builder:running_query'
+	timeout = 24 * 60 * 60
+
+	def __new__(cls, *args, **kwargs):
+		raise PermissionError('Запрещено создавать экземпляры данного класса')
+
+	@staticmethod
+	def get_database_key(connection_url: str) -> str:
+		return hashlib.sha256(connection_url.encode()).hexdigest()
+
+	@classmethod
+	def register(cls, query_id: str, connection_url: str, pid: int):
+		cache.set(f'{cls.key_prefix}:{query_id}', (cls.get_database_key(connection_url), pid), timeout=cls.timeout)
+
+	@classmethod
+	def unregister(cls, query_id: str):
+		cache.delete(f'{cls.key_prefix}:{query_id}')
+
+	@classmethod
+	def get_pid(cls, query_id: str, connection_url: str):
+		entry = cache.get(f'{cls.key_prefix}:{query_id}')
+		if entry is None or entry[0] != cls.get_database_key(connection_url):
+			return None
+		return entry[1]
+
+
+class QueryStream:
+	"""
+	Результат запроса, читаемый порциями через курсор на стороне сервера.
+	Соединение возвращается в пул после полного прочтения или вызова close().
+	При превышении max_rows или max_bytes чтение прерывается QueryLimitError,
+	прочитанные до этого части к этому моменту уже отданы потребителю
+	"""
+
+	def __init__(self, connection, result, chunk_size: int, query_id: str = None, limits: QueryLimits = None):
+		self.connection = connection
+		self.result = result
+		self.chunk_size = chunk_size
+		self.query_id = query_id
+		self.limiter = ResultLimiter(limits)
+		self.keys = list(result.keys())
+
+	def __iter__(self):
+		try:
+			for partition in self.result.partitions(self.chunk_size):
+				self.limiter.add(partition)
+				yield partition
+		finally:
+			self.close()
+
+	def close(self):
+		self.result.close()
+		self.connection.close()
+		if self.query_id is not None:
+			RunningQueryRegistry.unregister(self.query_id)
+
+
+class CopyAborted(Exception):
+	"""Потребитель прекратил чтение вывода COPY"""
+
+
+class CopyStream:
+	"""
+	Вывод COPY (...) TO STDOUT, отдаваемый частями байт.
+	copy_expert psycopg2 пишет в файловый объект синхронно, поэтому COPY выполняется в отдельном потоке,
+	а части передаются через ограниченную очередь: при медленном клиенте чтение из БД приостанавливается.
+	limiter прерывает COPY при превышении max_bytes, объём считается по байтам вывода
+	"""
+	queue_size = 16
+	put_timeout = 0.5
+	_done = object()
+
+	def __init__(self, run_copy, limits: QueryLimits = None):
+		self.run_copy = run_copy
+		self.queue = queue.Queue(self.queue_size)
+		self.aborted = threading.Event()
+		self.thread = None
+		self.rowcount = None
+		self.limiter = ResultLimiter(QueryLimits(max_bytes=limits.max_bytes) if limits is not None else None)
+
+	def start(self):
+		if self.thread is None:
+			self.thread = threading.Thread(target=self._run, daemon=True)
+			self.thread.start()
+		return self
+
+	def write(self, data):
+		data = bytes(data)
+		self.limiter.add_bytes(len(data))
+		if not self._put(data):
+			raise CopyAborted()
+
+	def _put(self, item) -> bool:
+		while not self.aborted.is_set():
+			try:
+				self.queue.put(item, timeout=self.put_timeout)
+				return True
+			except queue.Full:
+				continue
+		return False
+
+	def _run(self):
+		try:
+			self.run_copy(self)
+		except CopyAborted:
+			pass
+		except Exception as e:
+			self._put(e)
+		finally:
+			self._put(self._done)
+
+	def __iter__(self):
+		self.start()
+		try:
+			while True:
+				item = self.queue.get()
+				if item is self._done:
+					break
+				if isinstance(item, Exception):
+					raise item
+				yield item
+		finally:
+			self.close()
+
+	def close(self):
+		self.aborted.set()
+
+
+class PreparedStatementCache:
+	"""
+	Ограниченный LRU-кэш серверных подготовленных выражений PostgreSQL для одного физического соединения.
+	Хранится в connection.info, поэтому живёт ровно столько, сколько соединение в пуле.
+	Ключ - текст запроса в нотации :name, вытесненные выражения освобождаются через DEALLOCATE
+	"""
+	INFO_KEY = 'table_builder_prepared_statements'
+	NAME_PREFIX = 'tb_stmt_'
+	PARAM_PATTERN = re.compile(r'("[^"]*"|\'[^\']*\')|(?<!:):(\w+)')
+
+	def __init__(self, max_statements: int):
+		self.max_statements = max_statements
+		self.statements = OrderedDict()
+		self.reset_required = False
+		self._counter = 0
+
+	@classmethod
+	def for_connection(cls, connection, max_statements: int):
+		statement_cache = connection.info.get(cls.INFO_KEY)
+		if statement_cache is None:
+			statement_cache = cls(max_statements)
+			connection.info[cls.INFO_KEY] = statement_cache
+		return statement_cache
+
+	@classmethod
+	def to_positional(cls, query: str):
+		"""Переводит именованные параметры :name в позиционные $n"""
+		param_names = []
+
+		def replace(match):
+			if match.group(1):
+				return match.group(1)
+			name = match.group(2)
+			if name not in param_names:
+				param_names.append(name)
+			return f'${param_names.index(name) + 1}'
+
+		return cls.PARAM_PATTERN.sub(replace, query), param_names
+
+	def prepare(self, connection, query: str):
+		if self.reset_required:
+			connection.exec_driver_sql('DEALLOCATE ALL')
+			self.statements.clear()
+			self.reset_required = False
+		if query in self.statements:
+			self.statements.move_to_end(query)
+			return self.statements[query]
+		name = f'{self.NAME_PREFIX}{self._counter}'
+		self._counter += 1
+		positional_query, param_names = self.to_positional(query)
+		connection.exec_driver_sql(f'PREPARE {name} AS {positional_query}')
+		self.statements[query] = name, param_names
+		while len(self.statements) > self.max_statements:
+			_, (evicted_name, _) = self.statements.popitem(last=False)
+			connection.exec_driver_sql(f'DEALLOCATE {evicted_name}')
+		return name, param_names
+
+	def execute(self, connection, query: str, params: dict):
+		try:
+			name, param_names = self.prepare(connection, query)
+			args = ', '.join(f':{param_name}' for param_name in param_names)
+			statement = f'EXECUTE {name}({args})' if param_names else f'EXECUTE {name}'
+			return connection.execute(text(statement), params)
+		except Exception:
+			self.reset_required = True
+			raise
 
 
 class DBBroker:
 	"""Отвечает за общение с базой данных"""
 
 	errors = {
-		'connection': 'Не удалось подключиться к БД'
+		'connection': 'Не удалось подключиться к БД',
+		'canceled': 'Запрос отменён или превысил допустимое время выполнения',
+		'max_rows': 'Результат запроса превышает допустимое число строк',
+		'max_bytes': 'Результат запроса превышает допустимый объём',
+	}
+	# SQLSTATE query_canceled: срабатывание statement_timeout или pg_cancel_backend
+	canceled_sqlstate = '57014'
+	postgresql_dialects = ('postgresql',)
+	copy_options = {
+		'csv': 'FORMAT csv, HEADER true',
+		'binary': 'FORMAT binary',
 	}
+	PYFORMAT_PATTERN = re.compile(r'("[^"]*"|\'[^\']*\')|(?<!:):(\w+)|%')
 	engine_kwargs = {
 		'future': True,
 		'connect_args': {'connect_timeout': 5}
 	}
+	stream_chunk_size = 1000
+	prepared_statements_dialects = postgresql_dialects
+	catalog_fingerprint_dialects = postgresql_dialects
 
 	def __init__(self, connection_url: str, **kwargs):
 		self.connection_url = connection_url
-		self.engine_kwargs.update(kwargs)
-		self.engine = create_engine(self.connection_url, **self.engine_kwargs)
+		self.engine_kwargs = {**self.engine_kwargs, **kwargs}
+		self.engine = EngineRegistry.get_engine(self.connection_url, **self.engine_kwargs)
+		self.prepared_statements_options = {
+			'enabled': False,
+			'max_statements': 100,
+			**getattr(settings, 'TABLE_BUILDER_PREPARED_STATEMENTS', {})
+		}
 
 	def get_schema(self):
 		meta = MetaData()
@@ -26,12 +372,253 @@ class DBBroker:
 		table_list = list(meta.tables.values())
 		return table_list
 
-	def run_query(self, query: str, params: dict = None):
+	def get_table_names(self) -> list:
+		try:
+			return inspect(self.engine).get_table_names()
+		except Exception:
+			raise AttributeError(self.errors['connection'])
+
+	def get_table(self, table_name: str):
+		meta = MetaData()
+		try:
+			meta.reflect(bind=self.engine, only=[table_name])
+		except Exception:
+			raise AttributeError(self.errors['connection'])
+		return meta.tables[table_name]
+
+	def get_catalog_fingerprint(self, table_name: str = None) -> str:
+		"""
+		Дешёвый отпечаток каталога: хэш описания столбцов текущей схемы БД.
+		Если передан table_name, учитываются только столбцы этой таблицы.
+		Для диалектов без поддержки возвращает None, и SchemaCache по истечении ttl отражает схему заново
+		"""
+		if self.engine.dialect.name not in self.catalog_fingerprint_dialects:
+			return None
+		query = (
+			"SELECT md5(coalesce(string_agg("
+			"table_name || '.' || column_name || ':' || data_type || ':' || is_nullable, ',' "
+			"ORDER BY table_name, ordinal_position), '')) "
+			"FROM information_schema.columns WHERE table_schema = current_schema()"
+		)
+		params = {}
+		if table_name is not None:
+			query += " AND table_name = :table_name"
+			params['table_name'] = table_name
+		try:
+			with self.engine.connect() as c:
+				return c.execute(text(query), params).scalar()
+		except Exception:
+			raise AttributeError(self.errors['connection'])
+
+	def get_primary_key(self, table_name: str) -> list:
+		try:
+			constraint = inspect(self.engine).get_pk_constraint(table_name)
+		except Exception:
+			raise AttributeError(self.errors['connection'])
+		return constraint.get('constrained_columns') or []
+
+	def use_prepared_statements(self, prepared: bool = None) -> bool:
+		if prepared is None:
+			prepared = self.prepared_statements_options['enabled']
+		return prepared and self.engine.dialect.name in self.prepared_statements_dialects
+
+	def is_postgresql(self) -> bool:
+		return self.engine.dialect.name in self.postgresql_dialects
+
+	def prepare_connection(self, connection, limits: QueryLimits = None, query_id: str = None):
+		"""Выставляет таймаут выполнения на сервере и регистрирует запрос для возможной отмены"""
+		if not self.is_postgresql():
+			return
+		if limits is not None and limits.statement_timeout:
+			connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(limits.statement_timeout)}')
+		if query_id is not None:
+			pid = connection.exec_driver_sql('SELECT pg_backend_pid()').scalar()
+			RunningQueryRegistry.register(query_id, self.connection_url, pid)
+
+	def fetch_limited(self, result, limits: QueryLimits = None) -> list:
+		"""
+		Читает строки результата, прерываясь при превышении max_rows или max_bytes.
+		Результат должен читаться курсором на стороне сервера, иначе драйвер загрузит его целиком до проверки
+		"""
+		if limits is None or not limits.limits_result():
+			return result.all()
+		limiter = ResultLimiter(limits)
+		rows = []
+		for partition in result.partitions(self.stream_chunk_size):
+			limiter.add(partition)
+			rows.extend(partition)
+		return rows
+
+	def is_canceled_error(self, error: Exception) -> bool:
+		original = error.orig if isinstance(error, DBAPIError) else error
+		return getattr(original, 'pgcode', None) == self.canceled_sqlstate
+
+	@staticmethod
+	def span(trace, name: str):
+		"""Замер этапа, если передан QueryTrace"""
+		return trace.span(name) if trace is not None else nullcontext()
+
+	def run_query(
+		self, query: str, params: dict = None, prepared: bool = None,
+		limits: QueryLimits = None, query_id: str = None, trace=None
+	):
+		"""
+		Выполняет запрос и возвращает все строки.
+		При prepared=True (или включённой настройке) запрос выполняется через серверное подготовленное выражение.
+		limits ограничивают время выполнения на сервере и объём результата на клиенте,
+		query_id позволяет отменить запрос через cancel_query, в trace пишутся этапы connect, execute и fetch.
+		При ограничении числа строк или объёма результат читается курсором на стороне сервера
+		и подготовленные выражения не используются: EXECUTE не открывает именованный курсор
+		"""
+		if params is None:
+			params = {}
+		streamed = limits is not None and limits.limits_result()
+		try:
+			with self.span(trace, 'connect'):
+				connection = self.engine.connect()
+			with connection as c:
+				self.prepare_connection(c, limits, query_id)
+				with self.span(trace, 'execute'):
+					if streamed:
+						cursor_result = c.execute(text(query), params, execution_options={'stream_results': True})
+					elif self.use_prepared_statements(prepared):
+						statement_cache = PreparedStatementCache.for_connection(
+							c, self.prepared_statements_options['max_statements']
+						)
+						cursor_result = statement_cache.execute(c, query, params)
+					else:
+						cursor_result = c.execute(text(query), params)
+				with self.span(trace, 'fetch'):
+					result = self.fetch_limited(cursor_result, limits)
+		except QueryLimitError:
+			raise
+		except Exception as e:
+			if self.is_canceled_error(e):
+				raise QueryLimitError(self.errors['canceled'])
+			raise AttributeError(self.errors['connection'])
+		finally:
+			if query_id is not None:
+				RunningQueryRegistry.unregister(query_id)
+		return result
+
+	def stream_query(
+		self, query: str, params: dict = None, chunk_size: int = None,
+		limits: QueryLimits = None, query_id: str = None, trace=None
+	) -> QueryStream:
+		"""Ограничения по числу строк и объёму проверяются при чтении потока, см. QueryStream"""
+		if params is None:
+			params = {}
+		connection = None
+		try:
+			with self.span(trace, 'connect'):
+				connection = self.engine.connect().execution_options(stream_results=True)
+			self.prepare_connection(connection, limits, query_id)
+			with self.span(trace, 'execute'):
+				result = connection.execute(text(query), params)
+		except Exception as e:
+			if connection is not None:
+				connection.close()
+			if query_id is not None:
+				RunningQueryRegistry.unregister(query_id)
+			if self.is_canceled_error(e):
+				raise QueryLimitError(self.errors['canceled'])
+			raise AttributeError(self.errors['connection'])
+		return QueryStream(connection, result, chunk_size or self.stream_chunk_size, query_id, limits)
+
+	def supports_copy(self) -> bool:
+		return self.is_postgresql()
+
+	@classmethod
+	def to_pyformat(cls, query: str) -> str:
+		"""Переводит параметры :name в %(name)s для mogrify, экранируя остальные символы %"""
+
+		def replace(match):
+			if match.group(1):
+				return match.group(1).replace('%', '%%')
+			if match.group(2):
+				return f'%({match.group(2)})s'
+			return '%%'
+
+		return cls.PYFORMAT_PATTERN.sub(replace, query)
+
+	def build_copy_sql(self, cursor, query: str, params: dict, copy_format: str, max_rows: int = None) -> bytes:
+		"""
+		COPY не принимает параметры, поэтому они подставляются в текст запроса драйвером.
+		При max_rows сервер выдаёт не больше max_rows + 1 строк, чтобы превышение можно было обнаружить
+		"""
+		if max_rows is not None:
+			query = f'SELECT * FROM ({query}) AS limited_result LIMIT {int(max_rows) + 1}'
+		query = cursor.mogrify(self.to_pyformat(query), params)
+		return b'COPY (' + query + b') TO STDOUT WITH (' + self.copy_options[copy_format].encode() + b')'
+
+	def copy_query(
+		self, query: str, params: dict = None, copy_format: str = 'csv',
+		limits: QueryLimits = None, query_id: str = None
+	) -> CopyStream:
+		"""
+		Выгружает результат запроса через COPY ... TO STDOUT. Данные формирует сервер БД,
+		строки не проходят через Python. max_bytes проверяется по байтам вывода, max_rows - по числу
+		выгруженных строк после завершения COPY; в обоих случаях чтение прерывается QueryLimitError
+		"""
+		if not self.supports_copy() or copy_format not in self.copy_options:
+			raise NotImplementedError('Данный диалект или формат не поддерживается')
+		if params is None:
+			params = {}
+		max_rows = limits.max_rows if limits is not None else None
+
+		def run_copy(sink: CopyStream):
+			try:
+				with self.engine.connect() as c:
+					self.prepare_connection(c, limits, query_id)
+					cursor = c.connection.cursor()
+					try:
+						cursor.copy_expert(self.build_copy_sql(cursor, query, params, copy_format, max_rows), sink)
+						sink.rowcount = cursor.rowcount
+					except (CopyAborted, QueryLimitError):
+						# соединение осталось в состоянии COPY OUT и не должно вернуться в пул
+						c.invalidate()
+						raise
+					finally:
+						cursor.close()
+				if max_rows is not None and sink.rowcount > max_rows:
+					raise QueryLimitError(self.errors['max_rows'])
+			except (CopyAborted, QueryLimitError):
+				raise
+			except Exception as e:
+				if self.is_canceled_error(e):
+					raise QueryLimitError(self.errors['canceled'])
+				raise AttributeError(self.errors['connection'])
+			finally:
+				if query_id is not None:
+					RunningQueryRegistry.unregister(query_id)
+
+		return CopyStream(run_copy, limits)
+
+	def explain(self, query: str, params: dict = None, limits: QueryLimits = None) -> QueryPlan:
+		"""Возвращает оценку плана запроса без его выполнения. Планирование ограничено тем же таймаутом, что и запрос"""
+		if not self.is_postgresql():
+			raise NotImplementedError('Данный диалект не поддерживается')
 		if params is None:
 			params = {}
 		try:
 			with self.engine.connect() as c:
-				result = c.execute(text(query), params).all()
+				self.prepare_connection(c, limits)
+				plan = c.execute(text(f'EXPLAIN (FORMAT JSON) {query}'), params).scalar()
+		except Exception as e:
+			if self.is_canceled_error(e):
+				raise QueryLimitError(self.errors['canceled'])
+			raise AttributeError(self.errors['connection'])
+		if isinstance(plan, str):
+			plan = json.loads(plan)
+		return QueryPlan(plan[0]['Plan'])
+
+	def cancel_query(self, query_id: str) -> bool:
+		"""Отменяет выполняющийся запрос через pg_cancel_backend. Возвращает False, если запрос не найден"""
+		pid = RunningQueryRegistry.get_pid(query_id, self.connection_url)
+		if pid is None or not self.is_postgresql():
+			return False
+		try:
+			with self.engine.connect() as c:
+				return bool(c.execute(text('SELECT pg_cancel_backend(:pid)'), {'pid': pid}).scalar())
 		except Exception:
 			raise AttributeError(self.errors['connection'])
-		return result
@@ -2,9 +2,12 @@ from typing import Sequence
 
 
 class ColumnSchema:
-	def __init__(self, *, name, data_type, pk=None, instance=None):
+	__slots__ = ('name', 'data_type', 'primary_key', 'instance', 'pk')
+
+	def __init__(self, *, name, data_type, pk=None, instance=None, primary_key=False):
 		self.name = name
 		self.data_type = data_type
+		self.primary_key = primary_key
 		self.instance = instance
 		self.pk = pk
 		if instance is not None:
@@ -21,12 +24,14 @@ class ColumnSchema:
 
 
 class TableSchema:
+	__slots__ = ('name', 'column_schemes', 'instance', 'pk', 'db_pk', 'db_instance')
+
 	def __init__(
 		self, *, name, pk=None, column_schemes: Sequence[ColumnSchema] = None,
 		instance=None, db_pk=None, db_instance=None
 	):
 		self.name = name
-		self.column_schemes = list(column_schemes)
+		self.column_schemes = list(column_schemes or [])
 		self.instance = instance
 		self.pk = pk
 		self.db_pk = db_pk
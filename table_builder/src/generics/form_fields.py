@@ -0,0 +1,33 @@
+from django import forms
+from django.core.exceptions import ValidationError
+
+from table_builder.src.entity.constants import Message
+from table_builder.src.entity.schema import TableSchema
+from table_builder.src.services.schema_codec import SchemaDecodeError, TableSchemaCodec
+
+
+class TableSchemaField(forms.Field):
+	"""Схема таблицы в скрытом поле формы, сериализованная TableSchemaCodec"""
+	widget = forms.HiddenInput
+	codec = TableSchemaCodec
+	default_error_messages = {
+		'invalid': Message.INVALID_SCHEMA.value,
+	}
+
+	def prepare_value(self, value):
+		if isinstance(value, TableSchema):
+			return self.codec.dumps(value)
+		return value
+
+	def to_python(self, value):
+		if value in self.empty_values:
+			return None
+		if isinstance(value, TableSchema):
+			return value
+		try:
+			return self.codec.loads(value)
+		except SchemaDecodeError:
+			raise ValidationError(self.error_messages['invalid'], code='invalid')
+
+	def has_changed(self, initial, data):
+		return (self.prepare_value(initial) or '') != (self.prepare_value(data) or '')
@@ -0,0 +1,56 @@
+import csv
+import io
+
+from rest_framework.renderers import BaseRenderer
+
+from table_builder.src.services.columnar import ArrowIPCSerializer, ColumnarResult, ParquetSerializer
+
+
+class ColumnarRenderer(BaseRenderer):
+	"""
+	Рендерер колоночных форматов. Принимает ColumnarResult и строит пакеты прямо из кортежей строк.
+	Подклассы должны предоставить атрибуты media_type, format и serializer_class
+	"""
+	columnar = True
+	charset = None
+	render_style = 'binary'
+	serializer_class = None
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if not isinstance(data, ColumnarResult):
+			raise TypeError('Колоночный рендерер принимает только ColumnarResult')
+		return self.serializer_class().to_bytes(data)
+
+
+class ArrowIPCRenderer(ColumnarRenderer):
+	media_type = ArrowIPCSerializer.content_type
+	format = 'arrow'
+	serializer_class = ArrowIPCSerializer
+
+
+class ParquetRenderer(ColumnarRenderer):
+	media_type = ParquetSerializer.content_type
+	format = 'parquet'
+	serializer_class = ParquetSerializer
+
+
+class TupleCSVRenderer(BaseRenderer):
+	"""
+	CSV из кортежей строк через csv.writer, без построчных словарей.
+	Заголовок берётся из имён столбцов результата, то есть из псевдонимов SELECT
+	"""
+	media_type = 'text/csv'
+	format = 'csv'
+	charset = 'utf-8'
+	columnar = True
+	chunk_size = 10000
+
+	def render(self, data, accepted_media_type=None, renderer_context=None):
+		if not isinstance(data, ColumnarResult):
+			raise TypeError('CSV-рендерер принимает только ColumnarResult')
+		buffer = io.StringIO()
+		writer = csv.writer(buffer)
+		writer.writerow([name for name, _ in data.output_columns])
+		for i in range(0, len(data.rows), self.chunk_size):
+			writer.writerows(data.rows[i:i + self.chunk_size])
+		return buffer.getvalue().encode(self.charset)
@@ -1,9 +1,16 @@
 from typing import Generator
 
 from table_builder import forms, models
-from table_builder.models import Table
+from table_builder.models import Table, ColumnLoader
 from table_builder.src.entity.constants import ColumnType
 from table_builder.src.entity.schema import TableSchema
+from table_builder.src.services.column_params import (
+	ColumnChangeDetector,
+	ColumnFormPlaceholder,
+	get_cleaned_defaults,
+	get_form_defaults,
+	get_instance_data,
+)
 from table_builder.src.services.to_schema_converters import DjangoModelAutoFillTemplateSchemaConverter
 
 
@@ -51,27 +58,48 @@ class FieldFormsWithInstanceBuilder(SQLFieldsMatch, SQLFormBuilder):
 	"""Стратегия для составления формы, где требуется наличие instance столбца"""
 
 	def get_form(self, **kwargs) -> Generator:
+		for column_schema, instance in self._get_column_instances():
+			form = self.match[column_schema.data_type]
+			yield form(instance=instance, prefix=instance.name, **kwargs)
+
+	def _get_column_instances(self) -> Generator:
 		if self.table_schema.instance is not None:
 			for column_schema in self.table_schema:
 				instance = column_schema.instance
 				if instance is None:
 					raise ValueError('Схема реализована не корректно')
-				form = self.match[column_schema.data_type]
-				yield form(instance=instance, prefix=instance.name, **kwargs)
+				yield column_schema, instance
 
 		elif self.table_schema.pk is not None:
 			instances = self._get_instances()
 			for column_schema in self.table_schema:
-				form = self.match[column_schema.data_type]
-				instance = next(instances)
-				yield form(instance=instance, prefix=instance.name, **kwargs)
+				yield column_schema, next(instances)
 
 		else:
 			raise ValueError('Невозможно получить instance')
 
 	def _get_instances(self) -> Generator:
-		table_instance = Table.objects.get(pk=self.table_schema.pk)
-		return table_instance.get_columns()
+		return iter(ColumnLoader().load(Table, self.table_schema.pk))
+
+
+class PartialFieldFormsWithInstanceBuilder(FieldFormsWithInstanceBuilder):
+	"""
+	Стратегия для сохранения изменений: форма создаётся только для столбцов, параметры которых
+	отличаются от сохранённых, остальные столбцы получают ColumnFormPlaceholder с исходным instance
+	"""
+
+	def get_form(self, **kwargs) -> Generator:
+		data = kwargs.get('data')
+		if data is None:
+			yield from super().get_form(**kwargs)
+			return
+		detector = ColumnChangeDetector(data)
+		for column_schema, instance in self._get_column_instances():
+			form = self.match[column_schema.data_type]
+			if detector.is_changed(form, instance.name, get_instance_data(form, instance)):
+				yield form(instance=instance, prefix=instance.name, **kwargs)
+			else:
+				yield ColumnFormPlaceholder(instance, instance.name)
 
 
 class FieldFormsWithoutInstanceBuilder(SQLFieldsMatch, SQLFormBuilder):
@@ -97,6 +125,30 @@ class FieldFormsWithoutInstanceBuilder(SQLFieldsMatch, SQLFormBuilder):
 			counter += 1
 
 
+class PartialFieldFormsWithoutInstanceBuilder(FieldFormsWithoutInstanceBuilder):
+	"""
+	Стратегия для запросов данных: форма создаётся только для столбцов, параметры которых отличаются
+	от значений по умолчанию. Остальные столбцы получают ColumnFormPlaceholder с новым instance
+	со значениями по умолчанию, поэтому проверка занимает время, пропорциональное числу изменённых столбцов
+	"""
+
+	def get_form(self, **kwargs) -> Generator:
+		data = kwargs.get('data')
+		if data is None:
+			yield from super().get_form(**kwargs)
+			return
+		detector = ColumnChangeDetector(data)
+		for position, column_schema in enumerate(self.table_schema, start=1):
+			form = self.match[column_schema.data_type]
+			name = column_schema.name
+			initial = {**get_form_defaults(form), 'name': name, 'position': str(position)}
+			if detector.is_changed(form, name, initial):
+				yield form(**{**kwargs, 'initial': {'name': name, 'position': position}, 'prefix': name})
+			else:
+				instance = form._meta.model(name=name, position=position, **get_cleaned_defaults(form))
+				yield ColumnFormPlaceholder(instance, name)
+
+
 class FieldFormsWithFillTemplateBuilder(SQLFieldsMatch, SQLFormBuilder):
 	"""Стратегия подменяет базовую схему столбца аналогичной схемой из набора правил, если он существует"""
 
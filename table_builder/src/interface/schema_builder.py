@@ -1,8 +1,22 @@
+from django.http import Http404
+
+from table_builder import models
 from table_builder.forms import TableSchemaForm
+from table_builder.src.entity.constants import Message
 from table_builder.src.entity.db_broker import DBBroker
+from table_builder.src.entity.schema import TableSchema
+from table_builder.src.services.schema_cache import schema_cache, dump_table_schema, load_table_schema
+from table_builder.src.services.schema_store import schema_store
 from table_builder.src.services.to_schema_converters import DjangoModelTableSchemaConverter, SQLAlchemyTableSchemaConverter
 
 
+class SchemaDatabaseError(Http404):
+	"""БД, указанная в схеме, не существует или не совпадает с БД из адреса запроса"""
+
+	def __init__(self, message=Message.SCHEMA_DATABASE_MISMATCH.value):
+		super().__init__(message)
+
+
 class SchemaBuilder:
 	def __init__(self, view):
 		self.view = view
@@ -30,21 +44,44 @@ class TableModelSchemaBuilder(SchemaBuilder):
 
 class POSTRequestTableSchemaBuilder(SchemaBuilder):
 	"""
-	Стратегия предоставления схемы из данных POST запроса
+	Стратегия предоставления схемы из данных POST запроса.
+	Вместо полной схемы клиент может передать ключ schema_key, полученный ранее из SchemaStore
 	"""
 	form = TableSchemaForm
+	store = schema_store
+	key_param = 'schema_key'
 
 	def get_schema(self):
+		key = self.get_key()
+		if key:
+			table_schema = self.store.get(key)
+			self.check_database(table_schema.db_pk)
+			return table_schema
 		form = self.form(self.view.request.POST)
 		form.is_valid()
 		return form.cleaned_data
 
+	def get_key(self):
+		return self.view.request.POST.get(self.key_param)
+
+	def is_database_view(self) -> bool:
+		"""Представление адресует БД, например DataRequestAPIView"""
+		return getattr(self.view, 'model', None) is models.Database
+
+	def check_database(self, db_pk):
+		"""db_pk схемы присылает клиент, поэтому представление с БД в адресе принимает только схемы этой БД"""
+		if self.is_database_view() and db_pk is not None and db_pk != self.view.get_object().pk:
+			raise SchemaDatabaseError()
+
 
 class SQLAlchemySchemaBuilder(SchemaBuilder):
 	"""
 	Стратегия предоставления схемы из отражения внешней таблицы.
-	ВНИМАНИЕ!!! Возвращает схемы всех таблиц базы данных
+	ВНИМАНИЕ!!! Возвращает схемы всех таблиц базы данных.
+	Результат отражения кэшируется, см. SchemaCache
 	"""
+	cache = schema_cache
+
 	def get_object(self):
 		if hasattr(self.view, 'object'):
 			return self.view.object
@@ -53,10 +90,103 @@ class SQLAlchemySchemaBuilder(SchemaBuilder):
 
 	def get_schema(self):
 		database = self.get_object()
-		connection_url = database.get_connection_url()
-		db_broker = DBBroker(connection_url)
-		raw_schema = db_broker.get_schema()
-		return (
-			SQLAlchemyTableSchemaConverter.convert(instance=instance, db_instance=database)
-			for instance in raw_schema
+		db_broker = DBBroker(database.get_connection_url())
+		tables = self.cache.get(
+			database.pk, 'tables',
+			loader=lambda: self.reflect_tables(db_broker, database),
+			fingerprint_loader=db_broker.get_catalog_fingerprint
 		)
+		return (load_table_schema(table, db_instance=database) for table in tables)
+
+	def reflect_tables(self, db_broker: DBBroker, database):
+		return [
+			dump_table_schema(SQLAlchemyTableSchemaConverter.convert(instance=instance, db_instance=database))
+			for instance in db_broker.get_schema()
+		]
+
+
+class SQLAlchemyTableNamesSchemaBuilder(SQLAlchemySchemaBuilder):
+	"""
+	Стратегия предоставления схем всех таблиц внешней БД без столбцов.
+	Читает только список имён таблиц, столбцы отражаются по требованию, см. LazySQLAlchemyTableSchemaBuilder
+	"""
+	def get_schema(self):
+		database = self.get_object()
+		db_broker = DBBroker(database.get_connection_url())
+		table_names = self.cache.get(
+			database.pk, 'table_names',
+			loader=db_broker.get_table_names,
+			fingerprint_loader=db_broker.get_catalog_fingerprint
+		)
+		return (TableSchema(name=name, db_instance=database) for name in table_names)
+
+
+class LazySQLAlchemyTableSchemaBuilder(POSTRequestTableSchemaBuilder):
+	"""
+	Стратегия предоставления схемы из данных POST запроса.
+	Если схема пришла без столбцов, отражает из внешней БД одну запрошенную таблицу
+	"""
+	cache = schema_cache
+
+	def get_schema(self):
+		table_schema = super().get_schema()
+		if table_schema.column_schemes:
+			return table_schema
+		if table_schema.db_instance is None:
+			table_schema.db_instance = self.get_database(table_schema.db_pk)
+		database = table_schema.db_instance
+		db_broker = DBBroker(database.get_connection_url())
+		table = self.cache.get(
+			database.pk, f'table:{table_schema.name}',
+			loader=lambda: self.reflect_table(db_broker, database, table_schema.name),
+			fingerprint_loader=lambda: db_broker.get_catalog_fingerprint(table_schema.name)
+		)
+		table_schema.column_schemes = load_table_schema(table).column_schemes
+		return table_schema
+
+	def get_database(self, db_pk):
+		if self.is_database_view():
+			self.check_database(db_pk)
+			return self.view.get_object()
+		database = models.Database.objects.filter(pk=db_pk).first() if db_pk is not None else None
+		if database is None:
+			raise SchemaDatabaseError()
+		return database
+
+	def reflect_table(self, db_broker: DBBroker, database, table_name: str):
+		instance = db_broker.get_table(table_name)
+		return dump_table_schema(SQLAlchemyTableSchemaConverter.convert(instance=instance, db_instance=database))
+
+
+class QuerySpecSchemaBuilder(LazySQLAlchemyTableSchemaBuilder):
+	"""
+	Стратегия предоставления схемы для JSON-спецификации запроса.
+	Имя таблицы берётся из поля table тела запроса, столбцы отражаются из внешней БД
+	и кэшируются так же, как в LazySQLAlchemyTableSchemaBuilder
+	"""
+	table_param = 'table'
+
+	def get_object(self):
+		return self.view.get_object()
+
+	def get_schema(self):
+		database = self.get_object()
+		db_broker = DBBroker(database.get_connection_url())
+		name = self.get_table_name()
+		table_names = self.cache.get(
+			database.pk, 'table_names',
+			loader=db_broker.get_table_names,
+			fingerprint_loader=db_broker.get_catalog_fingerprint
+		)
+		if name not in table_names:
+			raise Http404(Message.TABLE_NOT_FOUND.value)
+		table = self.cache.get(
+			database.pk, f'table:{name}',
+			loader=lambda: self.reflect_table(db_broker, database, name),
+			fingerprint_loader=lambda: db_broker.get_catalog_fingerprint(name)
+		)
+		return load_table_schema(table, db_instance=database)
+
+	def get_table_name(self):
+		data = self.view.request.data
+		return data.get(self.table_param) if isinstance(data, dict) else None
@@ -0,0 +1,126 @@
+from collections.abc import Mapping
+from functools import lru_cache
+
+from table_builder.src.entity.schema import TableSchema
+
+
+@lru_cache(maxsize=None)
+def get_form_defaults(form_class) -> dict:
+	"""Значения полей несвязанной формы столбца в том виде, в котором их отправил бы браузер"""
+	form = form_class()
+	defaults = {}
+	for name in form.fields:
+		value = form[name].value()
+		defaults[name] = '' if value is None else str(value)
+	return defaults
+
+
+class PartialColumnData(Mapping):
+	"""
+	Данные форм столбцов, в которых клиент передал только изменённые параметры.
+	Отсутствующий параметр заменяется значением по умолчанию формы типа столбца,
+	имя и позиция столбца берутся из схемы. Флажки при этом нужно передавать явно, например show=false
+	"""
+
+	def __init__(self, table_schema: TableSchema, data, match: dict):
+		self.data = data
+		self.columns = {}
+		for position, column_schema in enumerate(table_schema, start=1):
+			self.columns[column_schema.name] = (
+				get_form_defaults(match[column_schema.data_type]),
+				{'name': column_schema.name, 'position': str(position)}
+			)
+
+	def __getitem__(self, key):
+		if key in self.data:
+			return self.data[key]
+		prefix, _, field = key.rpartition('-')
+		try:
+			defaults, column = self.columns[prefix]
+			return column[field] if field in column else defaults[field]
+		except KeyError:
+			raise KeyError(key)
+
+	def __iter__(self):
+		yield from self.data
+		for prefix, (defaults, column) in self.columns.items():
+			for field in {**defaults, **column}:
+				key = f'{prefix}-{field}'
+				if key not in self.data:
+					yield key
+
+	def __len__(self):
+		return sum(1 for _ in self)
+
+	def getlist(self, key):
+		if key in self.data and hasattr(self.data, 'getlist'):
+			return self.data.getlist(key)
+		return [self[key]]
+
+
+@lru_cache(maxsize=None)
+def get_cleaned_defaults(form_class) -> dict:
+	"""Значения по умолчанию после проверки формой, без имени и позиции столбца"""
+	form = form_class(data=get_form_defaults(form_class))
+	form.is_valid()
+	return {name: value for name, value in form.cleaned_data.items() if name not in ('name', 'position')}
+
+
+def get_instance_data(form_class, instance) -> dict:
+	"""Сохранённые значения столбца в том виде, в котором их отправил бы браузер"""
+	data = {}
+	for name in form_class.base_fields:
+		value = getattr(instance, name, None)
+		data[name] = '' if value is None else str(value)
+	return data
+
+
+class ColumnFormPlaceholder:
+	"""
+	Заменяет форму столбца, параметры которого не изменены: проверка не выполняется,
+	а instance содержит значения по умолчанию или сохранённые значения столбца
+	"""
+
+	def __init__(self, instance, prefix: str):
+		self.instance = instance
+		self.prefix = prefix
+
+	@property
+	def errors(self) -> dict:
+		return {}
+
+	@property
+	def changed_data(self) -> list:
+		return []
+
+	def is_valid(self) -> bool:
+		return True
+
+	def save(self, commit=True):
+		if commit:
+			self.instance.save()
+		return self.instance
+
+
+class ColumnChangeDetector:
+	"""
+	Определяет без создания формы, отличаются ли переданные параметры столбца от исходных.
+	Значения сравниваются после разбора виджетами полей формы, как их увидела бы сама форма.
+	Для PartialColumnData столбцы, о которых клиент ничего не передал, отсеиваются сразу
+	"""
+
+	def __init__(self, data):
+		self.data = data
+		self.sent_prefixes = None
+		if isinstance(data, PartialColumnData):
+			self.sent_prefixes = {key.rpartition('-')[0] for key in data.data}
+
+	def is_changed(self, form_class, prefix: str, initial: dict) -> bool:
+		if self.sent_prefixes is not None and prefix not in self.sent_prefixes:
+			return False
+		for name, field in form_class.base_fields.items():
+			widget = field.widget
+			value = widget.value_from_datadict(self.data, None, f'{prefix}-{name}')
+			if value != widget.value_from_datadict(initial, None, name):
+				return True
+		return False
@@ -0,0 +1,145 @@
+import io
+from typing import Iterable, Sequence
+
+from django.core.exceptions import ImproperlyConfigured
+
+from table_builder.src.entity.constants import ColumnType
+
+
+def import_pyarrow():
+	try:
+		import pyarrow
+		import pyarrow.ipc
+		import pyarrow.parquet
+	except ImportError:
+		raise ImproperlyConfigured('Для форматов Arrow и Parquet требуется пакет pyarrow: poetry install -E columnar')
+	return pyarrow
+
+
+class ChunkSink(io.RawIOBase):
+	"""
+	Приёмник записанных байт, который можно опустошать между пакетами.
+	В отличие от BytesIO с усечением, tell возвращает общее число записанных байт:
+	по нему Parquet вычисляет смещения в метаданных файла
+	"""
+
+	def __init__(self):
+		super().__init__()
+		self.chunks = []
+		self.position = 0
+
+	def writable(self):
+		return True
+
+	def write(self, data):
+		self.chunks.append(bytes(data))
+		self.position += len(data)
+		return len(data)
+
+	def tell(self):
+		return self.position
+
+	def pop(self) -> bytes:
+		value = b''.join(self.chunks)
+		self.chunks = []
+		return value
+
+
+class ColumnarResult:
+	"""
+	Результат запроса для рендереров, работающих без построчных словарей: кортежи строк
+	и пары (имя столбца результата, ColumnType) из SQLQueryBuilder.get_output_columns
+	"""
+
+	def __init__(self, output_columns: Sequence[tuple], rows: Sequence[tuple]):
+		self.output_columns = list(output_columns)
+		self.rows = rows
+
+
+class ArrowBatchBuilder:
+	"""
+	Собирает RecordBatch из кортежей строк по схеме, построенной по ColumnType столбцов.
+	Лишние служебные столбцы в конце строки (например, столбцы курсора) отбрасываются
+	"""
+	batch_size = 65536
+
+	def __init__(self, output_columns: Sequence[tuple]):
+		self.pa = import_pyarrow()
+		self.types_matching = {
+			ColumnType.INTEGER.value: self.pa.int64(),
+			ColumnType.FLOAT.value: self.pa.float64(),
+			ColumnType.CHAR.value: self.pa.string(),
+			ColumnType.DATE.value: self.pa.date32(),
+			ColumnType.DATETIME.value: self.pa.timestamp('us'),
+			ColumnType.DURATION.value: self.pa.duration('us'),
+		}
+		self.schema = self.pa.schema([
+			(name, self.types_matching.get(data_type, self.pa.string())) for name, data_type in output_columns
+		])
+
+	def build_array(self, values: Sequence, data_type):
+		try:
+			return self.pa.array(values, type=data_type)
+		except (self.pa.ArrowInvalid, self.pa.ArrowTypeError):
+			# numeric PostgreSQL приходит как Decimal, который pyarrow не приводит к double напрямую
+			return self.pa.array(values).cast(data_type, safe=False)
+
+	def build(self, rows: Sequence[tuple]):
+		width = len(self.schema)
+		columns = list(zip(*rows)) if rows else [()] * width
+		return self.pa.RecordBatch.from_arrays(
+			[self.build_array(values, field.type) for values, field in zip(columns[:width], self.schema)],
+			schema=self.schema
+		)
+
+	def iter_batches(self, partitions: Iterable[Sequence[tuple]]):
+		for partition in partitions:
+			if partition:
+				yield self.build(partition)
+
+	def split(self, rows: Sequence[tuple]) -> Iterable[Sequence[tuple]]:
+		return (rows[i:i + self.batch_size] for i in range(0, len(rows), self.batch_size))
+
+
+class ColumnarSerializer:
+	"""
+	Базовый класс записи RecordBatch в байтовый поток.
+	Подклассы должны предоставить атрибуты content_type, extension и реализовать метод open_writer
+	"""
+	content_type = None
+	extension = None
+
+	def open_writer(self, sink, batch_builder: ArrowBatchBuilder):
+		raise NotImplementedError()
+
+	def serialize(self, batch_builder: ArrowBatchBuilder, batches: Iterable) -> Iterable[bytes]:
+		"""Отдаёт байты по мере записи каждого пакета, не накапливая весь результат"""
+		sink = ChunkSink()
+		writer = self.open_writer(sink, batch_builder)
+		for batch in batches:
+			writer.write_batch(batch)
+			yield sink.pop()
+		writer.close()
+		yield sink.pop()
+
+	def to_bytes(self, result: ColumnarResult) -> bytes:
+		batch_builder = ArrowBatchBuilder(result.output_columns)
+		batches = batch_builder.iter_batches(batch_builder.split(result.rows))
+		return b''.join(self.serialize(batch_builder, batches))
+
+
+class ArrowIPCSerializer(ColumnarSerializer):
+	content_type = 'application/vnd.apache.arrow.stream'
+	extension = 'arrow'
+
+	def open_writer(self, sink, batch_builder):
+		return batch_builder.pa.ipc.new_stream(sink, batch_builder.schema)
+
+
+class ParquetSerializer(ColumnarSerializer):
+	content_type = 'application/vnd.apache.parquet'
+	extension = 'parquet'
+	compression = 'snappy'
+
+	def open_writer(self, sink, batch_builder):
+		return batch_builder.pa.parquet.ParquetWriter(sink, batch_builder.schema, compression=self.compression)
@@ -0,0 +1,51 @@
+from table_builder.src.entity.constants import Message, PlanGuardMode
+from table_builder.src.entity.db_broker import DBBroker, QueryLimitError, QueryLimits, QueryPlan
+
+
+class QueryCostError(QueryLimitError):
+	"""Запрос отклонён по оценке плана"""
+
+
+class QueryCostGuard:
+	"""
+	Проверяет оценку плана запроса по порогам БД до его выполнения.
+	В режиме warn нарушения возвращаются как предупреждения, в режиме reject запрос отклоняется
+	"""
+
+	def __init__(self, mode: str = PlanGuardMode.OFF, max_cost: float = None, max_rows: int = None):
+		self.mode = mode
+		self.max_cost = max_cost
+		self.max_rows = max_rows
+
+	@classmethod
+	def from_database(cls, database):
+		return cls(database.plan_guard_mode, database.max_plan_cost, database.max_plan_rows)
+
+	@property
+	def enabled(self) -> bool:
+		return self.mode != PlanGuardMode.OFF and (self.max_cost is not None or self.max_rows is not None)
+
+	def get_violations(self, plan: QueryPlan) -> list:
+		violations = []
+		if self.max_cost is not None and plan.total_cost is not None and plan.total_cost > self.max_cost:
+			violations.append(Message.PLAN_COST_EXCEEDED.value)
+		if self.max_rows is not None and plan.plan_rows is not None and plan.plan_rows > self.max_rows:
+			violations.append(Message.PLAN_ROWS_EXCEEDED.value)
+		return violations
+
+	def check(self, db_broker: DBBroker, query: str, params: dict, limits: QueryLimits = None) -> list:
+		"""
+		Возвращает список предупреждений или выбрасывает QueryCostError.
+		Для диалектов без поддержки EXPLAIN (FORMAT JSON) проверка пропускается,
+		limits задают таймаут выполнения EXPLAIN
+		"""
+		if not self.enabled:
+			return []
+		try:
+			plan = db_broker.explain(query, params, limits)
+		except NotImplementedError:
+			return []
+		violations = self.get_violations(plan)
+		if violations and self.mode == PlanGuardMode.REJECT:
+			raise QueryCostError('; '.join(violations))
+		return violations
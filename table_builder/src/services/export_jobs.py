@@ -0,0 +1,393 @@
+import csv
+import gzip
+import io
+import logging
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Sequence
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from table_builder.models import ExportJob
+from table_builder.src.entity.constants import ExportFormat, ExportStatus, Message
+from table_builder.src.entity.db_broker import DBBroker, QueryLimits
+from table_builder.src.services.columnar import ArrowBatchBuilder
+from table_builder.src.services.query_constructor import KeysetCursor
+
+logger = logging.getLogger(__name__)
+
+
+def get_export_options(**options) -> dict:
+	defaults = {
+		'root': os.path.join(settings.BASE_DIR, 'exports'),
+		'workers': 2,
+		'poll_interval': 2.0,
+		'chunk_size': 10000,
+		'stale_timeout': 600,
+		'requeue_interval': 60,
+	}
+	return {**defaults, **getattr(settings, 'TABLE_BUILDER_EXPORT', {}), **options}
+
+
+def dump_params(params: dict) -> dict:
+	"""
+	Параметры запроса для JSONField задания. Даты, время, длительности и Decimal сохраняются
+	с меткой типа, как значения KeysetCursor, иначе из JSON они вернутся строками
+	"""
+	return {name: KeysetCursor.encode_value(value) for name, value in params.items()}
+
+
+def load_params(params: dict) -> dict:
+	return {name: KeysetCursor.decode_value(value) for name, value in params.items()}
+
+
+class ExportFileWriter:
+	"""
+	Базовый класс записи результата выгрузки в файл по частям.
+	Подклассы должны реализовать методы write и close, tell возвращает текущий размер файла.
+	output_columns - пары (имя столбца, ColumnType), для столбцов неизвестного типа указывается None
+	"""
+
+	def __init__(self, path: str, keys: Sequence[str], output_columns: Sequence[tuple] = None):
+		self.path = path
+		self.keys = list(keys)
+		self.output_columns = list(output_columns) if output_columns is not None else [(key, None) for key in keys]
+
+	def write(self, partition: Sequence[tuple]):
+		raise NotImplementedError()
+
+	def tell(self) -> int:
+		return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+	def close(self):
+		raise NotImplementedError()
+
+
+class CSVGzipExportWriter(ExportFileWriter):
+	compress_level = 6
+
+	def __init__(self, path, keys, output_columns=None):
+		super().__init__(path, keys, output_columns)
+		self.raw = open(path, 'wb')
+		self.gzip = gzip.GzipFile(fileobj=self.raw, mode='wb', compresslevel=self.compress_level)
+		self.text = io.TextIOWrapper(self.gzip, encoding='utf-8', newline='')
+		self.writer = csv.writer(self.text)
+		self.writer.writerow(self.keys)
+
+	def write(self, partition):
+		self.writer.writerows(partition)
+		self.text.flush()
+
+	def tell(self):
+		return self.raw.tell()
+
+	def close(self):
+		self.text.close()
+		self.raw.close()
+
+
+class ParquetExportWriter(ExportFileWriter):
+	"""
+	Каждая часть результата записывается отдельной группой строк.
+	Схема строится по типам столбцов, как у потоковой выгрузки Parquet, а не по первой части:
+	в ней могут оказаться только NULL или значения другого типа
+	"""
+	compression = 'snappy'
+
+	def __init__(self, path, keys, output_columns=None):
+		super().__init__(path, keys, output_columns)
+		self.batch_builder = ArrowBatchBuilder(self.output_columns)
+		self.writer = self.batch_builder.pa.parquet.ParquetWriter(
+			path, self.batch_builder.schema, compression=self.compression
+		)
+
+	def write(self, partition):
+		if partition:
+			self.writer.write_batch(self.batch_builder.build(partition))
+
+	def close(self):
+		self.writer.close()
+
+
+class CopyExportWriter(ExportFileWriter):
+	"""Записывает в файл готовые байты вывода COPY"""
+
+	def __init__(self, path, keys=(), output_columns=None):
+		super().__init__(path, keys, output_columns)
+		self.file = open(path, 'wb')
+
+	def write(self, chunk: bytes):
+		self.file.write(chunk)
+
+	def tell(self):
+		return self.file.tell()
+
+	def close(self):
+		self.file.close()
+
+
+class ExportWriterFactory:
+	"""Фабрика записи выгрузок. Подбирает класс записи по формату задания"""
+	writers_matching = {
+		ExportFormat.CSV_GZ.value: CSVGzipExportWriter,
+		ExportFormat.PARQUET.value: ParquetExportWriter,
+	}
+
+	def get_writer(
+		self, output_format: str, path: str, keys: Sequence[str], output_columns: Sequence[tuple] = None
+	) -> ExportFileWriter:
+		try:
+			writer_class = self.writers_matching[output_format]
+		except KeyError:
+			raise NotImplementedError('Данный формат не поддерживается')
+		return writer_class(path, keys, output_columns)
+
+
+class ExportCanceled(Exception):
+	"""Задание отменено или передано другому обработчику во время выполнения"""
+
+
+class ExportQueue:
+	"""
+	Очередь заданий выгрузки поверх таблицы ExportJob.
+	Задание захватывается условным UPDATE по статусу, поэтому несколько обработчиков
+	не возьмут одно задание без блокировок на уровне БД
+	"""
+	claim_batch_size = 10
+
+	def __init__(self, worker_name: str):
+		self.worker_name = worker_name
+
+	def claim(self):
+		for pk in self.get_pending():
+			job = self.claim_job(pk)
+			if job is not None:
+				return job
+		return None
+
+	def get_pending(self) -> list:
+		pending = ExportJob.objects.filter(status=ExportStatus.PENDING).order_by('created_at')
+		return list(pending.values_list('pk', flat=True)[:self.claim_batch_size])
+
+	def claim_job(self, pk):
+		"""Задание достаётся только тому обработчику, чей UPDATE застал его в очереди"""
+		now = timezone.now()
+		claimed = ExportJob.objects.filter(pk=pk, status=ExportStatus.PENDING).update(
+			status=ExportStatus.RUNNING, worker=self.worker_name, started_at=now, heartbeat_at=now
+		)
+		if not claimed:
+			return None
+		return ExportJob.objects.select_related('database', 'table').get(pk=pk)
+
+	@staticmethod
+	def requeue_stale(stale_timeout: int) -> int:
+		"""Возвращает в очередь задания, обработчик которых перестал отмечаться"""
+		deadline = timezone.now() - timedelta(seconds=stale_timeout)
+		return ExportJob.objects.filter(status=ExportStatus.RUNNING, heartbeat_at__lt=deadline).update(
+			status=ExportStatus.PENDING, worker='', rows_written=0, bytes_written=0,
+			error=Message.EXPORT_WORKER_LOST.value
+		)
+
+
+class ExportJobRunner:
+	"""Выполняет задание: читает результат курсором на стороне сервера и пишет его в файл, отмечая прогресс"""
+	writer_factory = ExportWriterFactory()
+
+	def __init__(self, **options):
+		self.options = get_export_options(**options)
+
+	def get_path(self, job: ExportJob) -> str:
+		return os.path.join(self.options['root'], f'{job.pk}.{job.output_format}')
+
+	def report_progress(self, job: ExportJob, **fields):
+		updated = ExportJob.objects.filter(pk=job.pk, status=ExportStatus.RUNNING, worker=job.worker).update(
+			heartbeat_at=timezone.now(), **fields
+		)
+		if not updated:
+			raise ExportCanceled()
+
+	def run(self, job: ExportJob):
+		"""Файл пишется под временным именем и переименовывается только после успешной выгрузки"""
+		path = self.get_path(job)
+		part_path = f'{path}.{uuid.uuid4().hex}.part'
+		os.makedirs(self.options['root'], exist_ok=True)
+		try:
+			rows_written, bytes_written = self.export(job, part_path)
+			self.report_progress(job, rows_written=rows_written, bytes_written=bytes_written)
+		except ExportCanceled:
+			self.remove(part_path)
+			return
+		except Exception as e:
+			self.remove(part_path)
+			logger.exception('Export job %s failed', job.pk)
+			ExportJob.objects.filter(pk=job.pk, status=ExportStatus.RUNNING, worker=job.worker).update(
+				status=ExportStatus.FAILED, error=str(e), finished_at=timezone.now()
+			)
+			return
+		os.replace(part_path, path)
+		ExportJob.objects.filter(pk=job.pk, status=ExportStatus.RUNNING, worker=job.worker).update(
+			status=ExportStatus.DONE, file_path=path, error='', finished_at=timezone.now()
+		)
+
+	copy_formats_matching = {
+		ExportFormat.PGCOPY.value: 'binary',
+	}
+	copy_progress_bytes = 8 * 1024 * 1024
+
+	@staticmethod
+	def get_query_limits(job: ExportJob) -> QueryLimits:
+		"""Те же ограничения, что и у запроса из API: таблицы, затем БД, затем настроек проекта"""
+		limits = [QueryLimits.from_instance(job.database), QueryLimits.from_settings()]
+		if job.table is not None:
+			limits.insert(0, QueryLimits.from_instance(job.table))
+		return QueryLimits.merge(*limits)
+
+	def export(self, job: ExportJob, path: str) -> tuple:
+		db_broker = DBBroker(job.database.get_connection_url())
+		if job.output_format in self.copy_formats_matching:
+			return self.export_copy(db_broker, job, path)
+		stream = db_broker.stream_query(
+			job.query, load_params(job.params), chunk_size=self.options['chunk_size'], limits=self.get_query_limits(job)
+		)
+		rows_written = 0
+		try:
+			data_types = dict(job.output_columns)
+			writer = self.writer_factory.get_writer(
+				job.output_format, path, stream.keys, [(key, data_types.get(key)) for key in stream.keys]
+			)
+			try:
+				for partition in stream:
+					writer.write(partition)
+					rows_written += len(partition)
+					self.report_progress(job, rows_written=rows_written, bytes_written=writer.tell())
+			finally:
+				writer.close()
+		finally:
+			stream.close()
+		return rows_written, os.path.getsize(path)
+
+	def export_copy(self, db_broker: DBBroker, job: ExportJob, path: str) -> tuple:
+		"""Выгрузка через COPY ... TO STDOUT: число строк известно только по завершении"""
+		if not db_broker.supports_copy():
+			raise NotImplementedError('Данный диалект не поддерживает COPY')
+		stream = db_broker.copy_query(
+			job.query, load_params(job.params), copy_format=self.copy_formats_matching[job.output_format],
+			limits=self.get_query_limits(job)
+		)
+		writer = CopyExportWriter(path)
+		reported = 0
+		try:
+			for chunk in stream:
+				writer.write(chunk)
+				if writer.tell() - reported >= self.copy_progress_bytes:
+					reported = writer.tell()
+					self.report_progress(job, bytes_written=reported)
+		finally:
+			writer.close()
+			stream.close()
+		return stream.rowcount or 0, os.path.getsize(path)
+
+	@staticmethod
+	def remove(path: str):
+		if os.path.exists(path):
+			os.remove(path)
+
+
+class ExportWorkerPool:
+	"""
+	Пул потоков, забирающих задания из ExportQueue. Запускается командой run_export_workers
+	и не требует внешнего брокера сообщений. Задания обработчиков, переставших отмечаться,
+	возвращаются в очередь не реже раза в requeue_interval секунд
+	"""
+
+	def __init__(self, **options):
+		self.options = get_export_options(**options)
+		self.runner = ExportJobRunner(**self.options)
+		self.stop_event = threading.Event()
+		self.threads = []
+		self.requeue_lock = threading.Lock()
+		self.next_requeue_at = 0
+
+	def get_worker_name(self, index: int) -> str:
+		return f'{socket.gethostname()}:{os.getpid()}:{index}'
+
+	def requeue_stale(self):
+		with self.requeue_lock:
+			now = time.monotonic()
+			if now < self.next_requeue_at:
+				return
+			self.next_requeue_at = now + self.options['requeue_interval']
+		try:
+			ExportQueue.requeue_stale(self.options['stale_timeout'])
+		except Exception:
+			logger.exception('Export queue is unavailable')
+
+	def start(self):
+		self.requeue_stale()
+		for index in range(self.options['workers']):
+			thread = threading.Thread(target=self.work, args=(index,), daemon=True)
+			thread.start()
+			self.threads.append(thread)
+
+	def stop(self, timeout: float = None):
+		self.stop_event.set()
+		for thread in self.threads:
+			thread.join(timeout)
+
+	def work(self, index: int):
+		queue = ExportQueue(self.get_worker_name(index))
+		while not self.stop_event.is_set():
+			close_old_connections()
+			self.requeue_stale()
+			try:
+				job = queue.claim()
+			except Exception:
+				logger.exception('Export queue is unavailable')
+				job = None
+			if job is None:
+				self.stop_event.wait(self.options['poll_interval'])
+				continue
+			self.runner.run(job)
+		close_old_connections()
+
+
+def parse_byte_range(header: str, size: int):
+	"""
+	Разбирает заголовок Range с одним диапазоном байт. Возвращает (start, end) включительно
+	или None, если заголовок отсутствует или не поддерживается. ValueError - диапазон вне файла
+	"""
+	match = re.fullmatch(r'bytes=(\d*)-(\d*)', (header or '').strip())
+	if match is None or match.groups() == ('', ''):
+		return None
+	if size == 0:
+		raise ValueError()
+	start, end = match.groups()
+	if start == '':
+		length = int(end)
+		if length == 0:
+			raise ValueError()
+		return max(size - length, 0), size - 1
+	start = int(start)
+	end = min(int(end), size - 1) if end else size - 1
+	if start >= size or start > end:
+		raise ValueError()
+	return start, end
+
+
+def read_file_range(path: str, start: int, end: int, block_size: int = 64 * 1024):
+	with open(path, 'rb') as file:
+		file.seek(start)
+		remaining = end - start + 1
+		while remaining > 0:
+			block = file.read(min(block_size, remaining))
+			if not block:
+				break
+			remaining -= len(block)
+			yield block
@@ -0,0 +1,189 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger('table_builder.trace')
+
+
+class QueryTrace:
+	"""
+	Замеры одного запроса данных: длительность этапов (повторный этап суммируется),
+	число строк и байт результата и теги БД и таблицы
+	"""
+
+	def __init__(self, **tags):
+		self.tags = tags
+		self.spans = OrderedDict()
+		self.rows = None
+		self.bytes = None
+		self.started_at = time.perf_counter()
+
+	@contextmanager
+	def span(self, name: str):
+		started_at = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.add(name, time.perf_counter() - started_at)
+
+	def add(self, name: str, seconds: float):
+		self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+	def tag(self, **tags):
+		self.tags.update(tags)
+
+	@property
+	def total(self) -> float:
+		return time.perf_counter() - self.started_at
+
+	def as_dict(self) -> dict:
+		return {
+			'tags': self.tags,
+			'spans_ms': {name: round(seconds * 1000, 3) for name, seconds in self.spans.items()},
+			'total_ms': round(self.total * 1000, 3),
+			'rows': self.rows,
+			'bytes': self.bytes,
+		}
+
+
+class TracedStream:
+	"""
+	Содержимое потокового ответа, замеряющее отдачу частей (этап stream) и их объём.
+	Замеры передаются в emit после последней части или при закрытии ответа сервером,
+	в том числе если клиент отключился или поток прервался ошибкой
+	"""
+
+	def __init__(self, content, trace: QueryTrace, emit):
+		self.content = iter(content)
+		self.trace = trace
+		self.emit = emit
+		self.closed = False
+		trace.bytes = 0
+
+	def __iter__(self):
+		return self
+
+	def __next__(self):
+		started_at = time.perf_counter()
+		try:
+			chunk = next(self.content)
+		except StopIteration:
+			self.trace.add('stream', time.perf_counter() - started_at)
+			self.close()
+			raise
+		self.trace.add('stream', time.perf_counter() - started_at)
+		self.trace.bytes += len(chunk)
+		return chunk
+
+	def close(self):
+		if self.closed:
+			return
+		self.closed = True
+		self.emit(self.trace)
+
+
+class TraceHook:
+	"""Получатель замеров. Подклассы должны реализовать метод emit"""
+
+	def emit(self, trace: QueryTrace, response=None):
+		raise NotImplementedError()
+
+
+class LoggingTraceHook(TraceHook):
+	"""Пишет замеры одной строкой JSON в логгер table_builder.trace"""
+
+	def emit(self, trace, response=None):
+		data = trace.as_dict()
+		logger.info(json.dumps(data, default=str), extra={'trace': data})
+
+
+class ServerTimingTraceHook(TraceHook):
+	"""Выставляет заголовок Server-Timing, который показывают инструменты разработчика браузера"""
+
+	def emit(self, trace, response=None):
+		if response is None:
+			return
+		metrics = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in trace.spans.items()]
+		metrics.append(f'total;dur={trace.total * 1000:.1f}')
+		response['Server-Timing'] = ', '.join(metrics)
+
+
+class MetricsTraceHook(TraceHook):
+	"""
+	Счётчики процесса в стиле Prometheus с метками database и table.
+	Отдаются в текстовом формате экспозиции представлением MetricsView
+	"""
+	prefix = 'table_builder_query'
+	_counters = OrderedDict()
+	_lock = threading.Lock()
+
+	def emit(self, trace, response=None):
+		labels = (('database', str(trace.tags.get('database'))), ('table', str(trace.tags.get('table'))))
+		with self._lock:
+			self._inc('requests_total', labels, 1)
+			for name, seconds in trace.spans.items():
+				self._inc('stage_seconds_total', labels + (('stage', name),), seconds)
+			if trace.rows is not None:
+				self._inc('rows_total', labels, trace.rows)
+			if trace.bytes is not None:
+				self._inc('bytes_total', labels, trace.bytes)
+
+	@classmethod
+	def _inc(cls, metric: str, labels: tuple, value):
+		key = (f'{cls.prefix}_{metric}', labels)
+		cls._counters[key] = cls._counters.get(key, 0) + value
+
+	@classmethod
+	def render(cls) -> str:
+		lines = []
+		with cls._lock:
+			counters = sorted(cls._counters.items())
+		typed = set()
+		for (metric, labels), value in counters:
+			if metric not in typed:
+				lines.append(f'# TYPE {metric} counter')
+				typed.add(metric)
+			label_str = ','.join(f'{name}="{label}"' for name, label in labels)
+			lines.append(f'{metric}{{{label_str}}} {value}')
+		return '\n'.join(lines) + '\n'
+
+	@classmethod
+	def clear(cls):
+		with cls._lock:
+			cls._counters.clear()
+
+
+class TraceHookRegistry:
+	"""Получатели замеров из настройки TABLE_BUILDER_TRACE_HOOKS (пути к классам)"""
+	default_hooks = (
+		'table_builder.src.services.instrumentation.LoggingTraceHook',
+		'table_builder.src.services.instrumentation.ServerTimingTraceHook',
+		'table_builder.src.services.instrumentation.MetricsTraceHook',
+	)
+	_hooks = None
+	_paths = None
+
+	def __new__(cls, *args, **kwargs):
+		raise PermissionError('Запрещено создавать экземпляры данного класса')
+
+	@classmethod
+	def get_hooks(cls) -> list:
+		paths = tuple(getattr(settings, 'TABLE_BUILDER_TRACE_HOOKS', cls.default_hooks))
+		if cls._hooks is None or cls._paths != paths:
+			cls._hooks = [import_string(path)() for path in paths]
+			cls._paths = paths
+		return cls._hooks
+
+	@classmethod
+	def emit(cls, trace: QueryTrace, response=None):
+		for hook in cls.get_hooks():
+			try:
+				hook.emit(trace, response)
+			except Exception:
+				logger.exception('Trace hook %s failed', type(hook).__name__)
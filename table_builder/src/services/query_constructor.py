@@ -1,10 +1,23 @@
+import base64
+import datetime
+import decimal
+import json
+import threading
+import uuid
+
+from django.utils.dateparse import parse_date, parse_datetime, parse_duration, parse_time
+from django.utils.duration import duration_iso_string
+
 from table_builder.src.owns.constants import (
+	AggregateChoice,
+	Message,
 	OrderChoice,
 	StringWhereChoice,
 	NumberWhereChoice,
 	ColumnType
 )
 from table_builder.src.owns.schema import TableSchema, ColumnSchema
+from table_builder.src.services.schema_cache import LocalLRUCache
 
 
 class QueryParams:
@@ -25,7 +38,122 @@ class QueryParams:
 		return var
 
 
+class QueryTemplateCache:
+	"""
+	LRU-кэш скомпилированных текстов запросов по структурному отпечатку схемы.
+	Значения параметров в отпечаток не входят, поэтому при попадании заполняются только параметры
+	"""
+
+	def __init__(self, max_entries: int = 512):
+		self.templates = LocalLRUCache(max_entries)
+		self.hits = 0
+		self.misses = 0
+		self._lock = threading.Lock()
+
+	def get(self, fingerprint):
+		template = self.templates.get(fingerprint)
+		with self._lock:
+			if template is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+		return template
+
+	def set(self, fingerprint, template: str):
+		self.templates.set(fingerprint, template)
+
+	def clear(self):
+		self.templates.clear()
+		with self._lock:
+			self.hits = 0
+			self.misses = 0
+
+	def get_stats(self) -> dict:
+		with self._lock:
+			return {
+				'hits': self.hits,
+				'misses': self.misses,
+				'size': len(self.templates),
+				'max_entries': self.templates.max_entries,
+			}
+
+
+query_template_cache = QueryTemplateCache()
+
+
+class PaginationKeyError(ValueError):
+	"""Для постраничной выборки не найден уникальный ключ строк"""
+
+	def __init__(self, message=Message.PAGINATION_KEY_REQUIRED.value):
+		super().__init__(message)
+
+
+class KeysetCursor:
+	"""
+	Непрозрачный курсор постраничной выборки: имена ключевых столбцов и значения последней строки.
+	Значения, которых нет в JSON, сохраняются с меткой типа и без потери точности:
+	даты и время с микросекундами, Decimal - строкой
+	"""
+	# datetime проверяется раньше date, так как является его подклассом
+	value_types = (
+		('datetime', datetime.datetime, datetime.datetime.isoformat, parse_datetime),
+		('date', datetime.date, datetime.date.isoformat, parse_date),
+		('time', datetime.time, datetime.time.isoformat, parse_time),
+		('duration', datetime.timedelta, duration_iso_string, parse_duration),
+		('decimal', decimal.Decimal, str, decimal.Decimal),
+		('uuid', uuid.UUID, str, uuid.UUID),
+	)
+
+	@classmethod
+	def encode_value(cls, value):
+		for tag, value_type, dump, _ in cls.value_types:
+			if isinstance(value, value_type):
+				return {'t': tag, 'v': dump(value)}
+		return value
+
+	@classmethod
+	def decode_value(cls, value):
+		if not isinstance(value, dict):
+			return value
+		for tag, _, _, load in cls.value_types:
+			if tag == value['t']:
+				result = load(value['v'])
+				if result is None:
+					raise ValueError()
+				return result
+		raise ValueError()
+
+	@classmethod
+	def encode(cls, names, values) -> str:
+		payload = json.dumps({'k': list(names), 'v': [cls.encode_value(value) for value in values]})
+		return base64.urlsafe_b64encode(payload.encode()).decode()
+
+	@classmethod
+	def decode(cls, token: str, names) -> list:
+		try:
+			payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+			values = payload['v']
+			if payload['k'] != list(names) or len(values) != len(names):
+				raise ValueError()
+			return [cls.decode_value(value) for value in values]
+		except (ValueError, TypeError, KeyError, decimal.InvalidOperation):
+			raise ValueError('Некорректный курсор')
+
+
 class SQLQueryBuilder:
+	CURSOR_ALIAS_PREFIX = '__cursor_'
+	template_cache = query_template_cache
+	aggregate_types_matching = {
+		AggregateChoice.COUNT.value: ColumnType.INTEGER.value,
+		AggregateChoice.COUNT_DISTINCT.value: ColumnType.INTEGER.value,
+		AggregateChoice.AVG.value: ColumnType.FLOAT.value,
+	}
+	# при постраничной выборке NULL явно считается наибольшим значением, как по умолчанию в PostgreSQL
+	nulls_order_matching = {
+		OrderChoice.ASC.value: 'NULLS LAST',
+		OrderChoice.DESC.value: 'NULLS FIRST',
+	}
+
 	def __init__(self, table_schema: TableSchema):
 		self.table_schema = table_schema
 
@@ -38,115 +166,470 @@ class SQLQueryBuilder:
 		self._table_schema = value
 		self.query_param = QueryParams()
 		self.query = None
+		self.page_size = None
+		self.cursor = None
+		self.key_columns = []
+
+	def paginate(self, page_size: int, cursor: str = None, key_columns=()):
+		"""
+		Включает постраничную выборку по ключу (keyset).
+		Ключом служат столбцы сортировки, дополненные key_columns (как правило, первичным ключом).
+		При группировке вместо key_columns используются столбцы группировки.
+		Без уникального ключа строки с одинаковыми значениями сортировки терялись бы на границе страниц,
+		поэтому в этом случае выбрасывается PaginationKeyError
+		"""
+		self.page_size = page_size
+		self.key_columns = list(key_columns)
+		self.query = None
+		if self.is_grouped():
+			if not self.get_keyset_columns():
+				raise PaginationKeyError()
+		elif not self.key_columns:
+			raise PaginationKeyError()
+		self.cursor = cursor
+
+	@property
+	def cursor_aliases(self):
+		return [f'{self.CURSOR_ALIAS_PREFIX}{i}' for i in range(len(self.get_keyset_columns()))]
 
 	def build_sql_query(self):
 		if not self.query:
-			select_section = self.build_select_section()
-			from_section = self.build_from_section()
-			where_section = self.build_where_section()
-			order_section = self.build_order_section()
-			self.query = ' '.join(filter(bool, [select_section, from_section, where_section, order_section]))
+			if self.template_cache is None:
+				self.query = self.compile_query()
+			else:
+				fingerprint = self.get_fingerprint()
+				template = self.template_cache.get(fingerprint)
+				if template is None:
+					self.query = self.compile_query()
+					self.template_cache.set(fingerprint, self.query)
+				else:
+					self.fill_params()
+					self.query = template
 		return self.query, self.query_param.params
 
+	def compile_query(self):
+		select_section = self.build_select_section()
+		from_section = self.build_from_section()
+		where_section = self.build_where_section()
+		group_section = self.build_group_section()
+		having_section = self.build_having_section()
+		order_section = self.build_order_section()
+		limit_section = self.build_limit_section()
+		return ' '.join(filter(bool, [
+			select_section, from_section, where_section, group_section, having_section, order_section, limit_section
+		]))
+
+	def is_aggregated(self, column: ColumnSchema) -> bool:
+		return bool(column.instance.aggregate_function)
+
+	def is_grouped(self) -> bool:
+		return any(column.instance.group_by or self.is_aggregated(column) for column in self.table_schema)
+
+	def get_column_expression(self, column: ColumnSchema) -> str:
+		if not self.is_aggregated(column):
+			return column.name
+		function = column.instance.aggregate_function
+		if function == AggregateChoice.COUNT_DISTINCT.value:
+			return f'COUNT(DISTINCT {column.name})'
+		return f'{function}({column.name})'
+
+	def get_output_name(self, column: ColumnSchema) -> str:
+		return column.instance.alias or column.name
+
+	def get_output_type(self, column: ColumnSchema) -> str:
+		if not self.is_aggregated(column):
+			return column.data_type
+		function = column.instance.aggregate_function
+		# среднее длительностей остаётся длительностью
+		if function == AggregateChoice.AVG.value and column.data_type == ColumnType.DURATION.value:
+			return column.data_type
+		return self.aggregate_types_matching.get(function, column.data_type)
+
+	def get_output_columns(self) -> list:
+		"""Имена и типы столбцов результата в порядке SELECT, без служебных столбцов курсора"""
+		return [
+			(self.get_output_name(column), self.get_output_type(column))
+			for column in self.table_schema
+			if column.instance.show
+		]
+
+	def get_fingerprint(self):
+		"""
+		Структурный отпечаток запроса: всё, от чего зависит текст запроса, но не значения параметров.
+		Строится из атрибутов столбцов без построителей условий, чтобы попадание в кэш было дешевле компиляции.
+		Размер страницы - параметр запроса, в отпечаток входит только признак постраничной выборки
+		"""
+		columns = tuple(self.get_column_shape(column) for column in self.table_schema)
+		return (
+			getattr(self.table_schema.db_instance, 'dialect', None),
+			self.table_schema.name,
+			columns,
+			bool(self.page_size),
+			self.get_cursor_shape(),
+			tuple(self.key_columns),
+		)
+
+	@staticmethod
+	def get_column_shape(column: ColumnSchema) -> tuple:
+		"""Параметры столбца, от которых зависит текст запроса. Тип построителя условия задают data_type и агрегат"""
+		instance = column.instance
+		return (
+			column.name,
+			column.data_type,
+			instance.show,
+			instance.alias,
+			instance.order_predicate,
+			instance.order_priority,
+			instance.group_by,
+			instance.aggregate_function,
+			getattr(instance, 'where_predicate', ''),
+			bool(getattr(instance, 'where_not', False)),
+			bool(getattr(instance, 'where_from_value', None)),
+			bool(getattr(instance, 'where_to_value', None)),
+		)
+
+	def get_cursor_shape(self):
+		"""От того, какие значения курсора равны NULL, зависит текст условия курсора"""
+		if not (self.page_size and self.cursor):
+			return None
+		return tuple(value is None for value in self.get_cursor_values())
+
+	def fill_params(self):
+		"""
+		Заполняет параметры в том же порядке, в котором их добавляет compile_query:
+		условия WHERE, HAVING, значения курсора и размер страницы. Построители условий создаются за один проход
+		"""
+		where_values = []
+		having_values = []
+		for column in self.table_schema:
+			values = having_values if self.is_aggregated(column) else where_values
+			values.extend(self.get_condition_builder(column).get_values())
+		if self.page_size and self.cursor:
+			keyset_values = [value for value in self.get_cursor_values() if value is not None]
+			(having_values if self.is_grouped() else where_values).extend(keyset_values)
+		for value in where_values + having_values:
+			self.query_param.add_param(value)
+		if self.page_size:
+			self.query_param.add_param(self.page_size + 1)
+
 	def build_select_section(self):
 		columns = []
 		for column in self.table_schema:
 			if column.instance.show:
-				s = column.name
+				s = self.get_column_expression(column)
 				if column.instance.alias:
 					s += f' as "{column.instance.alias}"'
+				elif self.is_aggregated(column):
+					s += f' as "{column.name}"'
 				columns.append(s)
+		if self.page_size:
+			for (name, _), alias in zip(self.get_keyset_columns(), self.cursor_aliases):
+				columns.append(f'{name} as "{alias}"')
 		return f'SELECT {", ".join(columns)}'
 
 	def build_from_section(self):
 		return f'FROM {self.table_schema.name}'
 
 	def build_where_section(self):
-		where_condition_builder_matching = {
-			ColumnType.INTEGER.value: NumberWhereConditionBuilder,
-			ColumnType.FLOAT.value: NumberWhereConditionBuilder,
-			ColumnType.CHAR.value: StringWhereConditionBuilder,
-			ColumnType.DATE.value: DateWhereConditionBuilder,
-			ColumnType.DATETIME.value: DateWhereConditionBuilder,
-			ColumnType.DURATION.value: DateWhereConditionBuilder
-		}
+		conditions = self.build_where_conditions()
+		if self.page_size and self.cursor and not self.is_grouped():
+			conditions.append(self.build_keyset_condition())
+		return f'WHERE {" AND ".join(conditions)}' if conditions else ''
+
+	def build_group_section(self):
+		columns = [column.name for column in self.table_schema if column.instance.group_by]
+		return f'GROUP BY {", ".join(columns)}' if columns else ''
+
+	def build_having_section(self):
+		"""Условия по агрегированным столбцам, а при группировке и условие курсора, попадают в HAVING"""
+		conditions = self.build_where_conditions(aggregated=True)
+		if self.page_size and self.cursor and self.is_grouped():
+			conditions.append(self.build_keyset_condition())
+		return f'HAVING {" AND ".join(conditions)}' if conditions else ''
+
+	def get_condition_builder(self, column: ColumnSchema):
+		"""Построитель условия выбирается по типу значения: для агрегатов - по типу результата функции"""
+		return where_condition_builder_matching[self.get_output_type(column)](self, column)
+
+	def get_condition_builders(self, aggregated: bool = False):
+		return [
+			self.get_condition_builder(column)
+			for column in self.table_schema
+			if self.is_aggregated(column) == aggregated
+		]
+
+	def build_where_conditions(self, aggregated: bool = False):
 		conditions = []
-		for column in self.table_schema:
-			column_type = column.data_type
-			condition = where_condition_builder_matching[column_type](self, column).build_condition()
+		for condition_builder in self.get_condition_builders(aggregated):
+			condition = condition_builder.build_condition()
 			if condition:
 				conditions.append(condition)
-		return f'WHERE {" AND ".join(conditions)}' if conditions else ''
+		return conditions
 
-	def build_order_section(self):
+	def get_cursor_values(self):
+		names = [name for name, _ in self.get_keyset_columns()]
+		return KeysetCursor.decode(self.cursor, names)
+
+	def build_keyset_condition(self):
+		"""
+		Условие "строка после курсора" для порядка из build_order_section, где NULL больше любого значения.
+		Для значений курсора, равных NULL, параметры не создаются, сравнение заменяется на IS NULL
+		"""
+		keyset_columns = self.get_keyset_columns()
+		variables = [
+			None if value is None else self.query_param.add_param(value)
+			for value in self.get_cursor_values()
+		]
+		alternatives = []
+		for i, (name, predicate) in enumerate(keyset_columns):
+			after = self.build_after_term(name, predicate, variables[i])
+			if after is None:
+				continue
+			terms = [self.build_equal_term(keyset_columns[j][0], variables[j]) for j in range(i)]
+			terms.append(after)
+			alternatives.append(f'({" AND ".join(terms)})')
+		if not alternatives:
+			return '1 = 0'
+		return f'({" OR ".join(alternatives)})'
+
+	def build_equal_term(self, name: str, variable) -> str:
+		if variable is None:
+			return f'{name} IS NULL'
+		return f'{name} = :{variable}'
+
+	def build_after_term(self, name: str, predicate: str, variable):
+		if predicate == OrderChoice.DESC.value:
+			if variable is None:
+				return f'{name} IS NOT NULL'
+			return f'{name} < :{variable}'
+		if variable is None:
+			return None
+		return f'({name} > :{variable} OR {name} IS NULL)'
+
+	def get_order_columns(self):
 		columns = [
 			column
 			for column in self.table_schema
 			if column.instance.order_predicate != OrderChoice.NOT.value
 		]
 		columns.sort(key=lambda x: x.instance.order_priority, reverse=True)
-		columns = [
-			f'{column.name} {column.instance.order_predicate}'
-			for column in columns
-		]
+		return [(self.get_column_expression(column), column.instance.order_predicate) for column in columns]
+
+	def get_keyset_columns(self):
+		columns = self.get_order_columns()
+		names = {name for name, _ in columns}
+		if self.is_grouped():
+			key_columns = [column.name for column in self.table_schema if column.instance.group_by]
+		else:
+			key_columns = self.key_columns
+		columns.extend((name, OrderChoice.ASC.value) for name in key_columns if name not in names)
+		return columns
+
+	def build_order_section(self):
+		if self.page_size:
+			columns = [
+				f'{name} {predicate} {self.nulls_order_matching[predicate]}'
+				for name, predicate in self.get_keyset_columns()
+			]
+		else:
+			columns = [f'{name} {predicate}' for name, predicate in self.get_order_columns()]
 		return f'ORDER BY {", ".join(columns)}' if columns else ''
 
+	def build_limit_section(self):
+		if not self.page_size:
+			return ''
+		return f'LIMIT :{self.query_param.add_param(self.page_size + 1)}'
+
+	def split_page(self, rows: list):
+		"""
+		Отделяет служебные столбцы курсора, которые SELECT добавляет в конец строки,
+		и возвращает кортежи строк страницы и курсор следующей страницы
+		"""
+		width = len(rows[0]) - len(self.cursor_aliases) if rows else 0
+		next_cursor = None
+		if len(rows) > self.page_size:
+			rows = rows[:self.page_size]
+			names = [name for name, _ in self.get_keyset_columns()]
+			next_cursor = KeysetCursor.encode(names, list(rows[-1][width:]))
+		return [tuple(row[:width]) for row in rows], next_cursor
+
+
+class SQLSummaryQueryBuilder(SQLQueryBuilder):
+	"""
+	Строит запрос COUNT(*) и агрегатов по показываемым столбцам.
+	Условие WHERE формируется так же, как в SQLQueryBuilder
+	"""
+	COUNT_ALIAS = 'count'
+	AGGREGATE_SEPARATOR = '__'
+	aggregates_matching = {
+		ColumnType.INTEGER.value: ('MIN', 'MAX', 'SUM', 'AVG'),
+		ColumnType.FLOAT.value: ('MIN', 'MAX', 'SUM', 'AVG'),
+		ColumnType.CHAR.value: ('MIN', 'MAX'),
+		ColumnType.DATE.value: ('MIN', 'MAX'),
+		ColumnType.DATETIME.value: ('MIN', 'MAX'),
+		ColumnType.DURATION.value: ('MIN', 'MAX', 'SUM', 'AVG'),
+	}
+
+	def __init__(self, table_schema: TableSchema, with_aggregates: bool = True):
+		self.with_aggregates = with_aggregates
+		super().__init__(table_schema)
+
+	def paginate(self, *args, **kwargs):
+		raise NotImplementedError('Сводный запрос не поддерживает постраничную выборку')
 
-class StringWhereConditionBuilder:
+	def is_aggregated(self, column: ColumnSchema) -> bool:
+		return False
+
+	def is_grouped(self) -> bool:
+		return False
+
+	def compile_query(self):
+		select_section = self.build_select_section()
+		from_section = self.build_from_section()
+		where_section = self.build_where_section()
+		return ' '.join(filter(bool, [select_section, from_section, where_section]))
+
+	def get_fingerprint(self):
+		return 'summary', self.with_aggregates, super().get_fingerprint()
+
+	def build_select_section(self):
+		expressions = [f'COUNT(*) as "{self.COUNT_ALIAS}"']
+		if self.with_aggregates:
+			for column in self.table_schema:
+				if not column.instance.show:
+					continue
+				for function in self.aggregates_matching[column.data_type]:
+					alias = f'{column.name}{self.AGGREGATE_SEPARATOR}{function.lower()}'
+					expressions.append(f'{function}({column.name}) as "{alias}"')
+		return f'SELECT {", ".join(expressions)}'
+
+	def parse_summary(self, row: dict) -> dict:
+		"""Раскладывает плоскую строку результата в {'count': ..., 'columns': {столбец: {функция: значение}}}"""
+		row = dict(row)
+		summary = {self.COUNT_ALIAS: row.pop(self.COUNT_ALIAS), 'columns': {}}
+		for alias, value in row.items():
+			name, function = alias.rsplit(self.AGGREGATE_SEPARATOR, 1)
+			summary['columns'].setdefault(name, {})[function] = value
+		return summary
+
+
+class WhereConditionBuilder:
+	"""
+	Базовый класс построителей условий фильтрации столбца.
+	get_values возвращает значения параметров в порядке их появления в условии
+	"""
 	def __init__(self, builder: SQLQueryBuilder, column: ColumnSchema):
 		self.builder = builder
 		self.column = column
 
+	def get_values(self) -> list:
+		raise NotImplementedError()
+
 	def build_condition(self):
-		t = ''
+		raise NotImplementedError()
+
+	def validate(self):
+		"""Сообщение об ошибке, если параметры фильтрации не подходят построителю, иначе None"""
+		return None
+
+
+class StringWhereConditionBuilder(WhereConditionBuilder):
+	operators = {
+		StringWhereChoice.EQ.value: '=',
+		StringWhereChoice.CONTAINS.value: 'LIKE',
+		StringWhereChoice.STARTSWITH.value: 'LIKE',
+		StringWhereChoice.ENDSWITH.value: 'LIKE',
+	}
+
+	def get_values(self):
 		instance = self.column.instance
-		if instance.where_predicate == StringWhereChoice.NOT.value:
-			return t
-		if instance.where_not:
-			t += 'NOT '
-		t += f'{instance.name} '
+		value = instance.where_value
 		if instance.where_predicate == StringWhereChoice.EQ.value:
-			t += f'= :{self.builder.query_param.add_param(instance.where_value)}'
+			return [value]
 		elif instance.where_predicate == StringWhereChoice.CONTAINS.value:
-			t += f'LIKE :{self.builder.query_param.add_param("%" + instance.where_value + "%")}'
+			return ['%' + value + '%']
 		elif instance.where_predicate == StringWhereChoice.STARTSWITH.value:
-			t += f'LIKE :{self.builder.query_param.add_param(instance.where_value + "%")}'
+			return [value + '%']
 		elif instance.where_predicate == StringWhereChoice.ENDSWITH.value:
-			t += f'LIKE :{self.builder.query_param.add_param("%" + instance.where_value)}'
+			return ['%' + value]
+		return []
 
+	def build_condition(self):
+		t = ''
+		instance = self.column.instance
+		values = self.get_values()
+		if not values:
+			return t
+		if instance.where_not:
+			t += 'NOT '
+		t += f'{self.builder.get_column_expression(self.column)} '
+		t += f'{self.operators[instance.where_predicate]} :{self.builder.query_param.add_param(values[0])}'
 		return t
 
 
-class NumberWhereConditionBuilder:
-	def __init__(self, builder: SQLQueryBuilder, column: ColumnSchema):
-		self.builder = builder
-		self.column = column
+class NumberWhereConditionBuilder(WhereConditionBuilder):
+	"""
+	Условие по числу. Используется и для агрегатов с числовым результатом (COUNT строк или дат),
+	поэтому параметры фильтрации исходного столбца могут отсутствовать или быть строками
+	"""
+	operators = {
+		NumberWhereChoice.EQ.value: '=',
+		NumberWhereChoice.GT.value: '>',
+		NumberWhereChoice.LT.value: '<',
+	}
+	value_parsers = {
+		ColumnType.INTEGER.value: int,
+		ColumnType.FLOAT.value: float,
+	}
+
+	def get_predicate(self):
+		return getattr(self.column.instance, 'where_predicate', '')
+
+	def get_value(self):
+		value = getattr(self.column.instance, 'where_value', None)
+		if isinstance(value, str):
+			value = self.value_parsers[self.builder.get_output_type(self.column)](value)
+		return value
+
+	def get_values(self):
+		if self.get_predicate() in self.operators:
+			return [self.get_value()]
+		return []
+
+	def validate(self):
+		instance = self.column.instance
+		predicate = self.get_predicate()
+		if predicate and predicate not in self.operators:
+			return Message.INVALID_AGGREGATE_FILTER.value
+		if getattr(instance, 'where_from_value', None) or getattr(instance, 'where_to_value', None):
+			return Message.INVALID_AGGREGATE_FILTER.value
+		try:
+			if predicate and self.get_value() is None:
+				return Message.INVALID_AGGREGATE_FILTER.value
+		except ValueError:
+			return Message.INVALID_AGGREGATE_FILTER.value
+		return None
 
 	def build_condition(self):
 		t = ''
 		instance = self.column.instance
-		if instance.where_predicate == NumberWhereChoice.NOT.value:
+		values = self.get_values()
+		if not values:
 			return t
 		if instance.where_not:
 			t += 'NOT '
-		t += f'{instance.name} '
-		if instance.where_predicate == NumberWhereChoice.EQ.value:
-			t += f'= :{self.builder.query_param.add_param(instance.where_value)}'
-		elif instance.where_predicate == NumberWhereChoice.GT.value:
-			t += f'> :{self.builder.query_param.add_param(instance.where_value)}'
-		elif instance.where_predicate == NumberWhereChoice.LT.value:
-			t += f'< :{self.builder.query_param.add_param(instance.where_value)}'
-
+		t += f'{self.builder.get_column_expression(self.column)} '
+		t += f'{self.operators[self.get_predicate()]} :{self.builder.query_param.add_param(values[0])}'
 		return t
 
 
-class DateWhereConditionBuilder:
-	def __init__(self, builder: SQLQueryBuilder, column: ColumnSchema):
-		self.builder = builder
-		self.column = column
+class DateWhereConditionBuilder(WhereConditionBuilder):
+	def get_values(self):
+		instance = self.column.instance
+		return [value for value in (instance.where_from_value, instance.where_to_value) if value]
 
 	def build_condition(self):
-		column_name = self.column.name
+		column_name = self.builder.get_column_expression(self.column)
 		t = ''
 		instance = self.column.instance
 		if not instance.where_from_value and not instance.where_to_value:
@@ -165,3 +648,13 @@ class DateWhereConditionBuilder:
 			t += f'<= :{self.builder.query_param.add_param(instance.where_to_value)} '
 
 		return t
+
+
+where_condition_builder_matching = {
+	ColumnType.INTEGER.value: NumberWhereConditionBuilder,
+	ColumnType.FLOAT.value: NumberWhereConditionBuilder,
+	ColumnType.CHAR.value: StringWhereConditionBuilder,
+	ColumnType.DATE.value: DateWhereConditionBuilder,
+	ColumnType.DATETIME.value: DateWhereConditionBuilder,
+	ColumnType.DURATION.value: DateWhereConditionBuilder
+}
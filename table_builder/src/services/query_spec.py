@@ -0,0 +1,234 @@
+from rest_framework import serializers
+
+from table_builder.src.entity.constants import (
+	AggregateChoice,
+	ColumnType,
+	Message,
+	NumberWhereChoice,
+	OrderChoice,
+	StringWhereChoice,
+)
+from table_builder.src.entity.schema import ColumnSchema, TableSchema
+from table_builder.src.services.query_constructor import SQLQueryBuilder
+
+
+class ColumnParams:
+	"""
+	Параметры столбца для SQLQueryBuilder без модели и формы.
+	Набор атрибутов и значения по умолчанию совпадают с моделями столбцов
+	"""
+	__slots__ = (
+		'pk', 'name', 'position', 'show', 'alias', 'order_predicate', 'order_priority', 'group_by',
+		'aggregate_function', 'where_not', 'where_predicate', 'where_value', 'where_from_value', 'where_to_value',
+	)
+
+	def __init__(self, name: str, position: int, **params):
+		self.pk = None
+		self.name = name
+		self.position = position
+		self.show = False
+		self.alias = ''
+		self.order_predicate = OrderChoice.NOT.value
+		self.order_priority = 1
+		self.group_by = False
+		self.aggregate_function = AggregateChoice.NOT.value
+		self.where_not = False
+		self.where_predicate = ''
+		self.where_value = None
+		self.where_from_value = None
+		self.where_to_value = None
+		for attr, value in params.items():
+			setattr(self, attr, value)
+
+
+class QueryColumnSerializer(serializers.Serializer):
+	"""Показываемый столбец: имя или объект с псевдонимом и агрегатной функцией"""
+	name = serializers.CharField()
+	alias = serializers.CharField(required=False, allow_blank=True, default='', max_length=255)
+	aggregate = serializers.ChoiceField(choices=AggregateChoice.choices, required=False, default='')
+
+	def to_internal_value(self, data):
+		if isinstance(data, str):
+			data = {'name': data}
+		return super().to_internal_value(data)
+
+	def validate_alias(self, value):
+		if '"' in value:
+			raise serializers.ValidationError(Message.INVALID_ALIAS.value)
+		return value
+
+
+class QueryFilterSerializer(serializers.Serializer):
+	"""
+	Условие фильтрации. Для чисел и строк задаются op и value,
+	для дат, времени и длительностей - границы from_value и (или) to_value
+	"""
+	column = serializers.CharField()
+	op = serializers.CharField(required=False, allow_blank=True, default='')
+	value = serializers.JSONField(required=False)
+	from_value = serializers.JSONField(required=False)
+	to_value = serializers.JSONField(required=False)
+	negate = serializers.BooleanField(required=False, default=False)
+
+
+class QueryOrderSerializer(serializers.Serializer):
+	column = serializers.CharField()
+	direction = serializers.ChoiceField(
+		choices=[OrderChoice.ASC.value, OrderChoice.DESC.value], required=False, default=OrderChoice.ASC.value
+	)
+
+
+class QuerySpecSerializer(serializers.Serializer):
+	"""
+	Спецификация запроса данных в JSON. Имена столбцов сверяются со схемой из context['table_schema'],
+	значения фильтров приводятся к типам столбцов, для агрегированных столбцов - к типу результата функции.
+	limit ограничивается context['max_page_size'], cursor допускается только вместе с limit.
+	save() возвращает TableSchema, столбцы которой вместо экземпляров моделей содержат ColumnParams
+	"""
+	table = serializers.CharField()
+	columns = QueryColumnSerializer(many=True, allow_empty=False)
+	filters = QueryFilterSerializer(many=True, required=False, default=list)
+	group_by = serializers.ListField(child=serializers.CharField(), required=False, default=list)
+	order = QueryOrderSerializer(many=True, required=False, default=list)
+	limit = serializers.IntegerField(required=False, allow_null=True, min_value=1, default=None)
+	cursor = serializers.CharField(required=False, allow_blank=True, default='')
+
+	value_fields = {
+		ColumnType.INTEGER.value: serializers.IntegerField,
+		ColumnType.FLOAT.value: serializers.FloatField,
+		ColumnType.CHAR.value: serializers.CharField,
+		ColumnType.DATE.value: serializers.DateField,
+		ColumnType.DATETIME.value: serializers.DateTimeField,
+		ColumnType.DURATION.value: serializers.DurationField,
+	}
+	predicates = {
+		ColumnType.INTEGER.value: NumberWhereChoice,
+		ColumnType.FLOAT.value: NumberWhereChoice,
+		ColumnType.CHAR.value: StringWhereChoice,
+	}
+	query_builder_class = SQLQueryBuilder
+
+	def validate_limit(self, value):
+		max_page_size = self.context.get('max_page_size')
+		if value is not None and max_page_size is not None and value > max_page_size:
+			raise serializers.ValidationError(Message.PAGE_SIZE_EXCEEDED.value)
+		return value
+
+	def validate(self, attrs):
+		self._errors_by_key = {}
+		self._columns = {column_schema.name: column_schema for column_schema in self.context['table_schema']}
+		params = {}
+		self._validate_columns(attrs['columns'], params)
+		self._validate_group_by(attrs['group_by'], params)
+		self._validate_order(attrs['order'], params)
+		self._validate_filters(attrs['filters'], params)
+		if not self._errors_by_key:
+			self._validate_grouping(params)
+		if attrs['cursor'] and attrs['limit'] is None:
+			self._add_error('cursor', Message.CURSOR_WITHOUT_LIMIT.value)
+		if self._errors_by_key:
+			raise serializers.ValidationError(self._errors_by_key)
+		attrs['column_params'] = params
+		return attrs
+
+	def _add_error(self, key: str, message: str):
+		self._errors_by_key.setdefault(key, []).append(message)
+
+	def _get_params(self, key: str, name: str, params: dict, attr: str = None):
+		"""Параметры известного столбца. attr - параметр, который не должен задаваться повторно"""
+		if name not in self._columns:
+			self._add_error(key, f'{name}: {Message.UNKNOWN_COLUMN.value}')
+			return None
+		column_params = params.setdefault(name, {})
+		if attr is not None and attr in column_params:
+			self._add_error(key, f'{name}: {Message.DUPLICATE_COLUMN.value}')
+			return None
+		return column_params
+
+	def _validate_columns(self, columns: list, params: dict):
+		for column in columns:
+			column_params = self._get_params('columns', column['name'], params, 'show')
+			if column_params is not None:
+				column_params.update(show=True, alias=column['alias'], aggregate_function=column['aggregate'])
+
+	def _validate_group_by(self, names: list, params: dict):
+		for name in names:
+			column_params = self._get_params('group_by', name, params, 'group_by')
+			if column_params is not None:
+				column_params['group_by'] = True
+
+	def _validate_order(self, order: list, params: dict):
+		for i, item in enumerate(order):
+			column_params = self._get_params('order', item['column'], params, 'order_predicate')
+			if column_params is not None:
+				column_params.update(order_predicate=item['direction'], order_priority=len(order) - i)
+
+	def _validate_filters(self, filters: list, params: dict):
+		for item in filters:
+			name = item['column']
+			column_params = self._get_params('filters', name, params, 'where_not')
+			if column_params is None:
+				continue
+			try:
+				column_params.update(self._get_filter_params(self._get_output_type(name, column_params), item))
+			except serializers.ValidationError as e:
+				for message in e.detail:
+					self._add_error('filters', f'{name}: {message}')
+
+	def _get_output_type(self, name: str, column_params: dict) -> str:
+		"""Тип, по которому проверяется фильтр: фильтр агрегированного столбца попадает в HAVING"""
+		column_schema = self._columns[name]
+		column = ColumnSchema(
+			name=name,
+			data_type=column_schema.data_type,
+			instance=ColumnParams(name, 0, **column_params)
+		)
+		return self.query_builder_class(self.context['table_schema']).get_output_type(column)
+
+	def _get_filter_params(self, data_type: str, item: dict) -> dict:
+		value_field = self.value_fields[data_type]()
+		filter_params = {'where_not': item['negate']}
+		if data_type in self.predicates:
+			choices = [value for value in self.predicates[data_type].values if value]
+			if item['op'] not in choices or 'value' not in item:
+				raise serializers.ValidationError(Message.INVALID_FILTER.value)
+			filter_params.update(where_predicate=item['op'], where_value=value_field.run_validation(item['value']))
+			return filter_params
+		if item['op'] or not ('from_value' in item or 'to_value' in item):
+			raise serializers.ValidationError(Message.INVALID_FILTER.value)
+		for attr in ('from_value', 'to_value'):
+			if attr in item:
+				filter_params[f'where_{attr}'] = value_field.run_validation(item[attr])
+		return filter_params
+
+	def _validate_grouping(self, params: dict):
+		"""Те же правила, что в SQLFormSet: при группировке столбцы должны быть сгруппированы или агрегированы"""
+		grouped = any(
+			column_params.get('group_by') or column_params.get('aggregate_function') for column_params in params.values()
+		)
+		if not grouped:
+			return
+		for name, column_params in params.items():
+			if column_params.get('group_by') or column_params.get('aggregate_function'):
+				continue
+			if column_params.get('show') or column_params.get('order_predicate'):
+				self._add_error(name, Message.UNGROUPED_COLUMN.value)
+
+	def create(self, validated_data):
+		table_schema = self.context['table_schema']
+		params = validated_data['column_params']
+		return TableSchema(
+			name=table_schema.name,
+			pk=table_schema.pk,
+			db_pk=table_schema.db_pk,
+			db_instance=table_schema.db_instance,
+			column_schemes=[
+				ColumnSchema(
+					name=column_schema.name,
+					data_type=column_schema.data_type,
+					primary_key=column_schema.primary_key,
+					instance=ColumnParams(column_schema.name, position, **params.get(column_schema.name, {}))
+				)
+				for position, column_schema in enumerate(table_schema, start=1)
+			]
+		)
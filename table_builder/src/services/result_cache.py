@@ -0,0 +1,100 @@
+import hashlib
+import json
+import pickle
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from table_builder.src.services.query_constructor import KeysetCursor
+
+
+class CachedResult:
+	def __init__(self, keys, rows, created_at):
+		self.keys = keys
+		self.rows = rows
+		self.created_at = created_at
+
+	@property
+	def age(self) -> int:
+		return int(time.time() - self.created_at)
+
+	def as_dicts(self) -> list:
+		return [dict(zip(self.keys, row)) for row in self.rows]
+
+
+class ResultCache:
+	"""
+	LRU-кэш результатов запросов к внешним БД с ограничением по суммарному объёму.
+	Строки хранятся сжатыми кортежами вместе с именами столбцов, поэтому из одной записи
+	отдаются и JSON, и CSV
+	"""
+	defaults = {
+		'default_ttl': 0,
+		'max_bytes': 64 * 1024 * 1024,
+		'compress_level': 1,
+	}
+
+	def __init__(self, **options):
+		self.options = {**self.defaults, **getattr(settings, 'TABLE_BUILDER_RESULT_CACHE', {}), **options}
+		self._entries = OrderedDict()
+		self._size = 0
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def make_key(database_pk, query: str, params: dict) -> str:
+		"""
+		Параметры кодируются с меткой типа и без потери точности, как значения курсора: DjangoJSONEncoder
+		усекает время до миллисекунд, и курсоры, различающиеся в микросекундах, получили бы один ключ
+		"""
+		params = {name: KeysetCursor.encode_value(value) for name, value in params.items()}
+		payload = json.dumps([database_pk, query, params], cls=DjangoJSONEncoder, sort_keys=True)
+		return hashlib.sha256(payload.encode()).hexdigest()
+
+	def get(self, key):
+		with self._lock:
+			entry = self._entries.get(key)
+			if entry is None:
+				return None
+			created_at, expires_at, data = entry
+			if expires_at < time.time():
+				self._pop(key)
+				return None
+			self._entries.move_to_end(key)
+		keys, rows = pickle.loads(zlib.decompress(data))
+		return CachedResult(keys, rows, created_at)
+
+	def set(self, key, keys, rows, ttl: int):
+		data = zlib.compress(
+			pickle.dumps((list(keys), [tuple(row) for row in rows]), protocol=pickle.HIGHEST_PROTOCOL),
+			self.options['compress_level']
+		)
+		if len(data) > self.options['max_bytes']:
+			return
+		now = time.time()
+		with self._lock:
+			self._pop(key)
+			self._entries[key] = (now, now + ttl, data)
+			self._size += len(data)
+			while self._size > self.options['max_bytes']:
+				self._pop(next(iter(self._entries)))
+
+	def _pop(self, key):
+		entry = self._entries.pop(key, None)
+		if entry is not None:
+			self._size -= len(entry[2])
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._size = 0
+
+	@property
+	def size(self) -> int:
+		return self._size
+
+
+result_cache = ResultCache()
@@ -0,0 +1,129 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from django.conf import settings
+from django.core.cache import cache
+
+from table_builder.src.entity.schema import TableSchema, ColumnSchema
+
+
+class LocalLRUCache:
+	"""Потокобезопасный LRU-кэш процесса с ограничением по числу записей"""
+
+	def __init__(self, max_entries: int = 128):
+		self.max_entries = max_entries
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	def __len__(self):
+		return len(self._data)
+
+	def get(self, key, default=None):
+		with self._lock:
+			try:
+				self._data.move_to_end(key)
+			except KeyError:
+				return default
+			return self._data[key]
+
+	def set(self, key, value):
+		with self._lock:
+			self._data[key] = value
+			self._data.move_to_end(key)
+			while len(self._data) > self.max_entries:
+				self._data.popitem(last=False)
+
+	def delete(self, key):
+		with self._lock:
+			self._data.pop(key, None)
+
+	def clear(self):
+		with self._lock:
+			self._data.clear()
+
+
+class SchemaCacheEntry:
+	def __init__(self, data, fingerprint=None, checked_at=None):
+		self.data = data
+		self.fingerprint = fingerprint
+		self.checked_at = checked_at if checked_at is not None else time.time()
+
+
+class SchemaCache:
+	"""
+	Кэш отражённых схем внешних БД. Записи хранятся в кэше Django и в локальном LRU-кэше процесса.
+	По истечении ttl запись не выбрасывается, а сверяется с отпечатком каталога БД:
+	повторное отражение выполняется только если каталог действительно изменился
+	"""
+	key_prefix = 'table_builder:schema'
+	defaults = {
+		'ttl': 300,
+		'timeout': 86400,
+		'local_max_entries': 128,
+	}
+
+	def __init__(self, **options):
+		self.options = {**self.defaults, **getattr(settings, 'TABLE_BUILDER_SCHEMA_CACHE', {}), **options}
+		self.local_cache = LocalLRUCache(self.options['local_max_entries'])
+
+	def _version_key(self, database_pk):
+		return f'{self.key_prefix}:{database_pk}:version'
+
+	def _get_version(self, database_pk):
+		return cache.get_or_set(self._version_key(database_pk), 1, timeout=None)
+
+	def _make_key(self, database_pk, name):
+		return f'{self.key_prefix}:{database_pk}:{self._get_version(database_pk)}:{name}'
+
+	def get(self, database_pk, name, loader: Callable, fingerprint_loader: Callable = None):
+		key = self._make_key(database_pk, name)
+		entry = self.local_cache.get(key) or cache.get(key)
+		if entry is not None and time.time() - entry.checked_at < self.options['ttl']:
+			self.local_cache.set(key, entry)
+			return entry.data
+
+		fingerprint = fingerprint_loader() if fingerprint_loader is not None else None
+		if entry is not None and fingerprint is not None and entry.fingerprint == fingerprint:
+			entry = SchemaCacheEntry(entry.data, fingerprint)
+		else:
+			entry = SchemaCacheEntry(loader(), fingerprint)
+		self._store(key, entry)
+		return entry.data
+
+	def _store(self, key, entry: SchemaCacheEntry):
+		self.local_cache.set(key, entry)
+		cache.set(key, entry, timeout=self.options['timeout'])
+
+	def invalidate(self, database_pk):
+		"""Сбрасывает все схемы БД сменой версии ключей"""
+		try:
+			cache.incr(self._version_key(database_pk))
+		except ValueError:
+			cache.set(self._version_key(database_pk), 2, timeout=None)
+
+
+def dump_table_schema(table_schema: TableSchema) -> tuple:
+	return (
+		table_schema.name,
+		tuple(
+			(column_schema.name, column_schema.data_type, column_schema.primary_key)
+			for column_schema in table_schema
+		)
+	)
+
+
+def load_table_schema(data: tuple, db_instance=None) -> TableSchema:
+	name, columns = data
+	return TableSchema(
+		name=name,
+		db_instance=db_instance,
+		column_schemes=[
+			ColumnSchema(name=column_name, data_type=data_type, primary_key=primary_key)
+			for column_name, data_type, primary_key in columns
+		]
+	)
+
+
+schema_cache = SchemaCache()
@@ -0,0 +1,80 @@
+import base64
+import binascii
+import json
+import zlib
+
+from table_builder.src.entity.constants import ColumnType
+from table_builder.src.entity.schema import ColumnSchema, TableSchema
+
+
+class SchemaDecodeError(ValueError):
+	"""Данные не являются схемой TableSchemaCodec или их версия не поддерживается"""
+
+
+class TableSchemaCodec:
+	"""
+	Компактная сериализация TableSchema для передачи схемы между запросами.
+	Байтовый формат: байт версии и сжатый zlib массив JSON
+	[имя, pk, db_pk, таблица типов, имена столбцов, индексы типов, позиции первичного ключа].
+	Имя каждого типа записывается один раз, при загрузке заменяется строкой из ColumnType,
+	поэтому столбцы всех схем разделяют одни и те же объекты строк.
+	Экземпляры моделей не сериализуются, сохраняются только pk таблицы и БД
+	"""
+	version = 1
+	compress_level = 6
+	data_types = {column_type.value: column_type.value for column_type in ColumnType}
+
+	@classmethod
+	def to_bytes(cls, table_schema: TableSchema) -> bytes:
+		type_names = []
+		type_indexes = {}
+		column_names = []
+		column_types = []
+		primary_keys = []
+		for position, column_schema in enumerate(table_schema):
+			index = type_indexes.get(column_schema.data_type)
+			if index is None:
+				index = type_indexes[column_schema.data_type] = len(type_names)
+				type_names.append(column_schema.data_type)
+			column_names.append(column_schema.name)
+			column_types.append(index)
+			if column_schema.primary_key:
+				primary_keys.append(position)
+		payload = [
+			table_schema.name, table_schema.pk, table_schema.db_pk,
+			type_names, column_names, column_types, primary_keys
+		]
+		data = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode()
+		return bytes((cls.version,)) + zlib.compress(data, cls.compress_level)
+
+	@classmethod
+	def from_bytes(cls, data: bytes, db_instance=None) -> TableSchema:
+		if not data or data[0] != cls.version:
+			raise SchemaDecodeError('Неподдерживаемая версия схемы')
+		try:
+			payload = json.loads(zlib.decompress(data[1:]))
+			name, pk, db_pk, type_names, column_names, column_types, primary_keys = payload
+			if len(column_names) != len(column_types):
+				raise ValueError()
+			types = [cls.data_types[type_name] for type_name in type_names]
+			primary_keys = set(primary_keys)
+			column_schemes = [
+				ColumnSchema(name=column_name, data_type=types[index], primary_key=position in primary_keys)
+				for position, (column_name, index) in enumerate(zip(column_names, column_types))
+			]
+		except (zlib.error, ValueError, TypeError, KeyError, IndexError):
+			raise SchemaDecodeError('Некорректные данные схемы')
+		return TableSchema(name=name, pk=pk, db_pk=db_pk, column_schemes=column_schemes, db_instance=db_instance)
+
+	@classmethod
+	def dumps(cls, table_schema: TableSchema) -> str:
+		"""Текстовый вид для скрытого поля формы: base64url без выравнивания"""
+		return base64.urlsafe_b64encode(cls.to_bytes(table_schema)).rstrip(b'=').decode('ascii')
+
+	@classmethod
+	def loads(cls, value: str, db_instance=None) -> TableSchema:
+		try:
+			data = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+		except (binascii.Error, ValueError, TypeError):
+			raise SchemaDecodeError('Некорректные данные схемы')
+		return cls.from_bytes(data, db_instance=db_instance)
@@ -6,6 +6,7 @@ from table_builder.src.owns.schema import ColumnSchema, TableSchema
 class ColumnSchemaSerializer(serializers.Serializer):
 	name = serializers.CharField()
 	data_type = serializers.CharField()
+	primary_key = serializers.BooleanField(required=False, default=False)
 
 	def create(self, validated_data):
 		return ColumnSchema(**validated_data)
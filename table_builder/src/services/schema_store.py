@@ -0,0 +1,83 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+from table_builder.src.entity.constants import Message
+from table_builder.src.entity.schema import TableSchema
+from table_builder.src.services.schema_cache import LocalLRUCache, dump_table_schema
+from table_builder.src.services.schema_codec import TableSchemaCodec
+
+
+class SchemaNotFound(Http404):
+	"""Ключ схемы неизвестен или срок хранения истёк: клиент должен отправить схему полностью"""
+
+	def __init__(self, message=Message.SCHEMA_NOT_FOUND.value):
+		super().__init__(message)
+
+
+class SchemaStore:
+	"""
+	Серверное хранилище схем таблиц с адресацией по содержимому.
+	Ключ - SHA-256 представления схемы в TableSchemaCodec, поэтому одинаковые схемы получают один ключ,
+	и клиент может передавать его вместо полной схемы. Записи хранятся в кэше Django
+	и в локальном LRU-кэше процесса. Ключи уже сохранённых схем запоминаются по их структуре,
+	чтобы повторное сохранение той же схемы не кодировало и не хэшировало её заново
+	"""
+	key_prefix = 'table_builder:stored_schema'
+	key_pattern = re.compile(r'[0-9a-f]{64}')
+	codec = TableSchemaCodec
+	defaults = {
+		'timeout': 86400,
+		'local_max_entries': 256,
+	}
+
+	def __init__(self, **options):
+		self.options = {**self.defaults, **getattr(settings, 'TABLE_BUILDER_SCHEMA_STORE', {}), **options}
+		self.local_cache = LocalLRUCache(self.options['local_max_entries'])
+		self.local_keys = LocalLRUCache(self.options['local_max_entries'])
+
+	def _make_key(self, key: str) -> str:
+		return f'{self.key_prefix}:{key}'
+
+	@staticmethod
+	def get_identity(table_schema: TableSchema) -> tuple:
+		"""Всё, что сохраняет TableSchemaCodec: одинаковая структура даёт одинаковый ключ"""
+		return table_schema.pk, table_schema.db_pk, dump_table_schema(table_schema)
+
+	def put(self, table_schema: TableSchema) -> str:
+		"""
+		Срок хранения в кэше Django продлевается при каждом сохранении: запись могла быть вытеснена,
+		пока схема оставалась в локальном кэше, и тогда она записывается снова
+		"""
+		identity = self.get_identity(table_schema)
+		key = self.local_keys.get(identity)
+		data = self.local_cache.get(key) if key is not None else None
+		if data is None:
+			data = self.codec.to_bytes(table_schema)
+			key = hashlib.sha256(data).hexdigest()
+			self.local_keys.set(identity, key)
+			self.local_cache.set(key, data)
+		elif cache.touch(self._make_key(key), self.options['timeout']):
+			return key
+		cache.set(self._make_key(key), data, timeout=self.options['timeout'])
+		return key
+
+	def get(self, key: str, db_instance=None) -> TableSchema:
+		if not self.key_pattern.fullmatch(key or ''):
+			raise SchemaNotFound()
+		data = self.local_cache.get(key)
+		if data is None:
+			data = cache.get(self._make_key(key))
+			if data is None:
+				raise SchemaNotFound()
+			self.local_cache.set(key, data)
+		table_schema = self.codec.from_bytes(data, db_instance=db_instance)
+		if db_instance is None:
+			self.local_keys.set(self.get_identity(table_schema), key)
+		return table_schema
+
+
+schema_store = SchemaStore()
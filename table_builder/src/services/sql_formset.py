@@ -1,10 +1,17 @@
+from collections import defaultdict
 from typing import Iterable
 
+from django.db import transaction
+
 from table_builder.src.owns.constants import Message
-from table_builder.src.owns.schema import TableSchema
+from table_builder.src.owns.schema import ColumnSchema, TableSchema
+from table_builder.src.services.query_constructor import SQLQueryBuilder
 
 
 class SQLFormSet:
+	bulk_batch_size = 500
+	query_builder_class = SQLQueryBuilder
+
 	def __init__(self, table_schema: TableSchema, forms: Iterable):
 		self.table_schema = table_schema
 		self.forms = list(forms)
@@ -39,6 +46,35 @@ class SQLFormSet:
 			return
 		if not any([form.instance.show for form in self.forms]):
 			self._errors.setdefault('query', list()).append(Message.NO_FIELDS_SELECTED.value)
+		self._clean_grouping()
+		self._clean_aggregate_filters()
+
+	def _clean_grouping(self):
+		"""При группировке показываемые и сортируемые столбцы должны быть сгруппированы или агрегированы"""
+		if not any(form.instance.group_by or form.instance.aggregate_function for form in self.forms):
+			return
+		for form in self.forms:
+			instance = form.instance
+			if instance.group_by or instance.aggregate_function:
+				continue
+			if instance.show or instance.order_predicate:
+				self._errors.setdefault(form.prefix, list()).append(Message.UNGROUPED_COLUMN.value)
+
+	def _clean_aggregate_filters(self):
+		"""Фильтр агрегированного столбца проверяется по типу результата функции, а не исходного столбца"""
+		query_builder = self.query_builder_class(self.table_schema)
+		for column_schema, form in zip(self.table_schema, self.forms):
+			if not form.instance.aggregate_function:
+				continue
+			column = ColumnSchema(
+				name=column_schema.name,
+				data_type=column_schema.data_type,
+				primary_key=column_schema.primary_key,
+				instance=form.instance
+			)
+			error = query_builder.get_condition_builder(column).validate()
+			if error:
+				self._errors.setdefault(form.prefix, list()).append(error)
 
 	def _edit_table_schema(self):
 		if self.errors:
@@ -51,6 +87,36 @@ class SQLFormSet:
 			form.save(commit)
 		return self.instances
 
+	def bulk_save(self):
+		"""
+		Пакетное сохранение столбцов в одной транзакции.
+		Экземпляры группируются по модели: новые создаются через bulk_create,
+		существующие обновляются через bulk_update и только по изменённым полям
+		"""
+		to_create = defaultdict(list)
+		to_update = defaultdict(list)
+		update_fields = defaultdict(set)
+		for form in self.forms:
+			if form.errors:
+				raise ValueError(f'Форма {form.prefix} не прошла проверку')
+			instance = form.instance
+			model = type(instance)
+			if instance._state.adding:
+				to_create[model].append(instance)
+				continue
+			model_fields = {field.name for field in model._meta.concrete_fields if not field.primary_key}
+			changed_fields = model_fields.intersection(form.changed_data)
+			if changed_fields:
+				to_update[model].append(instance)
+				update_fields[model].update(changed_fields)
+
+		with transaction.atomic():
+			for model, instances in to_create.items():
+				model.objects.bulk_create(instances, batch_size=self.bulk_batch_size)
+			for model, instances in to_update.items():
+				model.objects.bulk_update(instances, sorted(update_fields[model]), batch_size=self.bulk_batch_size)
+		return self.instances
+
 	@property
 	def instances(self):
 		for form in self.forms:
@@ -0,0 +1,124 @@
+import csv
+import io
+import json
+from typing import Iterable, Sequence
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from table_builder.src.entity.constants import StreamFormat
+from table_builder.src.services.columnar import ArrowBatchBuilder, ArrowIPCSerializer, ParquetSerializer
+
+
+class StreamWriter:
+	"""
+	Базовый класс для построчной сериализации результата запроса.
+	Подклассы должны предоставить атрибуты content_type, extension и реализовать метод write
+	"""
+	content_type = None
+	extension = None
+
+	def __init__(self, output_columns: Sequence[tuple] = None):
+		self.output_columns = output_columns
+
+	def write(self, keys: Sequence[str], partitions: Iterable) -> Iterable[str]:
+		raise NotImplementedError()
+
+
+class NDJSONStreamWriter(StreamWriter):
+	content_type = 'application/x-ndjson'
+	extension = 'ndjson'
+	encoder = DjangoJSONEncoder
+
+	def write(self, keys, partitions):
+		for partition in partitions:
+			yield ''.join(
+				json.dumps(dict(zip(keys, row)), cls=self.encoder, ensure_ascii=False) + '\n'
+				for row in partition
+			)
+
+
+class JSONArrayStreamWriter(StreamWriter):
+	content_type = 'application/json'
+	extension = 'json'
+	encoder = DjangoJSONEncoder
+
+	def write(self, keys, partitions):
+		yield '['
+		separator = ''
+		for partition in partitions:
+			chunk = ','.join(
+				json.dumps(dict(zip(keys, row)), cls=self.encoder, ensure_ascii=False)
+				for row in partition
+			)
+			if chunk:
+				yield separator + chunk
+				separator = ','
+		yield ']'
+
+
+class CSVStreamWriter(StreamWriter):
+	content_type = 'text/csv; charset=utf-8'
+	extension = 'csv'
+
+	def write(self, keys, partitions):
+		buffer = io.StringIO()
+		writer = csv.writer(buffer)
+		writer.writerow(keys)
+		yield self._flush(buffer)
+		for partition in partitions:
+			writer.writerows(partition)
+			yield self._flush(buffer)
+
+	@staticmethod
+	def _flush(buffer: io.StringIO) -> str:
+		value = buffer.getvalue()
+		buffer.seek(0)
+		buffer.truncate()
+		return value
+
+
+class ColumnarStreamWriter(StreamWriter):
+	"""
+	Пишет каждую часть результата отдельным RecordBatch, типизированным по output_columns.
+	Подклассы должны предоставить атрибут serializer_class
+	"""
+	serializer_class = None
+
+	def __init__(self, output_columns=None):
+		super().__init__(output_columns)
+		self.serializer = self.serializer_class()
+		self.content_type = self.serializer.content_type
+		self.extension = self.serializer.extension
+		self.batch_builder = ArrowBatchBuilder(output_columns or [])
+
+	def write(self, keys, partitions):
+		return self.serializer.serialize(self.batch_builder, self.batch_builder.iter_batches(partitions))
+
+
+class ArrowIPCStreamWriter(ColumnarStreamWriter):
+	serializer_class = ArrowIPCSerializer
+
+
+class ParquetStreamWriter(ColumnarStreamWriter):
+	serializer_class = ParquetSerializer
+
+
+class StreamWriterFactory:
+	"""
+	Фабрика сериализаторов потока. Подбирает сериализатор по запрошенному формату
+	"""
+	writers_matching = {
+		StreamFormat.NDJSON.value: NDJSONStreamWriter,
+		StreamFormat.JSON.value: JSONArrayStreamWriter,
+		StreamFormat.CSV.value: CSVStreamWriter,
+		StreamFormat.ARROW.value: ArrowIPCStreamWriter,
+		StreamFormat.PARQUET.value: ParquetStreamWriter,
+	}
+	default_format = StreamFormat.NDJSON.value
+
+	def get_writer(self, stream_format: str = None, output_columns: Sequence[tuple] = None) -> StreamWriter:
+		try:
+			writer_class = self.writers_matching[stream_format or self.default_format]
+		except KeyError:
+			raise NotImplementedError('Данный формат не поддерживается')
+		return writer_class(output_columns)
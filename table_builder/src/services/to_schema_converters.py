@@ -63,7 +63,7 @@ class SQLAlchemyColumnSchemaConverter:
 			column_type = cls.fields_matching[type(instance.type)]
 		except KeyError:
 			raise NotImplementedError('Неподдерживаемый тип поля')
-		return ColumnSchema(name=instance.name, data_type=column_type)
+		return ColumnSchema(name=instance.name, data_type=column_type, primary_key=instance.primary_key)
 
 
 class PostgreSQLColumnSchemaConverter(SQLAlchemyColumnSchemaConverter):
@@ -1,2 +1,1058 @@
+import asyncio
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+import sys
+import zlib
+
+import pytest
+import sqlalchemy
+from asgiref.sync import sync_to_async
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django import forms
+from django.core.cache import cache
+from django.test import Client, RequestFactory
+from django.utils import timezone
+from django.urls import reverse
+from sqlalchemy.pool import QueuePool
+
+from table_builder import models, views
+from table_builder.src.entity import async_db_broker
+from table_builder.src.entity.async_db_broker import AsyncEngineRegistry
+from table_builder.src.entity.constants import (
+	ColumnType,
+	ExportFormat,
+	ExportStatus,
+	Message,
+	OrderChoice,
+	PlanGuardMode,
+	StreamFormat,
+)
+from table_builder.src.entity.db_broker import (
+	CopyStream,
+	DBBroker,
+	EngineRegistry,
+	PreparedStatementCache,
+	QueryLimitError,
+	QueryLimits,
+	QueryPlan,
+)
+from table_builder.src.entity.schema import ColumnSchema, TableSchema
+from table_builder.src.generics.form_fields import TableSchemaField
+from table_builder.src.generics.renderers import TupleCSVRenderer
+from table_builder.src.services.column_params import (
+	ColumnChangeDetector,
+	ColumnFormPlaceholder,
+	PartialColumnData,
+	get_form_defaults,
+)
+from table_builder.src.services.columnar import ArrowBatchBuilder, ArrowIPCSerializer, ColumnarResult
+from table_builder.src.services import export_jobs
+from table_builder.src.services.cost_guard import QueryCostError, QueryCostGuard
+from table_builder.src.services.export_jobs import (
+	CSVGzipExportWriter,
+	ExportJobRunner,
+	ExportQueue,
+	ExportWorkerPool,
+	ParquetExportWriter,
+	dump_params,
+	load_params,
+	parse_byte_range,
+	read_file_range,
+)
+from table_builder.src.services.query_constructor import (
+	KeysetCursor,
+	PaginationKeyError,
+	SQLQueryBuilder,
+	SQLSummaryQueryBuilder,
+	query_template_cache
+)
+from table_builder.src.services.query_spec import ColumnParams, QuerySpecSerializer
+from table_builder.src.services.result_cache import ResultCache, result_cache
+from table_builder.src.services.schema_cache import SchemaCache
+from table_builder.src.services.schema_codec import SchemaDecodeError, TableSchemaCodec
+from table_builder.src.services.schema_store import SchemaStore, schema_store
+from table_builder.src.services.sql_formset import SQLFormSet
+from table_builder.src.services.stream_writers import StreamWriterFactory
+
+
 def test():
 	assert True
+
+
+def make_schema(name, columns, **params):
+	"""columns - список (имя, тип, первичный ключ), params - параметры столбцов по именам"""
+	return TableSchema(name=name, column_schemes=[
+		ColumnSchema(
+			name=column_name,
+			data_type=data_type,
+			primary_key=primary_key,
+			instance=ColumnParams(column_name, position, **params.get(column_name, {}))
+		)
+		for position, (column_name, data_type, primary_key) in enumerate(columns, start=1)
+	])
+
+
+@pytest.fixture
+def sqlite_engine():
+	engine = sqlalchemy.create_engine('sqlite://')
+	yield engine
+	engine.dispose()
+
+
+def fetch_pages(engine, make_builder, page_size, key_columns=()):
+	"""Проходит все страницы и возвращает строки каждой страницы"""
+	pages, cursor = [], None
+	while True:
+		builder = make_builder()
+		builder.paginate(page_size, cursor=cursor, key_columns=key_columns)
+		query, params = builder.build_sql_query()
+		with engine.connect() as connection:
+			rows = [tuple(row) for row in connection.execute(sqlalchemy.text(query), params)]
+		rows, cursor = builder.split_page(rows)
+		pages.append(rows)
+		if cursor is None:
+			return pages
+
+
+def test_keyset_cursor_round_trip_is_lossless():
+	values = [
+		1, 0.1, 'текст', None,
+		datetime.datetime(2024, 1, 2, 12, 0, 0, 123456),
+		datetime.datetime(2024, 1, 2, 12, 0, 0, 123456, tzinfo=datetime.timezone.utc),
+		datetime.date(2024, 1, 2),
+		datetime.time(12, 0, 0, 654321),
+		datetime.timedelta(days=1, microseconds=7),
+		decimal.Decimal('12345678901234567890.123456789'),
+	]
+	names = [f'c{i}' for i in range(len(values))]
+	decoded = KeysetCursor.decode(KeysetCursor.encode(names, values), names)
+	assert decoded == values
+	assert [type(value) for value in decoded] == [type(value) for value in values]
+
+
+@pytest.mark.parametrize('token', ['', 'not-base64', KeysetCursor.encode(['other'], [1])])
+def test_keyset_cursor_rejects_foreign_token(token):
+	with pytest.raises(ValueError):
+		KeysetCursor.decode(token, ['id'])
+
+
+@pytest.mark.parametrize('direction', [OrderChoice.ASC.value, OrderChoice.DESC.value])
+def test_keyset_pagination_returns_every_row_once(sqlite_engine, direction):
+	sqlite_engine.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, score INTEGER)')
+	rows = [(i, None if i % 4 == 0 else i % 3) for i in range(1, 24)]
+	sqlite_engine.execute('INSERT INTO items VALUES (?, ?)', rows)
+	columns = [('id', ColumnType.INTEGER.value, True), ('score', ColumnType.INTEGER.value, False)]
+
+	def make_builder():
+		return SQLQueryBuilder(make_schema('items', columns, id={'show': True}, score={
+			'show': True, 'order_predicate': direction
+		}))
+
+	query_template_cache.clear()
+	for _ in range(2):
+		pages = fetch_pages(sqlite_engine, make_builder, page_size=5, key_columns=['id'])
+		ids = [row[0] for page in pages for row in page]
+		assert sorted(ids) == [row[0] for row in rows]
+		assert all(len(page) == 5 for page in pages[:-1])
+	assert query_template_cache.get_stats()['hits'] > 0
+
+
+def test_keyset_pagination_requires_unique_key():
+	schema = make_schema('items', [('score', ColumnType.INTEGER.value, False)], score={
+		'show': True, 'order_predicate': OrderChoice.ASC.value
+	})
+	with pytest.raises(PaginationKeyError):
+		SQLQueryBuilder(schema).paginate(10)
+
+
+@pytest.fixture
+def sqlite_broker(tmp_path):
+	url = f'sqlite:///{tmp_path / "external.sqlite3"}'
+	broker = DBBroker(url, connect_args={'check_same_thread': False}, poolclass=QueuePool)
+	yield broker
+	EngineRegistry.dispose(url)
+
+
+def test_catalog_fingerprint_falls_back_to_ttl_for_other_dialects(sqlite_broker):
+	with sqlite_broker.engine.begin() as connection:
+		connection.exec_driver_sql('CREATE TABLE items (id INTEGER PRIMARY KEY)')
+	assert sqlite_broker.get_catalog_fingerprint() is None
+
+	schema_cache = SchemaCache(ttl=0)
+	loads = []
+
+	def loader():
+		loads.append(1)
+		return sqlite_broker.get_table_names()
+
+	for _ in range(2):
+		names = schema_cache.get(
+			'sqlite-test', 'table_names', loader=loader, fingerprint_loader=sqlite_broker.get_catalog_fingerprint
+		)
+		assert names == ['items']
+	assert len(loads) == 2
+
+
+@pytest.fixture
+def external_table(db, sqlite_broker):
+	"""Таблица items во внешней SQLite БД, запись Database для неё и ключ схемы в SchemaStore"""
+	with sqlite_broker.engine.begin() as connection:
+		connection.exec_driver_sql('CREATE TABLE items (id INTEGER PRIMARY KEY, score INTEGER)')
+		connection.exec_driver_sql('INSERT INTO items VALUES (1, 10), (2, NULL), (3, 30)')
+	database = models.Database.objects.create(dialect='sqlite', dbname='external', alias='external')
+	table_schema = TableSchema(name='items', db_instance=database, column_schemes=[
+		ColumnSchema(name='id', data_type=ColumnType.INTEGER.value, primary_key=True),
+		ColumnSchema(name='score', data_type=ColumnType.INTEGER.value, primary_key=False),
+	])
+	return database, schema_store.put(table_schema)
+
+
+def test_async_data_request_uses_sync_pipeline(external_table, sqlite_broker, monkeypatch):
+	database, schema_key = external_table
+	calls = []
+
+	class SQLiteAsyncDBBroker:
+		def __init__(self, connection_url, **kwargs):
+			self.connection_url = connection_url
+
+		async def run_query(self, query, params=None, limits=None, query_id=None):
+			calls.append({'limits': limits, 'query_id': query_id})
+			with sqlite_broker.engine.connect() as connection:
+				return connection.execute(sqlalchemy.text(query), params).all()
+
+	monkeypatch.setattr(views, 'AsyncDBBroker', SQLiteAsyncDBBroker)
+	monkeypatch.setattr(views.AsyncDataRequest, 'get_db_broker', lambda self: sqlite_broker)
+	monkeypatch.setitem(result_cache.options, 'default_ttl', 60)
+
+	client = Client(enforce_csrf_checks=True)
+	url = reverse('data_async', kwargs={'pk': database.pk})
+	data = {'schema_key': schema_key, 'id-show': 'on', 'score-show': 'on'}
+	first = client.post(url, data, HTTP_X_QUERY_ID='q-1')
+	second = client.post(url, data)
+
+	assert first.status_code == 200
+	assert first.json() == [{'id': 1, 'score': 10}, {'id': 2, 'score': None}, {'id': 3, 'score': 30}]
+	assert first['X-Cache'] == 'MISS' and first['X-Schema-Key'] == schema_key
+	assert second.json() == first.json() and second['X-Cache'] == 'HIT'
+	assert len(calls) == 1 and calls[0]['query_id'] == 'q-1'
+
+
+
+def test_async_data_request_reports_missing_driver(external_table, sqlite_broker, monkeypatch):
+	database, schema_key = external_table
+	database.dialect = 'postgresql'
+	database.save()
+
+	def create_async_engine(url, **kwargs):
+		raise ImportError("No module named 'asyncpg'")
+
+	monkeypatch.setattr(async_db_broker, 'create_async_engine', create_async_engine)
+	monkeypatch.setattr(views.AsyncDataRequest, 'get_db_broker', lambda self: sqlite_broker)
+	url = reverse('data_async', kwargs={'pk': database.pk})
+	response = Client().post(url, {'schema_key': schema_key, 'id-show': 'on'})
+	assert response.json() == [{'db': AsyncEngineRegistry.missing_driver_message}]
+
+def test_having_filter_uses_aggregate_result_type(sqlite_engine):
+	sqlite_engine.execute('CREATE TABLE items (id INTEGER PRIMARY KEY, category VARCHAR, tag VARCHAR)')
+	sqlite_engine.execute('INSERT INTO items VALUES (?, ?, ?)', [
+		(1, 'a', 'x'), (2, 'a', 'y'), (3, 'b', 'x'), (4, 'c', 'x'), (5, 'c', 'z'), (6, 'c', None),
+	])
+	columns = [
+		('id', ColumnType.INTEGER.value, True),
+		('category', ColumnType.CHAR.value, False),
+		('tag', ColumnType.CHAR.value, False),
+	]
+	# значение фильтра строкового столбца приходит строкой, как его сохраняет CharColumn
+	schema = make_schema(
+		'items', columns,
+		category={'show': True, 'group_by': True, 'order_predicate': OrderChoice.ASC.value},
+		tag={'show': True, 'aggregate_function': 'COUNT', 'where_predicate': '>', 'where_value': '1'},
+	)
+	query, params = SQLQueryBuilder(schema).build_sql_query()
+	assert 'HAVING COUNT(tag) > :' in query
+	assert list(params.values()) == [1]
+	with sqlite_engine.connect() as connection:
+		rows = [tuple(row) for row in connection.execute(sqlalchemy.text(query), params)]
+	assert rows == [('a', 2), ('c', 2)]
+
+
+@pytest.mark.parametrize('params', [
+	{'where_predicate': '%LIKE%', 'where_value': 'x'},
+	{'where_predicate': '>', 'where_value': 'x'},
+])
+def test_formset_rejects_filter_unfit_for_aggregate(params):
+	schema = make_schema('items', [('tag', ColumnType.CHAR.value, False)])
+	instance = ColumnParams('tag', 1, show=True, aggregate_function='COUNT', **params)
+	formset = SQLFormSet(schema, [ColumnFormPlaceholder(instance, 'tag')])
+	assert formset.errors == {'tag': [Message.INVALID_AGGREGATE_FILTER.value]}
+
+
+@pytest.fixture
+def numbers_broker(sqlite_broker):
+	with sqlite_broker.engine.begin() as connection:
+		connection.exec_driver_sql('CREATE TABLE numbers (n INTEGER)')
+		connection.exec_driver_sql('INSERT INTO numbers VALUES ' + ', '.join(f'({i})' for i in range(25)))
+	return sqlite_broker
+
+
+@pytest.mark.parametrize('limits, error', [
+	(QueryLimits(max_rows=24), DBBroker.errors['max_rows']),
+	(QueryLimits(max_bytes=20), DBBroker.errors['max_bytes']),
+])
+def test_run_query_stops_reading_over_limit(numbers_broker, monkeypatch, limits, error):
+	monkeypatch.setattr(numbers_broker, 'stream_chunk_size', 10)
+	with pytest.raises(QueryLimitError, match=error):
+		numbers_broker.run_query('SELECT n FROM numbers', limits=limits)
+	rows = numbers_broker.run_query('SELECT n FROM numbers', limits=QueryLimits(max_rows=25, max_bytes=40))
+	assert len(rows) == 25
+
+
+def test_stream_query_applies_limits(numbers_broker):
+	stream = numbers_broker.stream_query('SELECT n FROM numbers', chunk_size=10, limits=QueryLimits(max_rows=15))
+	partitions = []
+	with pytest.raises(QueryLimitError, match=DBBroker.errors['max_rows']):
+		for partition in stream:
+			partitions.append(partition)
+	assert [len(partition) for partition in partitions] == [10]
+
+
+def test_copy_stream_applies_max_bytes():
+	def run_copy(sink):
+		for _ in range(4):
+			sink.write(b'x' * 10)
+
+	chunks = []
+	with pytest.raises(QueryLimitError, match=DBBroker.errors['max_bytes']):
+		for chunk in CopyStream(run_copy, QueryLimits(max_bytes=25)):
+			chunks.append(chunk)
+	assert chunks == [b'x' * 10] * 2
+
+
+def test_export_limits_prefer_table_over_database(db):
+	database = models.Database.objects.create(
+		dialect='sqlite', dbname='external', alias='external', max_rows=100, max_bytes=1000
+	)
+	table = models.Table.objects.create(name='items', alias='items', database=database, max_rows=10)
+	job = models.ExportJob(database=database, table=table, table_name='items', query='SELECT 1')
+	limits = ExportJobRunner.get_query_limits(job)
+	assert (limits.max_rows, limits.max_bytes) == (10, 1000)
+	job.table = None
+	assert ExportJobRunner.get_query_limits(job).max_rows == 100
+
+
+
+def test_data_request_ignores_table_of_other_database(db):
+	database = models.Database.objects.create(dialect='sqlite', dbname='a', alias='a', max_rows=10)
+	other_database = models.Database.objects.create(dialect='sqlite', dbname='b', alias='b')
+	other_table = models.Table.objects.create(
+		name='items', alias='items', database=other_database, max_rows=1000, result_cache_ttl=60
+	)
+	view = views.DataRequestAPIView()
+	view.kwargs = {'pk': database.pk}
+	view.schema = TableSchema(name='items', pk=other_table.pk, db_pk=database.pk)
+	assert view.get_table() is None
+	assert view.get_query_limits().max_rows == 10
+
+	table = models.Table.objects.create(name='items', alias='items', database=database, max_rows=5)
+	view = views.DataRequestAPIView()
+	view.kwargs = {'pk': database.pk}
+	view.schema = TableSchema(name='items', pk=table.pk, db_pk=database.pk)
+	assert view.get_table() == table and view.get_query_limits().max_rows == 5
+
+class PlanBroker:
+	"""Возвращает заданный план вместо EXPLAIN и запоминает переданные ограничения"""
+
+	def __init__(self, plan=None):
+		self.plan = plan
+		self.limits = []
+
+	def explain(self, query, params=None, limits=None):
+		self.limits.append(limits)
+		if self.plan is None:
+			raise NotImplementedError()
+		return QueryPlan(self.plan)
+
+
+@pytest.mark.parametrize('mode, warnings', [
+	(PlanGuardMode.WARN, [Message.PLAN_COST_EXCEEDED.value, Message.PLAN_ROWS_EXCEEDED.value]),
+	(PlanGuardMode.REJECT, None),
+])
+def test_cost_guard_checks_plan_estimates(mode, warnings):
+	broker = PlanBroker({'Total Cost': 1500.0, 'Plan Rows': 200})
+	guard = QueryCostGuard(mode, max_cost=1000, max_rows=100)
+	limits = QueryLimits(statement_timeout=500)
+	if warnings is None:
+		with pytest.raises(QueryCostError):
+			guard.check(broker, 'SELECT 1', {}, limits)
+	else:
+		assert guard.check(broker, 'SELECT 1', {}, limits) == warnings
+	assert broker.limits == [limits]
+	assert QueryCostGuard(mode, max_cost=2000, max_rows=300).check(broker, 'SELECT 1', {}) == []
+
+
+def test_cost_guard_skips_disabled_and_unsupported():
+	broker = PlanBroker({'Total Cost': 1500.0, 'Plan Rows': 200})
+	assert QueryCostGuard(PlanGuardMode.OFF, max_cost=1).check(broker, 'SELECT 1', {}) == []
+	assert QueryCostGuard(PlanGuardMode.REJECT).check(broker, 'SELECT 1', {}) == []
+	assert broker.limits == []
+	assert QueryCostGuard(PlanGuardMode.REJECT, max_cost=1).check(PlanBroker(), 'SELECT 1', {}) == []
+
+
+def test_export_job_params_keep_types(db):
+	database = models.Database.objects.create(dialect='sqlite', dbname='external', alias='external')
+	params = {
+		'p1': datetime.date(2024, 1, 2),
+		'p2': datetime.datetime(2024, 1, 2, 3, 4, 5, 6),
+		'p3': datetime.timedelta(hours=1, microseconds=5),
+		'p4': decimal.Decimal('1.10'),
+		'p5': 'текст',
+		'p6': 7,
+	}
+	job = models.ExportJob.objects.create(
+		database=database, table_name='items', query='SELECT 1', params=dump_params(params)
+	)
+	job.refresh_from_db()
+	assert load_params(job.params) == params
+	assert [type(value) for value in load_params(job.params).values()] == [type(value) for value in params.values()]
+
+
+
+@pytest.fixture
+def export_database(db):
+	return models.Database.objects.create(dialect='sqlite', dbname='external', alias='external')
+
+
+def test_export_job_is_claimed_by_one_worker(export_database):
+	job = models.ExportJob.objects.create(database=export_database, table_name='items', query='SELECT 1')
+	first, second = ExportQueue('worker-1'), ExportQueue('worker-2')
+	assert first.get_pending() == second.get_pending() == [job.pk]
+	claimed = first.claim_job(job.pk)
+	assert second.claim_job(job.pk) is None and second.claim() is None
+	assert (claimed.status, claimed.worker) == (ExportStatus.RUNNING, 'worker-1')
+
+
+def test_worker_pool_requeues_stale_jobs_while_running(export_database, monkeypatch):
+	clock = [1000.0]
+	monkeypatch.setattr(export_jobs.time, 'monotonic', lambda: clock[0])
+	stale = timezone.now() - datetime.timedelta(seconds=120)
+	job = models.ExportJob.objects.create(
+		database=export_database, table_name='items', query='SELECT 1',
+		status=ExportStatus.RUNNING, worker='lost', heartbeat_at=stale
+	)
+	pool = ExportWorkerPool(workers=0, stale_timeout=60, requeue_interval=30)
+	pool.requeue_stale()
+	job.refresh_from_db()
+	assert (job.status, job.worker) == (ExportStatus.PENDING, '')
+
+	models.ExportJob.objects.filter(pk=job.pk).update(status=ExportStatus.RUNNING, heartbeat_at=stale)
+	pool.requeue_stale()
+	assert models.ExportJob.objects.get(pk=job.pk).status == ExportStatus.RUNNING
+	clock[0] += 30
+	pool.requeue_stale()
+	assert models.ExportJob.objects.get(pk=job.pk).status == ExportStatus.PENDING
+
+
+@pytest.mark.parametrize('header, size, expected', [
+	(None, 100, None),
+	('items=0-9', 100, None),
+	('bytes=0-9,20-29', 100, None),
+	('bytes=0-9', 100, (0, 9)),
+	('bytes=90-', 100, (90, 99)),
+	('bytes=90-500', 100, (90, 99)),
+	('bytes=-10', 100, (90, 99)),
+	('bytes=-500', 100, (0, 99)),
+	('bytes=100-', 100, ValueError),
+	('bytes=9-0', 100, ValueError),
+	('bytes=-0', 100, ValueError),
+	('bytes=-10', 0, ValueError),
+])
+def test_parse_byte_range(header, size, expected):
+	if expected is ValueError:
+		with pytest.raises(ValueError):
+			parse_byte_range(header, size)
+	else:
+		assert parse_byte_range(header, size) == expected
+
+
+def test_read_file_range_stops_at_end_of_file(tmp_path):
+	path = tmp_path / 'export.bin'
+	path.write_bytes(bytes(range(10)))
+	assert list(read_file_range(str(path), 2, 6, block_size=2)) == [bytes([2, 3]), bytes([4, 5]), bytes([6])]
+	assert b''.join(read_file_range(str(path), 8, 20)) == bytes([8, 9])
+
+
+def test_export_download_serves_ranges(export_database, tmp_path):
+	path = tmp_path / 'items.csv.gz'
+	path.write_bytes(b'0123456789')
+	job = models.ExportJob.objects.create(
+		database=export_database, table_name='items', query='SELECT 1', output_format=ExportFormat.CSV_GZ,
+		status=ExportStatus.DONE, file_path=str(path)
+	)
+	url = reverse('export_download', kwargs={'pk': job.pk})
+	client = Client()
+	partial = client.get(url, HTTP_RANGE='bytes=-3')
+	assert partial.status_code == 206 and b''.join(partial.streaming_content) == b'789'
+	assert partial['Content-Range'] == 'bytes 7-9/10' and partial['Content-Length'] == '3'
+	full = client.get(url)
+	assert full.status_code == 200 and b''.join(full.streaming_content) == b'0123456789'
+	unsatisfiable = client.get(url, HTTP_RANGE='bytes=10-')
+	assert unsatisfiable.status_code == 416 and unsatisfiable['Content-Range'] == 'bytes */10'
+
+def test_parquet_export_writer_uses_column_types(tmp_path):
+	pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+	output_columns = [
+		('id', ColumnType.INTEGER.value),
+		('created', ColumnType.DATE.value),
+		('score', ColumnType.FLOAT.value),
+		('note', None),
+	]
+	keys = [name for name, _ in output_columns]
+	path = tmp_path / 'items.parquet'
+	writer = ParquetExportWriter(str(path), keys, output_columns)
+	writer.write([(None, None, None, None)])
+	writer.write([(1, datetime.date(2024, 1, 2), decimal.Decimal('1.5'), 'x')])
+	writer.close()
+	table = pyarrow_parquet.read_table(str(path))
+	assert [str(field.type) for field in table.schema] == ['int64', 'date32[day]', 'double', 'string']
+	assert table.to_pylist()[1] == {'id': 1, 'created': datetime.date(2024, 1, 2), 'score': 1.5, 'note': 'x'}
+
+	empty_path = tmp_path / 'empty.parquet'
+	ParquetExportWriter(str(empty_path), keys, output_columns).close()
+	assert pyarrow_parquet.read_table(str(empty_path)).schema == table.schema
+
+
+def test_csv_gzip_export_writer(tmp_path):
+	path = tmp_path / 'items.csv.gz'
+	writer = CSVGzipExportWriter(str(path), ['id', 'name'])
+	writer.write([(1, 'a'), (2, None)])
+	writer.close()
+	with gzip.open(path, 'rt', encoding='utf-8', newline='') as file:
+		assert list(csv.reader(file)) == [['id', 'name'], ['1', 'a'], ['2', '']]
+
+
+def test_stream_trace_is_emitted_after_response_is_consumed(external_table, sqlite_broker, monkeypatch):
+	database, schema_key = external_table
+	traces = []
+
+	class RecordingHooks:
+		@classmethod
+		def emit(cls, trace, response=None):
+			traces.append((trace.as_dict(), response))
+
+	monkeypatch.setattr(views.DataStreamAPIView, 'trace_hooks', RecordingHooks)
+	monkeypatch.setattr(views.DataStreamAPIView, 'get_db_broker', lambda self: sqlite_broker)
+	url = reverse('data_stream', kwargs={'pk': database.pk}) + '?output=ndjson'
+	response = Client().post(url, {'schema_key': schema_key, 'id-show': 'on'})
+	assert response.status_code == 200 and traces == []
+
+	content = b''.join(response.streaming_content)
+	response.close()
+	assert content.count(b'\n') == 3
+	assert len(traces) == 1
+	data, emitted_response = traces[0]
+	assert emitted_response is None
+	assert data['bytes'] == len(content) and 'stream' in data['spans_ms']
+
+
+def test_schema_codec_round_trip():
+	schema = TableSchema(name='товары', pk=3, db_pk=5, column_schemes=[
+		ColumnSchema(name='id', data_type=ColumnType.INTEGER.value, primary_key=True),
+		ColumnSchema(name='название', data_type=ColumnType.CHAR.value),
+		ColumnSchema(name='code', data_type=ColumnType.CHAR.value, primary_key=True),
+		ColumnSchema(name='created', data_type=ColumnType.DATETIME.value),
+	])
+	decoded = TableSchemaCodec.loads(TableSchemaCodec.dumps(schema))
+	assert (decoded.name, decoded.pk, decoded.db_pk) == ('товары', 3, 5)
+	assert [(c.name, c.data_type, c.primary_key) for c in decoded] == [
+		(c.name, c.data_type, c.primary_key) for c in schema
+	]
+	# строки типов берутся из ColumnType, а не создаются при каждой загрузке
+	assert decoded.column_schemes[1].data_type is TableSchemaCodec.data_types[ColumnType.CHAR.value]
+	assert TableSchemaCodec.to_bytes(decoded) == TableSchemaCodec.to_bytes(schema)
+
+
+@pytest.mark.parametrize('data', [
+	b'',
+	b'\x02' + TableSchemaCodec.to_bytes(TableSchema(name='t'))[1:],
+	b'\x01not zlib',
+	bytes((TableSchemaCodec.version,)) + zlib.compress(b'["t",null,null,["unknown"],["a"],[0],[]]'),
+	bytes((TableSchemaCodec.version,)) + zlib.compress(b'["t",null,null,["int"],["a","b"],[0],[]]'),
+])
+def test_schema_codec_rejects_invalid_data(data):
+	with pytest.raises(SchemaDecodeError):
+		TableSchemaCodec.from_bytes(data)
+
+
+def test_table_schema_field_reports_invalid_schema():
+	field = TableSchemaField()
+	schema = TableSchema(name='t', column_schemes=[ColumnSchema(name='a', data_type=ColumnType.INTEGER.value)])
+	assert field.clean(field.prepare_value(schema)).name == 't'
+	with pytest.raises(ValidationError) as e:
+		field.clean('@@@')
+	assert e.value.messages == [Message.INVALID_SCHEMA.value]
+
+
+@pytest.fixture
+def isolated_schema_store():
+	encoded = []
+
+	class CountingCodec(TableSchemaCodec):
+		@classmethod
+		def to_bytes(cls, table_schema):
+			encoded.append(table_schema.name)
+			return super().to_bytes(table_schema)
+
+	store = SchemaStore()
+	store.codec = CountingCodec
+	cache.clear()
+	yield store, encoded
+	cache.clear()
+
+
+def test_schema_store_encodes_each_schema_once(isolated_schema_store):
+	store, encoded = isolated_schema_store
+	columns = [('id', ColumnType.INTEGER.value, True), ('name', ColumnType.CHAR.value, False)]
+	key = store.put(make_schema('items', columns))
+	assert store.put(make_schema('items', columns)) == key
+	assert store.put(store.get(key)) == key
+	assert encoded == ['items']
+	assert store.put(make_schema('items', columns[:1])) != key
+	assert encoded == ['items', 'items']
+
+
+def test_schema_store_restores_evicted_shared_entry(isolated_schema_store):
+	store, _ = isolated_schema_store
+	key = store.put(make_schema('items', [('id', ColumnType.INTEGER.value, True)]))
+	cache.clear()
+	assert store.put(make_schema('items', [('id', ColumnType.INTEGER.value, True)])) == key
+	store.local_cache.clear()
+	assert store.get(key).name == 'items'
+
+
+def test_stored_schema_of_other_database_is_rejected(external_table, sqlite_broker, monkeypatch):
+	database, _ = external_table
+	other = models.Database.objects.create(dialect='sqlite', dbname='other', alias='other')
+	schema_key = schema_store.put(TableSchema(name='items', db_pk=other.pk, column_schemes=[
+		ColumnSchema(name='id', data_type=ColumnType.INTEGER.value, primary_key=True),
+	]))
+	monkeypatch.setattr(views.DataRequestAPIView, 'get_db_broker', lambda self: sqlite_broker)
+	request = RequestFactory().post('/data/', {'schema_key': schema_key, 'id-show': 'on'})
+	response = views.DataRequestAPIView.as_view()(request, pk=database.pk)
+	assert response.status_code == 200
+	assert response.data == [{'db': Message.SCHEMA_DATABASE_MISMATCH.value}]
+	assert 'X-Schema-Key' not in response
+
+
+class ColumnParamsForm(forms.Form):
+	name = forms.CharField()
+	position = forms.IntegerField()
+	show = forms.BooleanField(required=False, initial=True)
+	where_predicate = forms.ChoiceField(choices=[('', '---'), ('>', '>')], required=False)
+	where_value = forms.IntegerField(required=False)
+
+
+def test_partial_column_data_fills_defaults_from_schema():
+	schema = make_schema('items', [('id', ColumnType.INTEGER.value, True), ('score', ColumnType.INTEGER.value, False)])
+	match = {ColumnType.INTEGER.value: ColumnParamsForm}
+	data = PartialColumnData(schema, {'score-where_predicate': '>', 'score-where_value': '5'}, match)
+	assert data['score-where_value'] == '5'
+	assert (data['score-name'], data['score-position']) == ('score', '2')
+	assert data['id-show'] == get_form_defaults(ColumnParamsForm)['show'] == 'True'
+	assert 'id-unknown' not in data and 'other-show' not in data
+	assert set(data) == {f'{prefix}-{field}' for prefix in ('id', 'score') for field in ColumnParamsForm.base_fields}
+
+
+def test_column_change_detector_compares_parsed_values():
+	schema = make_schema('items', [('id', ColumnType.INTEGER.value, True), ('score', ColumnType.INTEGER.value, False)])
+	match = {ColumnType.INTEGER.value: ColumnParamsForm}
+	initial = {**get_form_defaults(ColumnParamsForm), 'name': 'score', 'position': '2'}
+	# флажок, переданный как 'on', для виджета совпадает со значением по умолчанию True
+	detector = ColumnChangeDetector(PartialColumnData(schema, {'score-show': 'on'}, match))
+	assert not detector.is_changed(ColumnParamsForm, 'score', initial)
+	assert not detector.is_changed(ColumnParamsForm, 'id', {**initial, 'name': 'id', 'position': '1'})
+	detector = ColumnChangeDetector(PartialColumnData(schema, {'score-show': 'false'}, match))
+	assert detector.is_changed(ColumnParamsForm, 'score', initial)
+	detector = ColumnChangeDetector({f'score-{name}': value for name, value in initial.items()})
+	assert not detector.is_changed(ColumnParamsForm, 'score', initial)
+
+
+def validate_spec(spec, max_page_size=100):
+	schema = TableSchema(name='items', column_schemes=[
+		ColumnSchema(name='id', data_type=ColumnType.INTEGER.value, primary_key=True),
+		ColumnSchema(name='category', data_type=ColumnType.CHAR.value),
+		ColumnSchema(name='tag', data_type=ColumnType.CHAR.value),
+	])
+	serializer = QuerySpecSerializer(
+		data={'table': 'items', **spec}, context={'table_schema': schema, 'max_page_size': max_page_size}
+	)
+	serializer.is_valid()
+	return serializer
+
+
+def test_query_spec_validates_aggregate_filter_by_result_type():
+	columns = ['category', {'name': 'tag', 'aggregate': 'COUNT'}]
+	serializer = validate_spec({
+		'columns': columns, 'group_by': ['category'], 'filters': [{'column': 'tag', 'op': '>', 'value': '1'}]
+	})
+	assert serializer.errors == {}
+	tag = {column.name: column for column in serializer.save()}['tag']
+	assert (tag.instance.where_predicate, tag.instance.where_value) == ('>', 1)
+
+	serializer = validate_spec({
+		'columns': columns, 'group_by': ['category'], 'filters': [{'column': 'tag', 'op': '%LIKE%', 'value': 'x'}]
+	})
+	assert serializer.errors == {'filters': [f'tag: {Message.INVALID_FILTER.value}']}
+
+
+@pytest.mark.parametrize('spec, errors', [
+	({'columns': ['id'], 'limit': 101}, {'limit': [Message.PAGE_SIZE_EXCEEDED.value]}),
+	({'columns': ['id'], 'cursor': 'abc'}, {'cursor': [Message.CURSOR_WITHOUT_LIMIT.value]}),
+	({'columns': ['missing']}, {'columns': [f'missing: {Message.UNKNOWN_COLUMN.value}']}),
+	({'columns': ['id', {'name': 'tag', 'aggregate': 'COUNT'}]}, {'id': [Message.UNGROUPED_COLUMN.value]}),
+])
+def test_query_spec_rejects_invalid_spec(spec, errors):
+	assert validate_spec(spec).errors == errors
+
+
+def test_query_spec_view_paginates_and_rejects_oversized_page(external_table, sqlite_broker, monkeypatch):
+	database, _ = external_table
+	monkeypatch.setattr(models.Database, 'get_connection_url', lambda self: sqlite_broker.connection_url)
+	# конвертер столбцов SQLAlchemy не поддерживает SQLite, поэтому отражение таблицы подменяется
+	monkeypatch.setattr(views.QuerySpecSchemaBuilder, 'reflect_table', lambda self, db_broker, database, name: (
+		name, (('id', ColumnType.INTEGER.value, True), ('score', ColumnType.INTEGER.value, False))
+	))
+	client = Client()
+	url = reverse('data_query', kwargs={'pk': database.pk})
+	spec = {'table': 'items', 'columns': ['id', 'score'], 'order': [{'column': 'id'}]}
+
+	oversized = {**spec, 'limit': views.QuerySpecAPIView.max_page_size + 1}
+	response = client.post(url, oversized, content_type='application/json')
+	assert response.status_code == 400 and response.json() == {'limit': [Message.PAGE_SIZE_EXCEEDED.value]}
+
+	first = client.post(url, {**spec, 'limit': 2}, content_type='application/json')
+	assert first.status_code == 200 and [row['id'] for row in first.json()] == [1, 2]
+	next_page = {**spec, 'limit': 2, 'cursor': first['X-Next-Cursor']}
+	second = client.post(url, next_page, content_type='application/json')
+	assert [row['id'] for row in second.json()] == [3] and 'X-Next-Cursor' not in second
+
+
+def test_engine_registry_shares_engine_until_database_changes(db, tmp_path):
+	database = models.Database.objects.create(dialect='sqlite', dbname=str(tmp_path / 'pool.sqlite3'), alias='pool')
+	url = database.get_connection_url()
+	engine = DBBroker(url, connect_args={}, poolclass=QueuePool).engine
+	try:
+		assert DBBroker(url).engine is engine
+		database.alias = 'renamed'
+		database.save()
+		assert DBBroker(url, connect_args={}, poolclass=QueuePool).engine is not engine
+	finally:
+		EngineRegistry.dispose(url)
+
+
+@pytest.mark.parametrize('stream_format', [StreamFormat.NDJSON.value, StreamFormat.JSON.value])
+def test_json_stream_writers_serialize_partitions(stream_format):
+	writer = StreamWriterFactory().get_writer(stream_format)
+	partitions = [[(1, datetime.date(2024, 1, 2))], [], [(2, None)]]
+	content = ''.join(writer.write(['id', 'day'], partitions))
+	if stream_format == StreamFormat.NDJSON.value:
+		rows = [json.loads(line) for line in content.splitlines()]
+	else:
+		rows = json.loads(content)
+	assert rows == [{'id': 1, 'day': '2024-01-02'}, {'id': 2, 'day': None}]
+
+
+def test_csv_stream_writer_writes_header_once():
+	writer = StreamWriterFactory().get_writer(StreamFormat.CSV.value)
+	content = ''.join(writer.write(['id', 'name'], [[(1, 'a,b')], [(2, 'c')]]))
+	assert list(csv.reader(content.splitlines())) == [['id', 'name'], ['1', 'a,b'], ['2', 'c']]
+
+
+def test_stream_writer_factory_rejects_unknown_format():
+	with pytest.raises(NotImplementedError):
+		StreamWriterFactory().get_writer('xml')
+
+
+def test_broker_reflects_requested_table_only(sqlite_broker):
+	with sqlite_broker.engine.begin() as connection:
+		connection.exec_driver_sql('CREATE TABLE items (id INTEGER PRIMARY KEY, score INTEGER)')
+		connection.exec_driver_sql('CREATE TABLE other (id INTEGER PRIMARY KEY)')
+	assert sorted(sqlite_broker.get_table_names()) == ['items', 'other']
+	table = sqlite_broker.get_table('items')
+	assert [column.name for column in table.columns] == ['id', 'score']
+	assert list(table.metadata.tables) == ['items']
+	assert list(TableSchema(name='items')) == []
+
+
+@pytest.fixture
+def local_table(db):
+	database = models.Database.objects.create(dialect='sqlite', dbname='local', alias='local')
+	table = models.Table.objects.create(name='items', alias='items', database=database)
+	relation = {'content_type': ContentType.objects.get_for_model(models.Table), 'object_id': table.pk, 'where_not': False}
+	models.CharColumn.objects.create(name='title', position=2, **relation)
+	models.IntegerColumn.objects.create(name='id', position=1, **relation)
+	return table, relation
+
+
+def test_columns_of_all_types_are_loaded_in_one_query(local_table, django_assert_num_queries):
+	table, _ = local_table
+	table = models.Table.objects.get(pk=table.pk)
+	with django_assert_num_queries(1):
+		columns = list(table.get_columns())
+		assert list(table.get_columns()) == columns
+	assert [(type(column), column.name) for column in columns] == [
+		(models.IntegerColumn, 'id'), (models.CharColumn, 'title')
+	]
+	assert columns[1].pk is not None and columns[1].show is True
+
+
+def test_formset_bulk_save_writes_only_changed_columns(local_table, django_assert_num_queries):
+	table, relation = local_table
+	form_class = forms.modelform_factory(models.IntegerColumn, fields=['name', 'position', 'show'])
+	existing = models.IntegerColumn.objects.get(name='id')
+	changed = form_class({'name': 'id', 'position': 1}, instance=existing)
+	added = form_class({'name': 'count', 'position': 3, 'show': True}, instance=models.IntegerColumn(**relation))
+	unchanged = form_class({'name': 'title', 'position': 2, 'show': True}, instance=models.CharColumn.objects.get())
+	formset = SQLFormSet(None, [changed, added, unchanged])
+	assert not any(form.errors for form in formset.forms)
+	with django_assert_num_queries(4):
+		formset.bulk_save()
+	assert models.IntegerColumn.objects.get(pk=existing.pk).show is False
+	assert models.IntegerColumn.objects.filter(name='count').exists()
+
+	invalid = form_class({'name': ''}, instance=existing)
+	with pytest.raises(ValueError):
+		SQLFormSet(None, [invalid]).bulk_save()
+
+
+def test_query_template_is_reused_for_other_parameter_values():
+	query_template_cache.clear()
+
+	def build(value, predicate='>'):
+		schema = make_schema('items', [('id', ColumnType.INTEGER.value, True)], id={
+			'show': True, 'where_predicate': predicate, 'where_value': value
+		})
+		return SQLQueryBuilder(schema).build_sql_query()
+
+	query, params = build(10)
+	other_query, other_params = build(20)
+	assert other_query == query
+	assert list(params.values()) == [10] and list(other_params.values()) == [20]
+	assert build(10, '<')[0] != query
+	assert query_template_cache.get_stats()['hits'] == 1
+	assert query_template_cache.get_stats()['misses'] == 2
+
+
+
+def test_query_template_hit_fills_params_like_compilation(monkeypatch):
+	def build(page_size, cursor, use_cache=True):
+		schema = make_schema('items', [
+			('tag', ColumnType.CHAR.value, False),
+			('score', ColumnType.INTEGER.value, False),
+			('day', ColumnType.DATE.value, False),
+		], tag={
+			'show': True, 'group_by': True, 'where_predicate': '=', 'where_value': 'a'
+		}, score={
+			'show': True, 'aggregate_function': 'SUM', 'where_predicate': '>', 'where_value': 5,
+			'order_predicate': OrderChoice.DESC.value
+		}, day={
+			'where_from_value': datetime.date(2024, 1, 1)
+		})
+		query_builder = SQLQueryBuilder(schema)
+		if not use_cache:
+			query_builder.template_cache = None
+		query_builder.paginate(page_size, cursor)
+		return query_builder.build_sql_query()
+
+	query_template_cache.clear()
+	cursor = KeysetCursor.encode(['SUM(score)', 'tag'], [10, 'b'])
+	assert build(5, cursor) == build(5, cursor, use_cache=False)
+	calls = []
+	get_condition_builder = SQLQueryBuilder.get_condition_builder
+
+	def counting_condition_builder(self, column):
+		calls.append(column.name)
+		return get_condition_builder(self, column)
+
+	monkeypatch.setattr(SQLQueryBuilder, 'get_condition_builder', counting_condition_builder)
+	query, params = build(10, cursor)
+	assert query_template_cache.get_stats()['hits'] == 1
+	assert sorted(calls) == ['day', 'score', 'tag']
+	monkeypatch.undo()
+	assert (query, params) == build(10, cursor, use_cache=False)
+	assert list(params.values())[-1] == 11
+
+def test_prepared_statement_params_become_positional():
+	query, names = PreparedStatementCache.to_positional(
+		'SELECT "a:b", \'x:y\', a::text FROM t WHERE a > :p0 AND b < :p1 OR a = :p0'
+	)
+	assert query == 'SELECT "a:b", \'x:y\', a::text FROM t WHERE a > $1 AND b < $2 OR a = $1'
+	assert names == ['p0', 'p1']
+
+
+def test_prepared_statement_cache_deallocates_evicted_statements():
+	class Connection:
+		def __init__(self):
+			self.info = {}
+			self.statements = []
+
+		def exec_driver_sql(self, statement):
+			self.statements.append(statement)
+
+	connection = Connection()
+	statement_cache = PreparedStatementCache.for_connection(connection, max_statements=1)
+	assert PreparedStatementCache.for_connection(connection, max_statements=1) is statement_cache
+	first = statement_cache.prepare(connection, 'SELECT :p0')
+	assert statement_cache.prepare(connection, 'SELECT :p0') == first
+	statement_cache.prepare(connection, 'SELECT :p0 + 1')
+	assert connection.statements == [
+		'PREPARE tb_stmt_0 AS SELECT $1',
+		'PREPARE tb_stmt_1 AS SELECT $1 + 1',
+		'DEALLOCATE tb_stmt_0',
+	]
+
+
+def test_result_cache_keeps_typed_rows_within_byte_budget():
+	key = ResultCache.make_key(1, 'SELECT 1', {'p0': datetime.date(2024, 1, 2)})
+	assert key == ResultCache.make_key(1, 'SELECT 1', {'p0': datetime.date(2024, 1, 2)})
+	assert key != ResultCache.make_key(2, 'SELECT 1', {'p0': datetime.date(2024, 1, 2)})
+	moment = datetime.datetime(2024, 1, 2, 3, 4, 5, 123100)
+	assert ResultCache.make_key(1, 'SELECT 1', {'p0': moment}) != ResultCache.make_key(
+		1, 'SELECT 1', {'p0': moment.replace(microsecond=123900)}
+	)
+	assert ResultCache.make_key(1, 'SELECT 1', {'p0': '2024-01-02'}) != ResultCache.make_key(
+		1, 'SELECT 1', {'p0': datetime.date(2024, 1, 2)}
+	)
+
+	rows = [(1, decimal.Decimal('1.50'), None)]
+	cache = ResultCache()
+	cache.set(key, ['id', 'price', 'note'], rows, ttl=60)
+	entry = cache.get(key)
+	assert entry.rows == rows and entry.age == 0
+	assert entry.as_dicts() == [{'id': 1, 'price': decimal.Decimal('1.50'), 'note': None}]
+
+	cache = ResultCache(max_bytes=cache.size * 3 // 2)
+	cache.set('first', ['id', 'price', 'note'], rows, ttl=60)
+	cache.set('second', ['id', 'price', 'note'], rows, ttl=60)
+	assert cache.get('first') is None and cache.get('second') is not None
+	cache.set('expired', ['id'], [(1,)], ttl=-1)
+	assert cache.get('expired') is None
+
+
+def test_summary_query_counts_filtered_rows_and_aggregates_shown_columns(numbers_broker):
+	schema = make_schema('numbers', [('n', ColumnType.INTEGER.value, True)], n={
+		'show': True, 'where_predicate': '<', 'where_value': 10
+	})
+	query_builder = SQLSummaryQueryBuilder(schema)
+	query, params = query_builder.build_sql_query()
+	with numbers_broker.engine.connect() as connection:
+		row = connection.execute(sqlalchemy.text(query), params).mappings().one()
+	assert query_builder.parse_summary(row) == {
+		'count': 10, 'columns': {'n': {'min': 0, 'max': 9, 'sum': 45, 'avg': 4.5}}
+	}
+	assert 'MIN' not in SQLSummaryQueryBuilder(schema, with_aggregates=False).build_sql_query()[0]
+	with pytest.raises(NotImplementedError):
+		query_builder.paginate(10)
+
+
+def test_arrow_serializer_types_columns_and_drops_cursor_values():
+	pyarrow_ipc = pytest.importorskip('pyarrow.ipc')
+	output_columns = [('id', ColumnType.INTEGER.value), ('price', ColumnType.FLOAT.value)]
+	rows = [(1, decimal.Decimal('1.5'), 'cursor'), (2, None, 'cursor')]
+	content = ArrowIPCSerializer().to_bytes(ColumnarResult(output_columns, rows))
+	table = pyarrow_ipc.open_stream(content).read_all()
+	assert [str(field.type) for field in table.schema] == ['int64', 'double']
+	assert table.to_pylist() == [{'id': 1, 'price': 1.5}, {'id': 2, 'price': None}]
+
+	empty = pyarrow_ipc.open_stream(ArrowIPCSerializer().to_bytes(ColumnarResult(output_columns, []))).read_all()
+	assert empty.schema == table.schema and empty.num_rows == 0
+
+
+
+def test_columnar_formats_report_missing_pyarrow(monkeypatch):
+	monkeypatch.setitem(sys.modules, 'pyarrow', None)
+	with pytest.raises(ImproperlyConfigured, match='pyarrow'):
+		ArrowBatchBuilder([('id', ColumnType.INTEGER.value)])
+
+def test_parquet_stream_writer_writes_each_partition():
+	pyarrow_parquet = pytest.importorskip('pyarrow.parquet')
+	writer = StreamWriterFactory().get_writer(StreamFormat.PARQUET.value, [('day', ColumnType.DATE.value)])
+	content = b''.join(writer.write(['day'], [[(datetime.date(2024, 1, 1),)], [(datetime.date(2024, 1, 2),)]]))
+	parquet_file = pyarrow_parquet.ParquetFile(io.BytesIO(content))
+	assert parquet_file.metadata.num_row_groups == 2
+	assert parquet_file.read().column('day').to_pylist() == [datetime.date(2024, 1, 1), datetime.date(2024, 1, 2)]
+
+
+def test_tuple_csv_renderer_writes_header_from_output_columns(monkeypatch):
+	monkeypatch.setattr(TupleCSVRenderer, 'chunk_size', 1)
+	result = ColumnarResult([('id', ColumnType.INTEGER.value), ('title', ColumnType.CHAR.value)], [
+		(1, 'a "quoted", value'), (2, None)
+	])
+	content = TupleCSVRenderer().render(result).decode()
+	assert list(csv.reader(content.splitlines())) == [['id', 'title'], ['1', 'a "quoted", value'], ['2', '']]
+	with pytest.raises(TypeError):
+		TupleCSVRenderer().render([{'id': 1}])
+
+
+def test_binary_copy_sql_inlines_params_and_limits_rows(sqlite_broker):
+	class Cursor:
+		def mogrify(self, query, params):
+			return (query % {name: repr(value) for name, value in params.items()}).encode()
+
+	copy_sql = sqlite_broker.build_copy_sql(
+		Cursor(), 'SELECT "a:b" FROM t WHERE name LIKE \'%x\' AND id > :p0', {'p0': 5}, 'binary', max_rows=10
+	)
+	assert copy_sql == (
+		b'COPY (SELECT * FROM (SELECT "a:b" FROM t WHERE name LIKE \'%x\' AND id > 5) AS limited_result LIMIT 11)'
+		b' TO STDOUT WITH (FORMAT binary)'
+	)
+	with pytest.raises(NotImplementedError):
+		sqlite_broker.copy_query('SELECT 1', copy_format='binary')
+
+
+class AsyncEngine:
+	def __init__(self):
+		self.disposed = False
+
+	async def dispose(self):
+		self.disposed = True
+
+
+def test_async_engine_is_disposed_when_database_changes(db, monkeypatch):
+	monkeypatch.setattr(async_db_broker, 'create_async_engine', lambda url, **kwargs: AsyncEngine())
+	database = models.Database.objects.create(dialect='postgresql', dbname='external', alias='external')
+	engine = AsyncEngineRegistry.get_engine(database.get_connection_url())
+	database.alias = 'renamed'
+	database.save()
+	assert engine.disposed
+	assert AsyncEngineRegistry.get_engine(database.get_connection_url()) is not engine
+	database.delete()
+
+
+def test_async_engine_is_disposed_in_its_event_loop(monkeypatch):
+	monkeypatch.setattr(async_db_broker, 'create_async_engine', lambda url, **kwargs: AsyncEngine())
+	url = 'postgresql:///loop?'
+
+	async def run():
+		engine = AsyncEngineRegistry.get_engine(url)
+		await sync_to_async(AsyncEngineRegistry.dispose)(url)
+		await asyncio.sleep(0)
+		return engine
+
+	assert asyncio.run(run()).disposed
+
+
+def test_column_loader_casts_placeholders_for_postgresql(local_table):
+	table, _ = local_table
+	postgresql = PostgreSQLDatabaseWrapper({**connection.settings_dict, 'ENGINE': 'django.db.backends.postgresql'})
+	queryset = models.ColumnLoader().get_queryset(models.Table, table.pk)
+	sql, _ = queryset.query.get_compiler(connection=postgresql).as_sql()
+	assert ', NULL AS' not in sql
+	assert 'CAST(NULL AS date) AS "datecolumn__where_from_value"' in sql
+	assert 'CAST(NULL AS interval) AS "durationcolumn__where_to_value"' in sql
@@ -0,0 +1,23 @@
+from django.urls import path
+
+from table_builder import views
+
+urlpatterns = [
+	path('database/<int:pk>/schema/refresh/', views.RefreshSchemaView.as_view(), name='schema_refresh'),
+	path('database/<int:pk>/data/query/', views.QuerySpecAPIView.as_view(), name='data_query'),
+	path('database/<int:pk>/data/stream/', views.DataStreamAPIView.as_view(), name='data_stream'),
+	path('database/<int:pk>/data/async/', views.data_request_async_view, name='data_async'),
+	path('database/<int:pk>/data/summary/', views.DataSummaryAPIView.as_view(), name='data_summary'),
+	path('database/<int:pk>/data/plan/', views.QueryPlanAPIView.as_view(), name='data_plan'),
+	path(
+		'database/<int:pk>/query/<str:query_id>/cancel/',
+		views.QueryCancelAPIView.as_view(),
+		name='query_cancel'
+	),
+	path('database/<int:pk>/export/', views.ExportJobCreateAPIView.as_view(), name='export_create'),
+	path('export/<int:pk>/', views.ExportJobDetailAPIView.as_view(), name='export_detail'),
+	path('export/<int:pk>/cancel/', views.ExportJobCancelAPIView.as_view(), name='export_cancel'),
+	path('export/<int:pk>/download/', views.ExportJobDownloadView.as_view(), name='export_download'),
+	path('metrics/', views.MetricsView.as_view(), name='metrics'),
+	path('query-cache/stats/', views.QueryTemplateCacheStatsAPIView.as_view(), name='query_cache_stats'),
+]
@@ -1,30 +1,53 @@
+import itertools
+import os
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
-from django.http import HttpResponseRedirect
-from django.urls import reverse_lazy
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.urls import reverse, reverse_lazy
 from django.views import generic
-from rest_framework import views, response
+from rest_framework import views, response, status
 from rest_framework_csv import renderers
 
 from table_builder import forms
 from table_builder import models
-from table_builder.src.generics.renderers import OrderDictCSVRender
-from table_builder.src.entity.constants import Message, TemplateName
-from table_builder.src.entity.db_broker import DBBroker
+from table_builder.src.generics.renderers import ArrowIPCRenderer, ParquetRenderer, TupleCSVRenderer
+from table_builder.src.entity.constants import ExportFormat, ExportStatus, Message, StreamFormat, TemplateName
+from table_builder.src.entity.async_db_broker import AsyncDBBroker
+from table_builder.src.entity.db_broker import DBBroker, QueryLimitError, QueryLimits
+from table_builder.src.services.columnar import ColumnarResult
+from table_builder.src.services.cost_guard import QueryCostGuard
+from table_builder.src.services.export_jobs import dump_params, parse_byte_range, read_file_range
+from table_builder.src.services.instrumentation import MetricsTraceHook, QueryTrace
 from table_builder.src.services.form_builders import (
 	FieldFormsWithInstanceBuilder,
-	FieldFormsWithoutInstanceBuilder,
 	FieldFormsWithFillTemplateBuilder,
+	PartialFieldFormsWithInstanceBuilder,
+	PartialFieldFormsWithoutInstanceBuilder,
 	BaseSchemaFormBuilder,
 	SchemaChoicesFormBuilder
 )
-from table_builder.src.services.mixins import SQLParamsMixin, TableDetailMixin
-from table_builder.src.services.query_constructor import SQLQueryBuilder
+from table_builder.src.services.mixins import QueryTraceMixin, SQLParamsMixin, TableDetailMixin
+from table_builder.src.services.query_constructor import (
+	PaginationKeyError,
+	SQLQueryBuilder,
+	SQLSummaryQueryBuilder,
+	query_template_cache
+)
+from table_builder.src.services.result_cache import result_cache
 from table_builder.src.services.schema_builder import (
 	POSTRequestTableSchemaBuilder,
 	TableModelSchemaBuilder,
-	SQLAlchemySchemaBuilder
+	SQLAlchemySchemaBuilder,
+	SQLAlchemyTableNamesSchemaBuilder,
+	LazySQLAlchemyTableSchemaBuilder,
+	QuerySpecSchemaBuilder,
+	SchemaDatabaseError
 )
+from table_builder.src.services.query_spec import QuerySpecSerializer
 from table_builder.src.services.sql_formset import SQLFormSet
+from table_builder.src.services.stream_writers import StreamWriterFactory
 
 
 class DatabaseListView(generic.ListView):
@@ -33,7 +56,7 @@ class DatabaseListView(generic.ListView):
 
 
 class DatabaseDetailView(SQLParamsMixin, generic.DetailView):
-	schema_build_strategy = SQLAlchemySchemaBuilder
+	schema_build_strategy = SQLAlchemyTableNamesSchemaBuilder
 	schema_form_builder = SchemaChoicesFormBuilder
 	model = models.Database
 	template_name = 'tablebuilder/database_detail.html'
@@ -55,8 +78,21 @@ class DatabaseDetailView(SQLParamsMixin, generic.DetailView):
 		return super().get_context_data(**ctx, **kwargs)
 
 
+class RefreshSchemaView(generic.detail.SingleObjectMixin, generic.RedirectView):
+	"""Сбрасывает кэш отражённой схемы БД и возвращает на страницу БД"""
+	model = models.Database
+
+	def get(self, request, *args, **kwargs):
+		self.object = self.get_object()
+		SQLAlchemySchemaBuilder.cache.invalidate(self.object.pk)
+		return super().get(request, *args, **kwargs)
+
+	def get_redirect_url(self, *args, **kwargs):
+		return reverse_lazy('database_detail', kwargs={'pk': self.object.pk})
+
+
 class AutoSchemaTableDetail(TableDetailMixin, generic.TemplateView):
-	schema_build_strategy = POSTRequestTableSchemaBuilder
+	schema_build_strategy = LazySQLAlchemyTableSchemaBuilder
 	field_forms_builder = FieldFormsWithFillTemplateBuilder
 	schema_form_builder = BaseSchemaFormBuilder
 	template_name = 'tablebuilder/auto_table.html'
@@ -81,42 +117,605 @@ class LocalSchemaTableDetail(TableDetailMixin, generic.DetailView):
 		return forms.TableForm(instance=self.object)
 
 
-class DataRequestAPIView(generic.detail.SingleObjectMixin, SQLParamsMixin, views.APIView):
+class DataRequestAPIView(QueryTraceMixin, generic.detail.SingleObjectMixin, SQLParamsMixin, views.APIView):
 	schema_build_strategy = POSTRequestTableSchemaBuilder
-	field_forms_builder = FieldFormsWithoutInstanceBuilder
+	field_forms_builder = PartialFieldFormsWithoutInstanceBuilder
 	model = models.Database
-	renderer_classes = [renderers.JSONRenderer, OrderDictCSVRender]
+	renderer_classes = [renderers.JSONRenderer, TupleCSVRenderer, ArrowIPCRenderer, ParquetRenderer]
+
+	max_page_size = 10000
+	next_cursor = None
+	result_cache = result_cache
 
 	def post(self, request, *args, **kwargs):
+		self.cache_headers = {}
+		self.cost_warnings = []
 		data = self.get_data()
-		headers = {}
-		if isinstance(self.request.accepted_renderer, OrderDictCSVRender):
-			headers.update(OrderDictCSVRender.get_headers())
+		headers = self.get_response_headers()
+		if self.is_columnar():
+			if isinstance(data, ColumnarResult):
+				extension = self.request.accepted_renderer.format
+				headers['Content-Disposition'] = f'attachment; filename="{self.schema.name}.{extension}"'
+			else:
+				self.request.accepted_renderer = renderers.JSONRenderer()
+				self.request.accepted_media_type = renderers.JSONRenderer.media_type
 		return response.Response(data=data, headers=headers)
 
+	def get_response_headers(self) -> dict:
+		headers = {}
+		if self.next_cursor:
+			headers['X-Next-Cursor'] = self.next_cursor
+		if self.cost_warnings:
+			headers['X-Query-Cost-Warning'] = '; '.join(self.cost_warnings)
+		# схема не построена, если запрос отклонён при её получении
+		if 'schema' in self.__dict__:
+			headers['X-Schema-Key'] = self.schema_key
+		headers.update(self.cache_headers)
+		return headers
+
 	def get_field_forms_kwargs(self):
 		kwargs = super().get_field_forms_kwargs()
-		kwargs.update({'data': self.request.data})
+		kwargs.update({'data': self.get_column_data(self.request.data)})
 		return kwargs
 
+	def get_db_broker(self):
+		database = self.get_object()
+		connection_url = database.get_connection_url()
+		return DBBroker(connection_url)
+
+	def get_page_size(self):
+		page_size = self.request.query_params.get('page_size')
+		if page_size is None:
+			return None
+		page_size = int(page_size)
+		if not 0 < page_size <= self.max_page_size:
+			raise ValueError()
+		return page_size
+
+	def get_key_columns(self, db_broker: DBBroker):
+		key_columns = [column.name for column in self.schema if column.primary_key]
+		return key_columns or db_broker.get_primary_key(self.schema.name)
+
+	def get_table(self):
+		"""
+		Сохранённая таблица, если запрос строится по локальной схеме.
+		pk таблицы приходит от клиента, поэтому таблица ищется только среди таблиц запрошенной БД
+		"""
+		if not hasattr(self, '_table'):
+			self._table = None
+			if self.schema.pk is not None:
+				self._table = models.Table.objects.filter(pk=self.schema.pk, database=self.get_object()).only(
+					'result_cache_ttl', *QueryLimits.attrs
+				).first()
+		return self._table
+
+	def get_result_cache_ttl(self) -> int:
+		table = self.get_table()
+		if table is not None and table.result_cache_ttl is not None:
+			return table.result_cache_ttl
+		return self.result_cache.options['default_ttl']
+
+	def get_query_limits(self) -> QueryLimits:
+		"""Ограничения таблицы приоритетнее ограничений БД, те - настроек проекта"""
+		limits = [QueryLimits.from_instance(self.get_object()), QueryLimits.from_settings()]
+		table = self.get_table()
+		if table is not None:
+			limits.insert(0, QueryLimits.from_instance(table))
+		return QueryLimits.merge(*limits)
+
+	def get_query_id(self):
+		"""Идентификатор запроса, заданный клиентом для возможной отмены"""
+		return self.request.headers.get('X-Query-Id') or self.request.query_params.get('query_id')
+
+	def guard_query(self, db_broker: DBBroker, query: str, params: dict):
+		"""Проверяет оценку плана запроса по порогам БД, предупреждения сохраняются в cost_warnings"""
+		guard = QueryCostGuard.from_database(self.get_object())
+		if guard.enabled:
+			with self.trace.span('plan_guard'):
+				self.cost_warnings = guard.check(db_broker, query, params, self.get_query_limits())
+
+	def is_columnar(self) -> bool:
+		return getattr(self.request.accepted_renderer, 'columnar', False)
+
+	def fetch_rows(self, db_broker: DBBroker, query: str, params: dict) -> tuple:
+		"""
+		Выполняет запрос или отдаёт результат из кэша, выставляя заголовки X-Cache и Age.
+		Возвращает имена столбцов и строки без преобразования в словари
+		"""
+		cached = self.get_cached_rows(query, params)
+		if cached is not None:
+			return cached
+		self.guard_query(db_broker, query, params)
+		data = db_broker.run_query(query, params, trace=self.trace, **self.get_run_kwargs())
+		return self.store_rows(query, params, data)
+
+	def get_run_kwargs(self) -> dict:
+		return {'limits': self.get_query_limits(), 'query_id': self.get_query_id()}
+
+	def get_cached_rows(self, query: str, params: dict):
+		"""Имена столбцов и строки из кэша результатов или None, если запрос нужно выполнить"""
+		if not self.get_result_cache_ttl():
+			return None
+		cached = self.result_cache.get(self.result_cache.make_key(self.get_object().pk, query, params))
+		if cached is None:
+			self.cache_headers = {'X-Cache': 'MISS', 'Age': '0'}
+			return None
+		self.cache_headers = {'X-Cache': 'HIT', 'Age': str(cached.age)}
+		return cached.keys, cached.rows
+
+	def store_rows(self, query: str, params: dict, data: list) -> tuple:
+		"""Сохраняет строки выполненного запроса в кэш результатов, если он включён"""
+		keys = list(data[0]._fields) if data else []
+		ttl = self.get_result_cache_ttl()
+		if ttl:
+			self.result_cache.set(self.result_cache.make_key(self.get_object().pk, query, params), keys, data, ttl)
+		return keys, data
+
+	def get_data(self):
+		try:
+			with self.trace.span('schema'):
+				schema = self.schema
+		except SchemaDatabaseError as e:
+			return [{'db': str(e)}]
+		self.trace.tag(table=schema.pk)
+		with self.trace.span('forms'):
+			field_forms = self.field_forms
+		with self.trace.span('validation'):
+			formset = SQLFormSet(schema, field_forms)
+			is_valid = formset.is_valid()
+		if not is_valid:
+			return [formset.errors]
+		return self.get_query_data(SQLQueryBuilder(formset.table_schema))
+
+	def get_cursor(self):
+		return self.request.query_params.get('cursor')
+
+	def get_query_data(self, query_builder: SQLQueryBuilder):
+		"""Строит и выполняет запрос по проверенной схеме, возвращает строки или ColumnarResult"""
+		db_broker = self.get_db_broker()
+		errors, query, params = self.build_query(query_builder, db_broker)
+		if errors:
+			return errors
+		try:
+			keys, rows = self.fetch_rows(db_broker, query, params)
+		except QueryLimitError as e:
+			return [{'query': str(e)}]
+		except AttributeError:
+			return [{'db': Message.NOT_CONNECTION_DB.value}]
+		return self.make_data(query_builder, keys, rows)
+
+	def build_query(self, query_builder: SQLQueryBuilder, db_broker: DBBroker) -> tuple:
+		"""Текст и параметры запроса с учётом постраничной выборки. Возвращает ошибки, запрос и параметры"""
+		try:
+			with self.trace.span('build'):
+				page_size = self.get_page_size()
+				if page_size:
+					query_builder.paginate(
+						page_size,
+						cursor=self.get_cursor(),
+						key_columns=self.get_key_columns(db_broker)
+					)
+				query, params = query_builder.build_sql_query()
+		except PaginationKeyError as e:
+			return [{'pagination': str(e)}], None, None
+		except ValueError:
+			return [{'pagination': Message.INVALID_PAGINATION.value}], None, None
+		except AttributeError:
+			return [{'db': Message.NOT_CONNECTION_DB.value}], None, None
+		return None, query, params
+
+	def make_data(self, query_builder: SQLQueryBuilder, keys: list, rows: list):
+		"""Отделяет курсор следующей страницы и приводит строки к формату ответа"""
+		if query_builder.page_size:
+			rows, self.next_cursor = query_builder.split_page(rows)
+			keys = keys[:len(keys) - len(query_builder.cursor_aliases)]
+		self.trace.rows = len(rows)
+		if self.is_columnar():
+			return ColumnarResult(query_builder.get_output_columns(), rows)
+		return [dict(zip(keys, row)) for row in rows]
+
+
+class QuerySpecAPIView(DataRequestAPIView):
+	"""
+	Запрос данных по JSON-спецификации без форм столбцов:
+	{"table": ..., "columns": [...], "filters": [...], "group_by": [...], "order": [...], "limit": ..., "cursor": ...}.
+	Спецификация проверяется по отражённой схеме таблицы, ошибки возвращаются со статусом 400,
+	в том числе limit больше max_page_size и cursor без limit.
+	limit и cursor задают постраничную выдачу по ключу, как page_size и cursor в DataRequestAPIView
+	"""
+	schema_build_strategy = QuerySpecSchemaBuilder
+	serializer_class = QuerySpecSerializer
+
 	def get_data(self):
+		try:
+			with self.trace.span('schema'):
+				schema = self.schema
+		except AttributeError:
+			return [{'db': Message.NOT_CONNECTION_DB.value}]
+		with self.trace.span('validation'):
+			serializer = self.serializer_class(
+				data=self.request.data, context={'table_schema': schema, 'max_page_size': self.max_page_size}
+			)
+			serializer.is_valid(raise_exception=True)
+			self.spec = serializer.validated_data
+			table_schema = serializer.save()
+		return self.get_query_data(SQLQueryBuilder(table_schema))
+
+	def get_page_size(self):
+		return self.spec['limit']
+
+	def get_cursor(self):
+		return self.spec['cursor'] or None
+
+
+class DataStreamAPIView(DataRequestAPIView):
+	"""
+	Отдаёт результат запроса потоком через курсор на стороне сервера, не накапливая строки в памяти.
+	Формат выгрузки задаётся параметром output: ndjson, json, csv, arrow или parquet.
+	CSV из PostgreSQL формируется на сервере БД через COPY ... TO STDOUT,
+	формат pgcopy (двоичный COPY) доступен только для PostgreSQL
+	"""
+	stream_writer_factory = StreamWriterFactory()
+	copy_formats_matching = {
+		StreamFormat.CSV.value: ('csv', 'text/csv; charset=utf-8'),
+		StreamFormat.PGCOPY.value: ('binary', 'application/octet-stream'),
+	}
+
+	def post(self, request, *args, **kwargs):
 		formset = SQLFormSet(self.schema, self.field_forms)
 		if not formset.is_valid():
-			return [formset.errors]
-		database = self.get_object()
-		connection_url = database.get_connection_url()
-		db_broker = DBBroker(connection_url)
+			return response.Response(data=[formset.errors])
+		query_builder = SQLQueryBuilder(formset.table_schema)
+		query, params = query_builder.build_sql_query()
+		db_broker = self.get_db_broker()
+		output = request.query_params.get('output')
+		if output in self.copy_formats_matching and db_broker.supports_copy():
+			return self.copy_response(db_broker, query, params, output)
+		try:
+			writer = self.stream_writer_factory.get_writer(
+				request.query_params.get('output'), output_columns=query_builder.get_output_columns()
+			)
+		except NotImplementedError:
+			return response.Response(
+				data=[{'output': Message.UNSUPPORTED_FORMAT.value}],
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		try:
+			self.guard_query(db_broker, query, params)
+			stream = db_broker.stream_query(
+				query, params, limits=self.get_query_limits(), query_id=self.get_query_id(), trace=self.trace
+			)
+		except QueryLimitError as e:
+			return response.Response(data=[{'query': str(e)}])
+		except AttributeError:
+			return response.Response(data=[{'db': Message.NOT_CONNECTION_DB.value}])
+		streaming_response = StreamingHttpResponse(
+			writer.write(stream.keys, stream),
+			content_type=writer.content_type
+		)
+		streaming_response['Content-Disposition'] = f'attachment; filename="{self.schema.name}.{writer.extension}"'
+		return streaming_response
+
+	def copy_response(self, db_broker: DBBroker, query: str, params: dict, output: str):
+		"""Первая часть читается до начала ответа, чтобы ошибки подключения и запроса вернулись JSON"""
+		copy_format, content_type = self.copy_formats_matching[output]
+		try:
+			self.guard_query(db_broker, query, params)
+			chunks = iter(db_broker.copy_query(
+				query, params, copy_format=copy_format, limits=self.get_query_limits(), query_id=self.get_query_id()
+			))
+			first_chunk = next(chunks, b'')
+		except QueryLimitError as e:
+			return response.Response(data=[{'query': str(e)}])
+		except AttributeError:
+			return response.Response(data=[{'db': Message.NOT_CONNECTION_DB.value}])
+		streaming_response = StreamingHttpResponse(
+			itertools.chain([first_chunk], chunks),
+			content_type=content_type
+		)
+		streaming_response['Content-Disposition'] = f'attachment; filename="{self.schema.name}.{output}"'
+		return streaming_response
+
+
+class DataSummaryAPIView(DataRequestAPIView):
+	"""
+	Возвращает число строк, удовлетворяющих фильтру, и агрегаты MIN/MAX/SUM/AVG по показываемым столбцам,
+	не передавая сами строки. Агрегаты отключаются параметром aggregates=0
+	"""
+	renderer_classes = [renderers.JSONRenderer]
+
+	def post(self, request, *args, **kwargs):
+		formset = SQLFormSet(self.schema, self.field_forms)
+		if not formset.is_valid():
+			return response.Response(data=[formset.errors])
+		with_aggregates = request.query_params.get('aggregates') != '0'
+		query_builder = SQLSummaryQueryBuilder(formset.table_schema, with_aggregates=with_aggregates)
+		query, params = query_builder.build_sql_query()
+		db_broker = self.get_db_broker()
+		try:
+			self.guard_query(db_broker, query, params)
+			data = db_broker.run_query(
+				query, params, limits=self.get_query_limits(), query_id=self.get_query_id()
+			)
+		except QueryLimitError as e:
+			return response.Response(data=[{'query': str(e)}])
+		except AttributeError:
+			return response.Response(data=[{'db': Message.NOT_CONNECTION_DB.value}])
+		return response.Response(data=query_builder.parse_summary(data[0]))
+
+
+class QueryPlanAPIView(DataRequestAPIView):
+	"""
+	Предпросмотр плана запроса: возвращает EXPLAIN (FORMAT JSON) без выполнения запроса,
+	оценки стоимости и числа строк, а также нарушенные пороги БД
+	"""
+	renderer_classes = [renderers.JSONRenderer]
+
+	def post(self, request, *args, **kwargs):
+		formset = SQLFormSet(self.schema, self.field_forms)
+		if not formset.is_valid():
+			return response.Response(data=[formset.errors])
 		query, params = SQLQueryBuilder(formset.table_schema).build_sql_query()
 		try:
-			data = db_broker.run_query(query, params)
-			return [dict(row) for row in data]
+			plan = self.get_db_broker().explain(query, params, self.get_query_limits())
+		except NotImplementedError:
+			return response.Response(
+				data=[{'plan': Message.PLAN_UNAVAILABLE.value}],
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		except QueryLimitError as e:
+			return response.Response(data=[{'query': str(e)}])
+		except AttributeError:
+			return response.Response(data=[{'db': Message.NOT_CONNECTION_DB.value}])
+		guard = QueryCostGuard.from_database(self.get_object())
+		return response.Response(data={
+			'total_cost': plan.total_cost,
+			'plan_rows': plan.plan_rows,
+			'warnings': guard.get_violations(plan),
+			'plan': plan.plan,
+		})
+
+
+class ExportJobCreateAPIView(DataRequestAPIView):
+	"""
+	Ставит выгрузку результата запроса в очередь фоновых заданий.
+	Формат задаётся параметром output: csv.gz, parquet или pgcopy (двоичный COPY, только PostgreSQL)
+	"""
+	renderer_classes = [renderers.JSONRenderer]
+
+	def post(self, request, *args, **kwargs):
+		output_format = request.query_params.get('output') or ExportFormat.CSV_GZ.value
+		db_broker = self.get_db_broker()
+		if output_format not in ExportFormat.values or (
+			output_format == ExportFormat.PGCOPY.value and not db_broker.supports_copy()
+		):
+			return response.Response(
+				data=[{'output': Message.UNSUPPORTED_FORMAT.value}],
+				status=status.HTTP_400_BAD_REQUEST
+			)
+		formset = SQLFormSet(self.schema, self.field_forms)
+		if not formset.is_valid():
+			return response.Response(data=[formset.errors])
+		query_builder = SQLQueryBuilder(formset.table_schema)
+		query, params = query_builder.build_sql_query()
+		try:
+			self.guard_query(db_broker, query, params)
+		except QueryLimitError as e:
+			return response.Response(data=[{'query': str(e)}])
+		except AttributeError:
+			return response.Response(data=[{'db': Message.NOT_CONNECTION_DB.value}])
+		job = models.ExportJob.objects.create(
+			database=self.get_object(),
+			table=self.get_table(),
+			table_name=self.schema.name,
+			query=query,
+			params=dump_params(params),
+			output_columns=query_builder.get_output_columns(),
+			output_format=output_format,
+		)
+		return response.Response(data=ExportJobDetailAPIView.get_job_data(job), status=status.HTTP_202_ACCEPTED)
+
+
+class ExportJobDetailAPIView(generic.detail.SingleObjectMixin, views.APIView):
+	"""Состояние и прогресс фоновой выгрузки"""
+	model = models.ExportJob
+
+	def get(self, request, *args, **kwargs):
+		return response.Response(data=self.get_job_data(self.get_object()))
+
+	@staticmethod
+	def get_job_data(job) -> dict:
+		return {
+			'id': job.pk,
+			'status': job.status,
+			'output': job.output_format,
+			'rows_written': job.rows_written,
+			'bytes_written': job.bytes_written,
+			'error': job.error,
+			'created_at': job.created_at,
+			'started_at': job.started_at,
+			'finished_at': job.finished_at,
+			'progress_url': reverse('export_detail', kwargs={'pk': job.pk}),
+			'download_url': reverse('export_download', kwargs={'pk': job.pk}),
+		}
+
+
+class ExportJobCancelAPIView(generic.detail.SingleObjectMixin, views.APIView):
+	"""Отменяет выгрузку, ожидающую в очереди или выполняющуюся"""
+	model = models.ExportJob
+
+	def post(self, request, *args, **kwargs):
+		job = self.get_object()
+		models.ExportJob.objects.filter(
+			pk=job.pk, status__in=[ExportStatus.PENDING, ExportStatus.RUNNING]
+		).update(status=ExportStatus.CANCELED, error=Message.EXPORT_CANCELED.value)
+		job.refresh_from_db()
+		return response.Response(data=ExportJobDetailAPIView.get_job_data(job))
+
+
+class ExportJobDownloadView(generic.detail.SingleObjectMixin, generic.View):
+	"""Отдаёт файл выгрузки с поддержкой заголовка Range для докачки"""
+	model = models.ExportJob
+	content_types = {
+		ExportFormat.CSV_GZ.value: 'application/gzip',
+		ExportFormat.PARQUET.value: 'application/vnd.apache.parquet',
+		ExportFormat.PGCOPY.value: 'application/octet-stream',
+	}
+
+	def get(self, request, *args, **kwargs):
+		job = self.get_object()
+		if job.status != ExportStatus.DONE or not os.path.exists(job.file_path):
+			return JsonResponse([{'export': Message.EXPORT_NOT_READY.value}], safe=False, status=status.HTTP_409_CONFLICT)
+		size = os.path.getsize(job.file_path)
+		try:
+			byte_range = parse_byte_range(request.headers.get('Range'), size)
+		except ValueError:
+			range_response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+			range_response['Content-Range'] = f'bytes */{size}'
+			return range_response
+		start, end = byte_range or (0, size - 1)
+		download_response = StreamingHttpResponse(
+			read_file_range(job.file_path, start, end),
+			content_type=self.content_types[job.output_format],
+			status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+		)
+		if byte_range:
+			download_response['Content-Range'] = f'bytes {start}-{end}/{size}'
+		download_response['Content-Length'] = str(end - start + 1)
+		download_response['Accept-Ranges'] = 'bytes'
+		download_response['Content-Disposition'] = f'attachment; filename="{job.filename}"'
+		return download_response
+
+
+class AsyncDataRequest(DataRequestAPIView):
+	"""
+	Синхронные этапы асинхронного запроса данных. Схема, формы, постраничная выборка, кэш результатов,
+	проверка плана и ограничения таблицы и БД применяются так же, как в DataRequestAPIView,
+	а сам запрос к внешней БД выполняет data_request_async_view. Ответ всегда в JSON
+	"""
+	renderer_classes = [renderers.JSONRenderer]
+
+	def __init__(self, request, **kwargs):
+		super().__init__()
+		self.args = ()
+		self.kwargs = kwargs
+		self.request = self.initialize_request(request, **kwargs)
+		self.trace = QueryTrace(database=kwargs.get('pk'), table=None)
+		self.cache_headers = {}
+		self.cost_warnings = []
+
+	def is_columnar(self) -> bool:
+		return False
+
+	def prepare(self):
+		"""
+		Возвращает данные ответа, если выполнять запрос не нужно: ошибка или результат из кэша.
+		Иначе сохраняет запрос в self.query и self.params и возвращает None
+		"""
+		with self.trace.span('schema'):
+			schema = self.schema
+		self.trace.tag(table=schema.pk)
+		with self.trace.span('forms'):
+			field_forms = self.field_forms
+		with self.trace.span('validation'):
+			formset = SQLFormSet(schema, field_forms)
+			is_valid = formset.is_valid()
+		if not is_valid:
+			return [formset.errors]
+		self.query_builder = SQLQueryBuilder(formset.table_schema)
+		db_broker = self.get_db_broker()
+		errors, self.query, self.params = self.build_query(self.query_builder, db_broker)
+		if errors:
+			return errors
+		cached = self.get_cached_rows(self.query, self.params)
+		if cached is not None:
+			return self.make_data(self.query_builder, *cached)
+		try:
+			self.guard_query(db_broker, self.query, self.params)
+		except QueryLimitError as e:
+			return [{'query': str(e)}]
 		except AttributeError:
 			return [{'db': Message.NOT_CONNECTION_DB.value}]
+		self.connection_url = self.get_object().get_connection_url()
+		self.run_kwargs = self.get_run_kwargs()
+		return None
+
+	def finish(self, rows: list):
+		return self.make_data(self.query_builder, *self.store_rows(self.query, self.params, rows))
+
+	def make_response(self, data) -> JsonResponse:
+		json_response = JsonResponse(data, safe=False)
+		for header, value in self.get_response_headers().items():
+			json_response[header] = value
+		self.trace_hooks.emit(self.trace, json_response)
+		return json_response
+
+
+async def data_request_async_view(request, pk):
+	"""
+	Асинхронный вариант DataRequestAPIView для работы под ASGI.
+	Подготовка запроса выполняется в потоке через sync_to_async (см. AsyncDataRequest),
+	запрос к внешней БД не занимает поток, а число одновременных запросов к одной БД ограничено семафором.
+	В отличие от DataRequestAPIView, ответ только в JSON
+	"""
+	if request.method != 'POST':
+		return HttpResponseNotAllowed(['POST'])
+	data_request = AsyncDataRequest(request, pk=pk)
+	data = await sync_to_async(data_request.prepare)()
+	if data is None:
+		try:
+			with data_request.trace.span('execute'):
+				rows = await AsyncDBBroker(data_request.connection_url).run_query(
+					data_request.query, data_request.params, **data_request.run_kwargs
+				)
+		except QueryLimitError as e:
+			data = [{'query': str(e)}]
+		except ImproperlyConfigured as e:
+			data = [{'db': str(e)}]
+		except AttributeError:
+			data = [{'db': Message.NOT_CONNECTION_DB.value}]
+		else:
+			data = await sync_to_async(data_request.finish)(rows)
+	return await sync_to_async(data_request.make_response)(data)
+
+
+# csrf_exempt в Django 3.2 оборачивает представление синхронной функцией, поэтому признак выставляется напрямую,
+# как и у представлений DRF: JSON-клиенты не передают CSRF-токен
+data_request_async_view.csrf_exempt = True
+
+
+class QueryCancelAPIView(generic.detail.SingleObjectMixin, views.APIView):
+	"""Отменяет выполняющийся запрос к внешней БД по идентификатору, переданному клиентом в X-Query-Id"""
+	model = models.Database
+
+	def post(self, request, *args, **kwargs):
+		db_broker = DBBroker(self.get_object().get_connection_url())
+		try:
+			canceled = db_broker.cancel_query(kwargs['query_id'])
+		except AttributeError:
+			return response.Response(data=[{'db': Message.NOT_CONNECTION_DB.value}])
+		if not canceled:
+			return response.Response(data={'canceled': False}, status=status.HTTP_404_NOT_FOUND)
+		return response.Response(data={'canceled': True})
+
+
+class MetricsView(generic.View):
+	"""Счётчики запросов данных в текстовом формате экспозиции Prometheus"""
+
+	def get(self, request, *args, **kwargs):
+		return HttpResponse(MetricsTraceHook.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class QueryTemplateCacheStatsAPIView(views.APIView):
+	"""Счётчики попаданий и промахов кэша скомпилированных запросов"""
+
+	def get(self, request, *args, **kwargs):
+		return response.Response(data=query_template_cache.get_stats())
 
 
 class UpdateSchemaView(generic.detail.SingleObjectMixin, SQLParamsMixin, views.APIView):
 	schema_build_strategy = POSTRequestTableSchemaBuilder
-	field_forms_builder = FieldFormsWithInstanceBuilder
+	field_forms_builder = PartialFieldFormsWithInstanceBuilder
 	model = models.Table
 
 	def post(self, request, *args, **kwargs):
@@ -133,7 +732,7 @@ class UpdateSchemaView(generic.detail.SingleObjectMixin, SQLParamsMixin, views.A
 	def update_columns(self):
 		formset = SQLFormSet(self.schema, self.field_forms)
 		formset.is_valid()
-		formset.save()
+		formset.bulk_save()
 
 	def get_field_forms_kwargs(self):
 		kwargs = super().get_field_forms_kwargs()
@@ -143,7 +742,7 @@ class UpdateSchemaView(generic.detail.SingleObjectMixin, SQLParamsMixin, views.A
 
 class CreateSchemaView(SQLParamsMixin, generic.RedirectView):
 	schema_build_strategy = POSTRequestTableSchemaBuilder
-	field_forms_builder = FieldFormsWithoutInstanceBuilder
+	field_forms_builder = PartialFieldFormsWithoutInstanceBuilder
 
 	def post(self, request, *args, **kwargs):
 		self.table_obj = self.create_table()
@@ -160,11 +759,11 @@ class CreateSchemaView(SQLParamsMixin, generic.RedirectView):
 		formset = SQLFormSet(self.schema, self.field_forms)
 		for instance in formset.instances:
 			instance.column_set = self.table_obj
-		formset.save()
+		formset.bulk_save()
 
 	def get_field_forms_kwargs(self):
 		kwargs = super().get_field_forms_kwargs()
-		kwargs.update({'data': self.request.POST})
+		kwargs.update({'data': self.get_column_data(self.request.POST)})
 		return kwargs
 
 	def get_redirect_url(self, *args, **kwargs):